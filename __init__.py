@@ -2,9 +2,10 @@ from flask import Flask
 from flask_login import LoginManager
 from flask_cors import CORS
 from flask_sqlalchemy import SQLAlchemy
-from flask_migrate import Migrate
 from dotenv import load_dotenv
 import os
+from model.engine import configure_engine, mysql_engine_options, RoutingSession
+from api.json_provider import install_json_provider
 
 
 # Load environment variables from .env file
@@ -19,6 +20,8 @@ app.config['FLASK_PORT'] = int(os.environ.get('FLASK_PORT') or 8587)
 
 # Configure Flask to handle JSON with UTF-8 encoding versus default ASCII
 app.config['JSON_AS_ASCII'] = False  # Allow emojis, non-ASCII characters in JSON responses
+# orjson encoder for jsonify and flask_restful responses when installed (see api/json_provider.py)
+install_json_provider(app)
 
 
 # Initialize Flask-Login object
@@ -96,6 +99,58 @@ app.config['SECRET_KEY'] = SECRET_KEY
 app.config['SESSION_COOKIE_NAME'] = SESSION_COOKIE_NAME
 app.config['JWT_TOKEN_NAME'] = JWT_TOKEN_NAME
 
+# JWT lifetimes: short-lived access claims, renewed from the cookie until the refresh deadline
+app.config['JWT_ACCESS_TTL'] = int(os.environ.get('JWT_ACCESS_TTL') or 900)  # seconds, 15 minutes
+app.config['JWT_REFRESH_TTL'] = int(os.environ.get('JWT_REFRESH_TTL') or 43200)  # seconds, 12 hours (cookie lifetime)
+
+# Authenticated principal cache, per gunicorn worker (see model/principal.py)
+app.config['AUTH_CACHE_TTL'] = int(os.environ.get('AUTH_CACHE_TTL') or 30)  # seconds, 0 disables the cache
+app.config['AUTH_CACHE_SIZE'] = int(os.environ.get('AUTH_CACHE_SIZE') or 1024)  # maximum cached users
+
+# Password hashing (see model/password.py), stored hashes with other parameters are upgraded at login.
+# The JWT version claim is a digest of the stored hash (User.token_version), so changing the iterations
+# logs every user out of their other sessions at their next login, once, when their hash is upgraded.
+app.config['PASSWORD_HASH_ITERATIONS'] = int(os.environ.get('PASSWORD_HASH_ITERATIONS') or 1000000)  # pbkdf2:sha256 cost
+app.config['PASSWORD_HASH_WORKERS'] = int(os.environ.get('PASSWORD_HASH_WORKERS') or 2)  # concurrent hashes per worker
+app.config['PASSWORD_HASH_QUEUE'] = int(os.environ.get('PASSWORD_HASH_QUEUE') or 32)  # waiting hashes before 503
+app.config['PASSWORD_HASH_TIMEOUT'] = float(os.environ.get('PASSWORD_HASH_TIMEOUT') or 10)  # seconds a request waits
+
+# Per-request SQL and latency instrumentation, opt-in (see api/perf.py, report at /api/admin/perf)
+app.config['PERF_ENABLED'] = (os.environ.get('PERF_ENABLED') or 'false').lower() == 'true'
+app.config['PERF_BUFFER_SIZE'] = int(os.environ.get('PERF_BUFFER_SIZE') or 2000)  # recent requests kept
+app.config['PERF_SLOW_MS'] = float(os.environ.get('PERF_SLOW_MS') or 500)  # log top queries above this wall time
+# Slow-query log, statements above SLOW_QUERY_MS are logged and listed at /api/admin/slow-queries, 0 disables
+app.config['SLOW_QUERY_MS'] = float(os.environ.get('SLOW_QUERY_MS') or 250)
+app.config['SLOW_QUERY_BUFFER_SIZE'] = int(os.environ.get('SLOW_QUERY_BUFFER_SIZE') or 500)  # recent slow statements kept
+
+# Outbound HTTP to GitHub, Kasm, Groq, Gemini and the snapshot service (see model/http_client.py)
+app.config['HTTP_CONNECT_TIMEOUT'] = float(os.environ.get('HTTP_CONNECT_TIMEOUT') or 3.05)  # seconds to connect
+app.config['HTTP_READ_TIMEOUT'] = float(os.environ.get('HTTP_READ_TIMEOUT') or 10)  # seconds between bytes, calls may pass more
+app.config['HTTP_RETRIES'] = int(os.environ.get('HTTP_RETRIES') or 2)  # attempts after the first for transient failures
+app.config['HTTP_BACKOFF'] = float(os.environ.get('HTTP_BACKOFF') or 0.5)  # seconds, doubles per attempt, jittered
+app.config['HTTP_BACKOFF_MAX'] = float(os.environ.get('HTTP_BACKOFF_MAX') or 5)  # seconds, also caps Retry-After
+app.config['HTTP_POOL_SIZE'] = int(os.environ.get('HTTP_POOL_SIZE') or 10)  # kept-alive connections per host
+app.config['HTTP_BREAKER_FAILURES'] = int(os.environ.get('HTTP_BREAKER_FAILURES') or 5)  # consecutive failures that open a host's breaker, 0 disables
+app.config['HTTP_BREAKER_RESET'] = float(os.environ.get('HTTP_BREAKER_RESET') or 30)  # seconds open before a probe call
+
+# Response compression (see api/conditional.py), brotli when installed and accepted, gzip otherwise
+app.config['COMPRESS_ENABLED'] = (os.environ.get('COMPRESS_ENABLED') or 'true').lower() == 'true'
+app.config['COMPRESS_MIN_SIZE'] = int(os.environ.get('COMPRESS_MIN_SIZE') or 1024)  # bytes, smaller bodies are sent as is
+app.config['COMPRESS_LEVEL'] = int(os.environ.get('COMPRESS_LEVEL') or 6)  # gzip level, 1-9
+app.config['COMPRESS_BROTLI_QUALITY'] = int(os.environ.get('COMPRESS_BROTLI_QUALITY') or 4)  # brotli quality, 0-11
+
+# Response cache for public catalog and feed reads (see model/cache.py), invalidated by model writes
+app.config['RESPONSE_CACHE_ENABLED'] = (os.environ.get('RESPONSE_CACHE_ENABLED') or 'true').lower() == 'true'
+app.config['RESPONSE_CACHE_SIZE'] = int(os.environ.get('RESPONSE_CACHE_SIZE') or 512)  # responses kept per worker
+app.config['RESPONSE_CACHE_SQLITE'] = os.environ.get('RESPONSE_CACHE_SQLITE') or ''  # shared file for all workers, empty for per-worker only
+
+# Microblog payloads carry the first replies of each thread, the rest are paged by GET /api/microblog/reply
+app.config['MICROBLOG_INLINE_REPLIES'] = int(os.environ.get('MICROBLOG_INLINE_REPLIES') or 20)  # replies per microblog in feeds and read()
+
+# Request batching, POST /api/batch (see api/batch.py)
+app.config['BATCH_MAX_REQUESTS'] = int(os.environ.get('BATCH_MAX_REQUESTS') or 20)  # sub-requests per batch
+app.config['BATCH_CONCURRENCY'] = int(os.environ.get('BATCH_CONCURRENCY') or 4)  # sub-requests run at once, per batch
+
 
 # Database settings
 IS_PRODUCTION = os.environ.get('IS_PRODUCTION') or None
@@ -115,6 +170,10 @@ else:
    dbString = 'sqlite:///volumes/'
    dbURI = dbString + dbName + '.db'
    backupURI = dbString + dbName + '_bak.db'
+# Explicit override, e.g. a scratch SQLite file for the scripts/check_* and scripts/bench_* tools
+if os.environ.get('SQLALCHEMY_DATABASE_URI'):
+   dbURI = os.environ.get('SQLALCHEMY_DATABASE_URI')
+   backupURI = None
 # Set database configuration in Flask app
 app.config['DB_ENDPOINT'] = DB_ENDPOINT
 app.config['DB_USERNAME'] = DB_USERNAME
@@ -124,8 +183,41 @@ app.config['SQLALCHEMY_DATABASE_STRING'] = dbString
 app.config['SQLALCHEMY_DATABASE_URI'] = dbURI
 app.config['SQLALCHEMY_BACKUP_URI'] = backupURI
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-db = SQLAlchemy(app)
-migrate = Migrate(app, db)
+# MySQL connection pool, per gunicorn worker.  Defaults sized for the Dockerfile's --workers=5 --threads=2:
+# 2 pooled + 3 overflow = at most 5 connections per worker, 25 in total, well under RDS max_connections.
+# Connections are recycled before network idle timeouts (AWS NAT drops idle flows at 350s) and
+# pinged on checkout, so a connection killed while idle is replaced instead of failing a request.
+# pool_timeout and read_timeout stay below gunicorn's --timeout=30 so a request errors before it is killed.
+app.config['DB_POOL_SIZE'] = int(os.environ.get('DB_POOL_SIZE') or 2)  # kept open, match --threads
+app.config['DB_MAX_OVERFLOW'] = int(os.environ.get('DB_MAX_OVERFLOW') or 3)  # extra connections under bursts
+app.config['DB_POOL_RECYCLE'] = int(os.environ.get('DB_POOL_RECYCLE') or 280)  # seconds before a connection is replaced
+app.config['DB_POOL_PRE_PING'] = (os.environ.get('DB_POOL_PRE_PING') or 'true').lower() == 'true'
+app.config['DB_POOL_TIMEOUT'] = int(os.environ.get('DB_POOL_TIMEOUT') or 10)  # seconds to wait for a free connection
+app.config['DB_CONNECT_TIMEOUT'] = int(os.environ.get('DB_CONNECT_TIMEOUT') or 5)  # seconds, pymysql connect
+app.config['DB_READ_TIMEOUT'] = int(os.environ.get('DB_READ_TIMEOUT') or 25)  # seconds, pymysql read and write
+# Statements of a request running longer are stopped and the request answers 503, 0 for no limit.
+# MySQL applies it to SELECTs (max_execution_time), SQLite to every statement (progress handler).
+app.config['DB_STATEMENT_TIMEOUT_MS'] = int(os.environ.get('DB_STATEMENT_TIMEOUT_MS') or 15000)
+if dbURI.startswith('mysql'):
+   app.config['SQLALCHEMY_ENGINE_OPTIONS'] = mysql_engine_options(app.config)
+# SQLite tuning for several gunicorn workers sharing one file (see model/engine.py)
+app.config['SQLITE_TUNING'] = (os.environ.get('SQLITE_TUNING') or 'true').lower() == 'true'  # false keeps SQLite defaults
+app.config['SQLITE_JOURNAL_MODE'] = os.environ.get('SQLITE_JOURNAL_MODE') or 'WAL'
+app.config['SQLITE_BUSY_TIMEOUT'] = int(os.environ.get('SQLITE_BUSY_TIMEOUT') or 5000)  # ms a writer waits for the lock
+app.config['SQLITE_SYNCHRONOUS'] = os.environ.get('SQLITE_SYNCHRONOUS') or 'NORMAL'
+app.config['SQLITE_FOREIGN_KEYS'] = (os.environ.get('SQLITE_FOREIGN_KEYS') or 'true').lower() == 'true'
+app.config['SQLITE_MMAP_SIZE'] = int(os.environ.get('SQLITE_MMAP_SIZE') or 268435456)  # bytes, 256 MB
+app.config['SQLITE_CACHE_SIZE'] = int(os.environ.get('SQLITE_CACHE_SIZE') or -65536)  # negative is KiB, 64 MB
+# Optional read replica, GET requests read from it (see RoutingSession in model/engine.py)
+app.config['SQLALCHEMY_REPLICA_URI'] = os.environ.get('SQLALCHEMY_REPLICA_URI') or None
+# One commit per write request, model commits only flush until the request ends (see install_unit_of_work)
+app.config['UNIT_OF_WORK'] = (os.environ.get('UNIT_OF_WORK') or 'false').lower() == 'true'
+configure_engine(app)
+db = SQLAlchemy(app, session_options={'class_': RoutingSession})
+# Flask-Migrate imports alembic, a fifth of startup time, and only the `flask db` commands use it
+if os.environ.get('FLASK_RUN_FROM_CLI'):
+    from flask_migrate import Migrate
+    migrate = Migrate(app, db)
 
 
 # Image upload settings
@@ -24,6 +24,7 @@ from __init__ import app
 import requests
 from flask import Blueprint, request, jsonify, current_app
 from flask_restful import Api, Resource
+from model.http_client import http_client
 
 # =============================================================================
 # BLUEPRINT SETUP
@@ -293,6 +294,9 @@ def call_gemini_api(system_prompt, user_message, history):
         if not api_key or not server:
             current_app.logger.warning("Gemini API not configured, using fallback")
             return None
+        if not http_client.available(server):
+            current_app.logger.warning("Gemini circuit open, using fallback without calling it")
+            return None
         
         # Build the endpoint URL with API key
         endpoint = f"{server}?key={api_key}"
@@ -321,11 +325,12 @@ def call_gemini_api(system_prompt, user_message, history):
         current_app.logger.info(f"Making Gemini API request for NPC conversation")
         
         # Make request to Gemini API (same approach as gemini_api.py)
-        response = requests.post(
+        response = http_client.post(
             endpoint,
             headers={'Content-Type': 'application/json'},
             json=payload,
-            timeout=20  # 20 second timeout for NPC responses
+            timeout=20,  # 20 second timeout for NPC responses
+            retries=0  # Groq and the static reply are the fallback, do not wait on retries
         )
         
         # Handle response
@@ -367,6 +372,9 @@ def call_groq_api(system_prompt, user_message, history):
         if not api_key or not server:
             current_app.logger.warning("Groq API not configured, skipping fallback")
             return None
+        if not http_client.available(server):
+            current_app.logger.warning("Groq circuit open, using the static fallback without calling it")
+            return None
 
         # Build messages array for Groq (system, then history, then user)
         messages = []
@@ -393,7 +401,7 @@ def call_groq_api(system_prompt, user_message, history):
         }
 
         current_app.logger.info("Making Groq API request for NPC conversation")
-        response = requests.post(endpoint, headers=headers, json=payload, timeout=20)
+        response = http_client.post(endpoint, headers=headers, json=payload, timeout=20, retries=0)
         if response.status_code == 200:
             result = response.json()
             try:
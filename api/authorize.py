@@ -2,16 +2,20 @@ from flask import request, current_app, g
 from flask_login import current_user
 from functools import wraps
 import jwt
+import os
+import time
+from __init__ import app, db
 from model.user import User
+from model.principal import Principal, principal_cache, snapshot_user, restore_user
 
-def auth_required(roles=None):
+def auth_required(roles=None, slim=False):
     '''
     Hybrid authentication decorator supporting both session and JWT token authentication.
     
     This function guards API endpoints by:
       1. First checking for Flask-Login session authentication (current_user)
       2. If no session, checks for valid JWT token in request cookies
-      3. Decodes the token and retrieves user data from database
+      3. Decodes the token and retrieves user data from its claims, the principal cache or database
       4. Validates user has required role(s) if specified
       5. Sets g.current_user in Flask's global context for use in decorated function
       6. Returns the decorated function if all checks pass
@@ -19,10 +23,20 @@ def auth_required(roles=None):
     Authentication priority:
       - Session authentication (Flask-Login) is checked first (faster)
       - JWT token authentication is fallback (stateless, works for APIs)
+
+    Token lifetime:
+      - Tokens carry id, role, name and a version claim, and expire after JWT_ACCESS_TTL
+      - An expired token is renewed transparently (new cookie on the response) until its refresh
+        deadline, after checking the version against the database
+      - Changing a password or role changes the version, revoking older tokens at their next renewal
     
     Args:
         roles: String or list of allowed roles (e.g., "Admin" or ["Admin", "Teacher"])
                If None, any authenticated user is allowed
+        slim: If True, g.current_user is a Principal (id, uid, role, name) built from the token
+              claims with no query, or from a single column-projected query for older tokens.
+              The full User is only fetched if the endpoint touches anything else.  Use for
+              endpoints that only need to know who is calling.
     
     Possible error responses:
       A. 401 / Unauthorized: no session and token is missing or invalid
@@ -54,8 +68,7 @@ def auth_required(roles=None):
                 
                 try:
                     # Decode the token and retrieve the user data
-                    data = jwt.decode(token, current_app.config["SECRET_KEY"], algorithms=["HS256"])
-                    user = User.query.filter_by(_uid=data["_uid"]).first()
+                    user = resolve_token(token, slim=slim)
                     
                     if user is None:
                         return {
@@ -114,10 +127,192 @@ def auth_required(roles=None):
     return decorator
 
 
+def resolve_token(token, slim=False):
+    '''
+    Decode a JWT and return the authenticated User (or Principal when slim), None if the user is gone.
+
+    Raises jwt.ExpiredSignatureError once the refresh deadline has passed, and jwt.InvalidTokenError
+    for bad signatures, malformed claims or revoked tokens.
+    '''
+    data = jwt.decode(token, current_app.config["SECRET_KEY"], algorithms=["HS256"], options={"verify_exp": False})
+    now = int(time.time())
+    # Signed with our key but without the claims read below, e.g. an old or hand-made token: invalid, not a 500
+    if ("_uid" not in data or ("ver" in data and not {"id", "role"} <= data.keys())
+            or not all(isinstance(data.get(claim, 0), (int, float)) for claim in ("exp", "rexp"))):
+        raise jwt.InvalidTokenError("Token claims are malformed")
+
+    # Expired access claims: renew from the database while the refresh window is open
+    if data.get("exp") is not None and data["exp"] <= now:
+        if not data.get("rexp") or data["rexp"] <= now:
+            raise jwt.ExpiredSignatureError("Signature has expired")
+        user = renew_token(data)
+        if user is not None and slim:
+            return Principal(user.id, user._uid, user._role, user._name, user._password)
+        return user
+
+    # Stateless fast path: the claims already say who is calling and with what role
+    if slim and "ver" in data:
+        return principal_from_claims(data)
+
+    user = load_principal(data["_uid"], slim=slim)
+    if user is None:
+        return None
+    if "ver" not in data:
+        # Legacy token without claims or expiry, upgrade the cookie on the way out
+        g.refreshed_token = issue_token(user)
+    elif not slim and user.token_version != data["ver"]:
+        raise jwt.InvalidTokenError("Token has been revoked")
+    return user
+
+
+def principal_from_claims(data):
+    '''
+    Build a Principal from token claims without touching the database.
+
+    If this worker has the user cached, a version or role mismatch means the token was revoked
+    (password or role change) and it is rejected right away.  Other workers reject it no later
+    than its expiry, JWT_ACCESS_TTL, when renewal checks the database.
+    '''
+    snapshot = principal_cache.get(data["_uid"])
+    if snapshot is not None:
+        if snapshot.get("_role") != data.get("role"):
+            raise jwt.InvalidTokenError("Token has been revoked")
+        if "_password" in snapshot and User.compute_token_version(snapshot["_password"], snapshot["_role"]) != data["ver"]:
+            raise jwt.InvalidTokenError("Token has been revoked")
+    return Principal(data["id"], data["_uid"], data["role"], data.get("name"))
+
+
+def renew_token(data):
+    '''
+    Check an expired token against the database and queue a renewed one for the response cookie.
+
+    The refresh deadline (rexp) carries over, so renewal never extends a login past JWT_REFRESH_TTL.
+    '''
+    user = User.query.filter_by(_uid=data["_uid"]).first()
+    if user is None:
+        return None
+    if "ver" in data and user.token_version != data["ver"]:
+        raise jwt.InvalidTokenError("Token has been revoked")
+    principal_cache.set(user._uid, snapshot_user(user))
+    g.refreshed_token = issue_token(user, refresh_until=data["rexp"])
+    return user
+
+
+def issue_token(user, refresh_until=None):
+    '''
+    Encode a JWT carrying the claims needed to authorize without a database lookup.
+
+    Claims:
+        _uid, id, role, name: who the user is
+        ver: User.token_version, changes with the password hash or role
+        iat, exp: issue time and access expiry (JWT_ACCESS_TTL)
+        rexp: refresh deadline, the token can be renewed until then (JWT_REFRESH_TTL)
+    '''
+    now = int(time.time())
+    refresh_until = refresh_until or now + current_app.config["JWT_REFRESH_TTL"]
+    claims = {
+        "_uid": user._uid,
+        "id": user.id,
+        "role": user.role,
+        "name": user.name,
+        "ver": user.token_version,
+        "iat": now,
+        "exp": min(now + current_app.config["JWT_ACCESS_TTL"], refresh_until),
+        "rexp": refresh_until,
+    }
+    return jwt.encode(claims, current_app.config["SECRET_KEY"], algorithm="HS256")
+
+
+def set_token_cookie(response, token, max_age):
+    '''Set the JWT cookie, cross-site and scoped to opencodingsociety.com in production.'''
+    is_production = os.environ.get('IS_PRODUCTION', 'false').lower() == 'true'
+    if is_production:
+        response.set_cookie(
+            current_app.config["JWT_TOKEN_NAME"],
+            token,
+            max_age=max_age,
+            secure=True,
+            httponly=True,
+            path='/',
+            samesite='None',
+            domain='.opencodingsociety.com'
+        )
+    else:
+        response.set_cookie(
+            current_app.config["JWT_TOKEN_NAME"],
+            token,
+            max_age=max_age,
+            secure=False,
+            httponly=False,  # Set to True for more security if JS access not needed
+            path='/',
+            samesite='Lax'
+        )
+    return response
+
+
+@app.after_request
+def attach_refreshed_token(response):
+    '''Send a renewed JWT back with whatever response the guarded endpoint produced.'''
+    token = g.pop('refreshed_token', None)
+    if token:
+        claims = jwt.decode(token, options={"verify_signature": False})
+        set_token_cookie(response, token, max_age=max(claims["rexp"] - int(time.time()), 0))
+    return response
+
+
+def load_principal(uid, slim=False):
+    '''
+    Resolve a uid to a User attached to the current session, or to a Principal when slim.
+
+    Polling endpoints (/api/id, /api/microblog, /api/dynamic/leaderboard) authenticate every few
+    seconds, so a cache hit rebuilds the User from a per-worker snapshot without any query.
+    A miss falls back to the database and refreshes the cache.  A slim miss only selects the
+    Principal columns, which skips the lazy='subquery' loads of sections and personas.
+    '''
+    snapshot = principal_cache.get(uid)
+    if slim:
+        if snapshot is None:
+            row = (db.session.query(*[getattr(User, column) for column in Principal.COLUMNS])
+                   .filter(User._uid == uid)
+                   .first())
+            if row is None:
+                return None
+            snapshot = dict(zip(Principal.COLUMNS, row))
+            principal_cache.set(uid, snapshot)
+        return Principal.from_snapshot(snapshot)
+    if snapshot is not None:
+        return restore_user(User, snapshot)
+    user = User.query.filter_by(_uid=uid).first()
+    if user is not None:
+        principal_cache.set(user._uid, snapshot_user(user))
+    return user
+
+
+def get_current_user(slim=True):
+    '''
+    Optional authentication for public endpoints: the session user, or the token's user (a Principal
+    when slim), or None when the request is anonymous or its token is invalid.  Sets g.current_user.
+    '''
+    if 'current_user' in g:
+        return g.current_user
+    user = None
+    if current_user.is_authenticated:
+        user = current_user
+    else:
+        token = request.cookies.get(current_app.config.get("JWT_TOKEN_NAME"))
+        if token:
+            try:
+                user = resolve_token(token, slim=slim)
+            except jwt.InvalidTokenError:
+                user = None
+    g.current_user = user
+    return user
+
+
 # Alias for backward compatibility with existing code using token_required
-def token_required(roles=None):
+def token_required(roles=None, slim=False):
     '''
     Backward compatibility alias for auth_required.
     Existing code using @token_required will continue to work.
     '''
-    return auth_required(roles)
+    return auth_required(roles, slim=slim)
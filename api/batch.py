@@ -0,0 +1,154 @@
+""" Request batching, POST /api/batch runs several API calls in one round trip """
+from concurrent.futures import ThreadPoolExecutor
+from flask import Blueprint, request, g, current_app
+from flask_restful import Api, Resource
+from werkzeug.exceptions import InternalServerError
+from werkzeug.http import parse_cookie
+from werkzeug.test import EnvironBuilder
+import time
+
+from __init__ import app
+from api.authorize import get_current_user
+
+batch_api = Blueprint('batch_api', __name__, url_prefix='/api')
+
+# API docs https://flask-restful.readthedocs.io/en/latest/api.html
+api = Api(batch_api)
+
+BATCH_METHODS = ('GET', 'POST', 'PUT', 'PATCH', 'DELETE')
+
+# Request headers passed on to every sub-request, Accept-Encoding is left out so sub-responses are
+# not compressed on their own (the batch response is)
+FORWARDED_HEADERS = ('Cookie', 'Authorization', 'Origin', 'User-Agent', 'Accept-Language', 'X-Forwarded-For')
+
+
+def _validate(items):
+    """Error message for a malformed batch, None when every sub-request can be dispatched."""
+    if not isinstance(items, list) or not items:
+        return 'requests must be a non-empty list'
+    if len(items) > app.config['BATCH_MAX_REQUESTS']:
+        return f"at most {app.config['BATCH_MAX_REQUESTS']} requests per batch"
+    for index, item in enumerate(items):
+        if not isinstance(item, dict) or not isinstance(item.get('path'), str):
+            return f'requests[{index}] needs a path'
+        if not item['path'].startswith('/api/') or item['path'].split('?')[0].rstrip('/') == '/api/batch':
+            return f'requests[{index}].path must be an /api/ route other than /api/batch'
+        if str(item.get('method', 'GET')).upper() not in BATCH_METHODS:
+            return f"requests[{index}].method must be one of {', '.join(BATCH_METHODS)}"
+    return None
+
+
+def _cookie_header(cookies):
+    return '; '.join(f'{key}={value}' for key, value in cookies.items())
+
+
+def _shared_headers():
+    """Headers of the batch request for the sub-requests, with a renewed token if auth renewed it."""
+    headers = {name: request.headers[name] for name in FORWARDED_HEADERS if name in request.headers}
+    token = g.get('refreshed_token')
+    if token:
+        # Send the renewed token, so the sub-requests do not each renew the expired one
+        cookies = dict(request.cookies)
+        cookies[current_app.config['JWT_TOKEN_NAME']] = token
+        headers['Cookie'] = _cookie_header(cookies)
+    return headers
+
+
+def _apply_set_cookies(headers, set_cookies):
+    """Headers for the next sequential sub-request, with the cookies the previous one set (login, logout)."""
+    if not set_cookies:
+        return headers
+    cookies = dict(parse_cookie(headers.get('Cookie', '')))
+    for set_cookie in set_cookies:
+        name, _, value = set_cookie.split(';', 1)[0].partition('=')
+        cookies[name.strip()] = value.strip()
+    return {**headers, 'Cookie': _cookie_header(cookies)}
+
+
+def dispatch(flask_app, item, headers, base_url):
+    '''
+    Run one sub-request through the app's URL map and request hooks, as if it came on its own.
+
+    It gets a fresh app and request context: its own g, database session and replica routing, so
+    sub-requests can run on several threads.
+    '''
+    method = str(item.get('method', 'GET')).upper()
+    builder = EnvironBuilder(path=item['path'], base_url=base_url, method=method,
+                             headers={**(item.get('headers') or {}), **headers},
+                             json=item.get('body') if method != 'GET' else None)
+    started = time.perf_counter()
+    try:
+        with flask_app.app_context(), flask_app.request_context(builder.get_environ()):
+            try:
+                response = flask_app.full_dispatch_request()
+            except Exception:
+                # A sub-request that raises answers 500 on its own, the other results still return
+                flask_app.logger.exception("Batch sub-request %s %s failed", method, item['path'])
+                response = flask_app.finalize_request(({'message': InternalServerError.description}, 500),
+                                                      from_error_handler=True)
+            body = response.get_json(silent=True) if response.is_json else response.get_data(as_text=True)
+    finally:
+        builder.close()
+    result = {
+        'id': item.get('id'),
+        'method': method,
+        'path': item['path'],
+        'status': response.status_code,
+        'body': body,
+        'ms': round((time.perf_counter() - started) * 1000, 2),
+    }
+    if response.headers.get('ETag'):
+        result['etag'] = response.headers['ETag']
+    return result, response.headers.getlist('Set-Cookie')
+
+
+class BatchAPI:
+
+    class _Batch(Resource):
+        def post(self):
+            '''
+            Run several API calls in one round trip - POST /api/batch
+
+            Body: {"requests": [{"id": "me", "method": "GET", "path": "/api/id"},
+                                {"method": "POST", "path": "/api/study", "body": {...}}, ...]}
+
+            Sub-requests go through the URL map with the caller's cookies, so each answers exactly as
+            it would on its own, 401 and 403 included.  Authentication is resolved once up front: a
+            token renewed here is passed to every sub-request and set on the batch response.
+
+            Up to BATCH_CONCURRENCY sub-requests run at once, set "sequential": true when later calls
+            depend on earlier writes or cookies (a login first).  Returns {"responses": [...], "ms": total}
+            in request order, each with id, status, body, etag and its own ms.
+            '''
+            body = request.get_json(silent=True) or {}
+            items = body.get('requests')
+            error = _validate(items)
+            if error:
+                return {'message': error}, 400
+
+            started = time.perf_counter()
+            get_current_user()
+            headers = _shared_headers()
+            flask_app = current_app._get_current_object()
+            base_url = request.host_url
+            workers = 1 if body.get('sequential') else min(app.config['BATCH_CONCURRENCY'], len(items))
+            if workers == 1:
+                results = []
+                for item in items:
+                    results.append(dispatch(flask_app, item, headers, base_url))
+                    headers = _apply_set_cookies(headers, results[-1][1])
+            else:
+                with ThreadPoolExecutor(max_workers=workers) as executor:
+                    results = list(executor.map(lambda item: dispatch(flask_app, item, headers, base_url), items))
+
+            response = current_app.json.response({
+                'responses': [result for result, _ in results],
+                'ms': round((time.perf_counter() - started) * 1000, 2),
+            })
+            # Cookies set by sub-requests (login, logout, renewals) reach the browser
+            for _, cookies in results:
+                for cookie in cookies:
+                    response.headers.add('Set-Cookie', cookie)
+            return response
+
+    api.add_resource(_Batch, '/batch')
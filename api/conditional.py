@@ -0,0 +1,123 @@
+""" Conditional GET (weak ETags, 304 Not Modified) and response compression for list endpoints """
+from flask import current_app, request
+from flask_restful.utils import unpack
+from functools import wraps
+import gzip
+import hashlib
+
+from api.authorize import get_current_user
+
+try:
+    import brotli
+except ImportError:  # optional, gzip only without it
+    brotli = None
+
+
+def weak_etag(*parts):
+    """Opaque tag for a version value, the request path and query are part of it."""
+    return hashlib.blake2b(repr((request.full_path,) + parts).encode('utf-8'), digest_size=12).hexdigest()
+
+
+def etag_version(version, private=False):
+    '''
+    Resource.get decorator: answer 304 Not Modified while the data behind the endpoint is unchanged.
+
+    version(**kwargs) gets the URL parameters and returns a cheap fingerprint of the data, usually
+    one aggregate query such as (count, max id, latest update).  It runs before the endpoint, so an
+    unchanged poll costs that query and no loading or serialization.  None skips the check.
+
+    Fingerprints only see the rows they aggregate: renaming a user does not change the tag of the
+    posts that show the name.  Tags are weak (W/"..."), equivalent content rather than the same
+    bytes, which also keeps them valid when the body is compressed.
+
+    Args:
+        version: function returning the fingerprint, any value with a stable repr()
+        private: the response depends on who is asking (canPost, own post counts), the caller's
+                 id goes into the tag and the response is marked private with Vary: Cookie
+    '''
+    def decorator(func):
+        @wraps(func)
+        def decorated(*args, **kwargs):
+            value = version(**kwargs)
+            if value is None:
+                return func(*args, **kwargs)
+            if private:
+                user = get_current_user()
+                value = (value, user.id if user else None)
+            tag = weak_etag(value)
+            if request.if_none_match.contains_weak(tag):
+                return current_app.response_class(status=304, headers=_validators(tag, private))
+            return _attach_validators(func(*args, **kwargs), tag, private)
+        return decorated
+    return decorator
+
+
+def _validators(tag, private):
+    headers = {
+        'ETag': f'W/"{tag}"',
+        # Clients may keep the body but must revalidate it before every use
+        'Cache-Control': 'private, no-cache' if private else 'no-cache',
+    }
+    if private:
+        headers['Vary'] = 'Cookie'
+    return headers
+
+
+def _attach_validators(result, tag, private):
+    """Add the validators to a successful result, a Response (jsonify) or flask_restful data."""
+    if isinstance(result, current_app.response_class):
+        if result.status_code == 200:
+            result.headers.update(_validators(tag, private))
+        return result
+    data, code, headers = unpack(result)
+    if code != 200:
+        return result
+    return data, code, {**dict(headers or {}), **_validators(tag, private)}
+
+
+# Compressible response types, images and archives are compressed already
+COMPRESSIBLE_TYPES = ('application/json', 'application/javascript', 'image/svg+xml', 'text/')
+
+
+def _encoding():
+    """Best encoding the client accepts, None for identity."""
+    accepted = request.accept_encodings
+    if brotli is not None and accepted['br']:
+        return 'br'
+    if accepted['gzip']:
+        return 'gzip'
+    return None
+
+
+def compress_response(response):
+    """after_request hook: gzip or brotli bodies of at least COMPRESS_MIN_SIZE bytes, see install_compression."""
+    if (response.status_code != 200 or response.direct_passthrough or response.is_streamed
+            or 'Content-Encoding' in response.headers
+            or not (response.mimetype or '').startswith(COMPRESSIBLE_TYPES)):
+        return response
+    response.vary.add('Accept-Encoding')
+    encoding = _encoding()
+    if encoding is None:
+        return response
+    body = response.get_data()
+    if len(body) < current_app.config['COMPRESS_MIN_SIZE']:
+        return response
+    if encoding == 'br':
+        body = brotli.compress(body, quality=current_app.config['COMPRESS_BROTLI_QUALITY'])
+    else:
+        body = gzip.compress(body, compresslevel=current_app.config['COMPRESS_LEVEL'])
+    response.set_data(body)
+    response.headers['Content-Encoding'] = encoding
+    # A strong tag promises identical bytes, which no longer holds for the encoded body
+    tag, weak = response.get_etag()
+    if tag and not weak:
+        response.set_etag(tag, weak=True)
+    return response
+
+
+def install_compression(flask_app):
+    """Compress responses on the way out, see COMPRESS_ENABLED."""
+    if flask_app.extensions.get('compression_installed'):
+        return
+    flask_app.after_request(compress_response)
+    flask_app.extensions['compression_installed'] = True
@@ -12,11 +12,12 @@ from __init__ import db
 # Import all models
 from model.user import User, Section
 from model.post import Post
-from model.microblog import MicroBlog, Topic
+from model.microblog import MicroBlog, MicroBlogReply, Topic
 from model.classroom import Classroom
 from model.feedback import Feedback
 from model.study import Study
 from model.persona import Persona, UserPersona
+from model.pagination import MAX_PAGE_LIMIT, encode_cursor, keyset_page
 
 data_export_import_api = Blueprint('data_export_import_api', __name__, url_prefix='/api/export')
 api = Api(data_export_import_api)
@@ -93,6 +94,7 @@ class ExportAllData(Resource):
     def _export_microblogs(self):
         """Export all microblogs"""
         microblogs = MicroBlog.query.all()
+        threads = MicroBlogReply.export_threads([mb.id for mb in microblogs])
         result = []
         for mb in microblogs:
             mb_data = mb.read()
@@ -101,6 +103,8 @@ class ExportAllData(Resource):
                 mb_data['userUid'] = mb.user.uid
             if mb.topic:
                 mb_data['topicPath'] = mb.topic._page_path
+            # The whole thread, read() only carries its first replies
+            mb_data['replies'] = threads.get(mb.id, [])
             result.append(mb_data)
         return result
 
@@ -406,7 +410,12 @@ class ImportAllData(Resource):
                     topic_id=topic_id,
                     data=mb_data.get('data', {})
                 )
-                microblog.create()
+                if microblog.create() is None:
+                    failed += 1
+                    continue
+                # Threads of exports made since replies have their own table, with each author's userUid
+                MicroBlogReply.import_json(microblog, mb_data.get('replies'))
+                db.session.commit()
                 imported += 1
             except Exception as e:
                 failed += 1
@@ -632,6 +641,39 @@ class ImportAllData(Resource):
         return {'imported': imported, 'failed': failed, 'errors': errors}
 
 
+def _export_page(query, order):
+    '''
+    One chunk of an export in a stable order (the primary key), with the paging fields of the response.
+
+    ?cursor= (empty for the first chunk) pages by keyset: every chunk is an index seek after the
+    previous one, however deep, and there is no COUNT, so 'total' is left out.  Without cursor the
+    ?page= OFFSET paging of older clients keeps working.  Both return next_cursor for the next chunk.
+    '''
+    per_page = max(1, min(request.args.get('per_page', 50, type=int), MAX_PAGE_LIMIT))
+    cursor = request.args.get('cursor')
+    if cursor is not None:
+        items = keyset_page(query, order, per_page, cursor, descending=False)
+        return items, {
+            'per_page': per_page,
+            'has_next': items.next_cursor is not None,
+            'next_cursor': items.next_cursor
+        }
+
+    page = request.args.get('page', 1, type=int)
+    pagination = query.order_by(*order).paginate(page=page, per_page=per_page, error_out=False)
+    next_cursor = None
+    if pagination.has_next and pagination.items:
+        next_cursor = encode_cursor([getattr(pagination.items[-1], column.key) for column in order])
+    return pagination.items, {
+        'total': pagination.total,
+        'page': page,
+        'per_page': per_page,
+        'has_next': pagination.has_next,
+        'has_prev': pagination.has_prev,
+        'next_cursor': next_cursor
+    }
+
+
 # Individual export endpoints for chunked exports
 class ExportSections(Resource):
     @token_required()
@@ -650,17 +692,12 @@ class ExportUsers(Resource):
             return {'message': 'Admin privileges required'}, 403
 
         # Always use pagination to prevent timeouts
-        page = request.args.get('page', 1, type=int)
-        per_page = request.args.get('per_page', 50, type=int)
-
         # Paginate the query with eager loading to avoid N+1 queries
         from sqlalchemy.orm import joinedload
-        pagination = User.query.options(joinedload(User.sections)).paginate(
-            page=page, per_page=per_page, error_out=False
-        )
+        users, paging = _export_page(User.query.options(joinedload(User.sections)), (User.id,))
 
         result = []
-        for user in pagination.items:
+        for user in users:
             user_data = user.read()
             user_data['sections'] = [s.read() for s in user.sections]
             result.append(user_data)
@@ -668,11 +705,7 @@ class ExportUsers(Resource):
         return jsonify({
             'users': result,
             'count': len(result),
-            'total': pagination.total,
-            'page': page,
-            'per_page': per_page,
-            'has_next': pagination.has_next,
-            'has_prev': pagination.has_prev
+            **paging
         })
 
 class ExportTopics(Resource):
@@ -683,19 +716,12 @@ class ExportTopics(Resource):
             return {'message': 'Admin privileges required'}, 403
 
         # Always use pagination to prevent timeouts
-        page = request.args.get('page', 1, type=int)
-        per_page = request.args.get('per_page', 50, type=int)
-
-        pagination = Topic.query.paginate(page=page, per_page=per_page, error_out=False)
+        topics, paging = _export_page(Topic.query, (Topic.id,))
 
         return jsonify({
-            'topics': [t.read() for t in pagination.items],
-            'count': len(pagination.items),
-            'total': pagination.total,
-            'page': page,
-            'per_page': per_page,
-            'has_next': pagination.has_next,
-            'has_prev': pagination.has_prev
+            'topics': [t.read() for t in topics],
+            'count': len(topics),
+            **paging
         })
 
 class ExportMicroblogs(Resource):
@@ -706,28 +732,24 @@ class ExportMicroblogs(Resource):
             return {'message': 'Admin privileges required'}, 403
 
         # Always use pagination to prevent timeouts
-        page = request.args.get('page', 1, type=int)
-        per_page = request.args.get('per_page', 50, type=int)
-
-        pagination = MicroBlog.query.paginate(page=page, per_page=per_page, error_out=False)
+        microblogs, paging = _export_page(MicroBlog.query, (MicroBlog.id,))
+        threads = MicroBlogReply.export_threads([mb.id for mb in microblogs])
 
         result = []
-        for mb in pagination.items:
+        for mb in microblogs:
             mb_data = mb.read()
             if mb.user:
                 mb_data['userUid'] = mb.user.uid
             if mb.topic:
                 mb_data['topicPath'] = mb.topic._page_path
+            # The whole thread, read() only carries its first replies
+            mb_data['replies'] = threads.get(mb.id, [])
             result.append(mb_data)
 
         return jsonify({
             'microblogs': result,
             'count': len(result),
-            'total': pagination.total,
-            'page': page,
-            'per_page': per_page,
-            'has_next': pagination.has_next,
-            'has_prev': pagination.has_prev
+            **paging
         })
 
 class ExportPosts(Resource):
@@ -738,13 +760,10 @@ class ExportPosts(Resource):
             return {'message': 'Admin privileges required'}, 403
 
         # Always use pagination to prevent timeouts
-        page = request.args.get('page', 1, type=int)
-        per_page = request.args.get('per_page', 50, type=int)
-
-        pagination = Post.query.paginate(page=page, per_page=per_page, error_out=False)
+        posts, paging = _export_page(Post.query, (Post.id,))
 
         result = []
-        for post in pagination.items:
+        for post in posts:
             post_data = post.read()
             if post.user:
                 post_data['userUid'] = post.user.uid
@@ -753,11 +772,7 @@ class ExportPosts(Resource):
         return jsonify({
             'posts': result,
             'count': len(result),
-            'total': pagination.total,
-            'page': page,
-            'per_page': per_page,
-            'has_next': pagination.has_next,
-            'has_prev': pagination.has_prev
+            **paging
         })
 
 class ExportClassrooms(Resource):
@@ -811,19 +826,12 @@ class ExportPersonas(Resource):
             return {'message': 'Admin privileges required'}, 403
 
         # Always use pagination to prevent timeouts
-        page = request.args.get('page', 1, type=int)
-        per_page = request.args.get('per_page', 50, type=int)
-
-        pagination = Persona.query.paginate(page=page, per_page=per_page, error_out=False)
+        personas, paging = _export_page(Persona.query, (Persona.id,))
 
         return jsonify({
-            'personas': [p.read() for p in pagination.items],
-            'count': len(pagination.items),
-            'total': pagination.total,
-            'page': page,
-            'per_page': per_page,
-            'has_next': pagination.has_next,
-            'has_prev': pagination.has_prev
+            'personas': [p.read() for p in personas],
+            'count': len(personas),
+            **paging
         })
 
 class ExportUserPersonas(Resource):
@@ -834,13 +842,10 @@ class ExportUserPersonas(Resource):
             return {'message': 'Admin privileges required'}, 403
 
         # Always use pagination to prevent timeouts
-        page = request.args.get('page', 1, type=int)
-        per_page = request.args.get('per_page', 50, type=int)
-
-        pagination = UserPersona.query.paginate(page=page, per_page=per_page, error_out=False)
+        user_personas, paging = _export_page(UserPersona.query, (UserPersona.user_id, UserPersona.persona_id))
 
         result = []
-        for up in pagination.items:
+        for up in user_personas:
             result.append({
                 'userUid': up.user.uid if up.user else None,
                 'personaAlias': up.persona.alias if up.persona else None,
@@ -851,11 +856,7 @@ class ExportUserPersonas(Resource):
         return jsonify({
             'user_personas': result,
             'count': len(result),
-            'total': pagination.total,
-            'page': page,
-            'per_page': per_page,
-            'has_next': pagination.has_next,
-            'has_prev': pagination.has_prev
+            **paging
         })
 
 
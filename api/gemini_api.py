@@ -55,6 +55,7 @@ from flask import Blueprint, request, jsonify, current_app, g
 from flask_restful import Api, Resource
 import requests
 from api.authorize import token_required
+from model.http_client import http_client
 
 # =============================================================================
 # BLUEPRINT SETUP
@@ -134,7 +135,7 @@ class GeminiAPI:
                 current_app.logger.debug(f"Payload: {payload}")
                 
                 # Make request to Gemini API
-                response = requests.post(
+                response = http_client.post(
                     endpoint,
                     headers={'Content-Type': 'application/json'},
                     json=payload,
@@ -235,7 +236,7 @@ class GeminiAPI:
                         }]
                     }
                     
-                    response = requests.post(
+                    response = http_client.post(
                         test_endpoint,
                         headers={'Content-Type': 'application/json'},
                         json=test_payload,
@@ -303,7 +304,7 @@ class GeminiAPI:
             }
             
             try:
-                response = requests.post(
+                response = http_client.post(
                     endpoint,
                     headers={'Content-Type': 'application/json'},
                     json=test_payload,
@@ -8,8 +8,15 @@ from model.grade_model import GradePredictionModel
 grade_api = Blueprint('grade_api', __name__, url_prefix='/api/grade')
 api = Api(grade_api)
 
-# Create model instance
-model_instance = GradePredictionModel()
+# Model instance, trained on the first prediction rather than when the blueprint is imported
+model_instance = None
+
+
+def get_model():
+    global model_instance
+    if model_instance is None:
+        model_instance = GradePredictionModel()
+    return model_instance
 
 # Define the resource classes at the top level
 class Predict(Resource):
@@ -32,7 +39,7 @@ class Predict(Resource):
         if not all(1 <= val <= 5 for val in user_input):
             return {"error": "Input values should be between 1 and 5."}, 400
 
-        percent, letter = model_instance.predict(user_input)
+        percent, letter = get_model().predict(user_input)
 
         return jsonify({
             'predicted_percent': percent,
@@ -44,6 +44,7 @@ from flask import Blueprint, request, jsonify, current_app
 from flask_restful import Api, Resource
 import requests
 import os
+from model.http_client import http_client
 
 # Blueprint setup - keeps original name for backwards compatibility
 groq_api = Blueprint('groq_api', __name__, url_prefix='/api')
@@ -116,7 +117,7 @@ class GroqAPI:
                 return {'message': 'GROQ_API_KEY not configured. Add it to .env file.'}, 500
 
             try:
-                response = requests.post(
+                response = http_client.post(
                     get_groq_server(),
                     headers={
                         'Authorization': f'Bearer {api_key}',
@@ -163,7 +164,7 @@ class GroqAPI:
                 temperature = data.get('temperature', 0.7)
                 max_tokens = data.get('max_tokens', 1024)
 
-                response = requests.post(
+                response = http_client.post(
                     get_groq_server(),
                     headers={
                         'Authorization': f'Bearer {api_key}',
@@ -231,7 +232,7 @@ class GroqAPI:
 
                 prompt = prompts.get(task, prompts['summarize'])
 
-                response = requests.post(
+                response = http_client.post(
                     get_groq_server(),
                     headers={
                         'Authorization': f'Bearer {api_key}',
@@ -0,0 +1,64 @@
+""" Database health and connection pool statistics, GET /api/health/db """
+from flask import Blueprint
+from flask_restful import Api, Resource
+import time
+
+from __init__ import app, db
+from model.engine import pool_status, sqlite_settings, replica_engine
+
+health_api = Blueprint('health_api', __name__, url_prefix='/api')
+
+# API docs https://flask-restful.readthedocs.io/en/latest/api.html
+api = Api(health_api)
+
+
+class HealthAPI:
+
+    class _Database(Resource):
+        """
+        Database health check - GET /api/health/db
+
+        Runs SELECT 1 through the pool and reports its latency with the pool counters, for load
+        balancer probes and for sizing DB_POOL_SIZE / DB_MAX_OVERFLOW, and the same for the read
+        replica when one is configured.  Answers 503 with only the status when the primary cannot be
+reached, the error is logged.
+        """
+        def get(self):
+            engine = db.engine
+            report = {'backend': engine.dialect.name, 'pool': pool_status(engine)}
+            started = time.perf_counter()
+            try:
+                with engine.connect() as connection:
+                    connection.exec_driver_sql("SELECT 1").scalar()
+                    if engine.dialect.name == 'sqlite':
+                        report['pragmas'] = sqlite_settings(connection)
+            except Exception:
+                # Driver errors name hosts, databases and users, they go to the log, not to this public probe
+                app.logger.exception("Database health check failed")
+                return {'status': 'unavailable'}, 503
+            report['status'] = 'healthy'
+            report['ping_ms'] = round((time.perf_counter() - started) * 1000, 2)
+            report['pool_settings'] = {key: app.config[key] for key in
+                                       ('DB_POOL_SIZE', 'DB_MAX_OVERFLOW', 'DB_POOL_RECYCLE', 'DB_POOL_PRE_PING', 'DB_POOL_TIMEOUT')} \
+                if engine.dialect.name == 'mysql' else None
+            report['replica'] = self.replica()
+            return report, 200
+
+        @staticmethod
+        def replica():
+            # A failing replica is reported but does not fail the check, the primary still serves
+            engine = replica_engine()
+            if engine is None:
+                return None
+            status = {'pool': pool_status(engine)}
+            started = time.perf_counter()
+            try:
+                with engine.connect() as connection:
+                    connection.exec_driver_sql("SELECT 1").scalar()
+                status.update({'status': 'healthy', 'ping_ms': round((time.perf_counter() - started) * 1000, 2)})
+            except Exception:
+                app.logger.exception("Replica health check failed")
+                status['status'] = 'unavailable'
+            return status
+
+    api.add_resource(_Database, '/health/db')
@@ -0,0 +1,70 @@
+""" Fast JSON encoding for Flask views and flask_restful resources, installed by __init__.py """
+from flask import current_app, make_response
+from flask.json.provider import DefaultJSONProvider
+import flask_restful
+
+try:
+    import orjson
+except ImportError:  # optional, the stdlib encoder is used without it
+    orjson = None
+
+
+class OrjsonProvider(DefaultJSONProvider):
+    """
+    OrjsonProvider
+
+    app.json backed by orjson, several times faster than the stdlib encoder on large lists such as
+    /api/export/all, /api/user and /api/post/all.
+
+    Output matches the default provider: datetime and date still go through Flask's default (HTTP
+    date strings) and Decimal, UUID and dataclasses are handled the same way.  Differences are
+    non-ASCII text sent as UTF-8 instead of \\u escapes (what JSON_AS_ASCII=False asked for) and keys
+    kept in insertion order rather than sorted.  Anything orjson refuses, such as integers beyond
+    64 bits, falls back to the stdlib encoder.  Request bodies are still parsed by the stdlib.
+    """
+    sort_keys = False
+    ensure_ascii = False
+
+    def _options(self):
+        option = orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+        if self.sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        if (self.compact is None and self._app.debug) or self.compact is False:
+            option |= orjson.OPT_INDENT_2
+        return option
+
+    def encode(self, obj):
+        """Serialize obj to UTF-8 bytes."""
+        try:
+            return orjson.dumps(obj, default=self.default, option=self._options())
+        except orjson.JSONEncodeError:
+            return super().dumps(obj).encode('utf-8')
+
+    def dumps(self, obj, **kwargs):
+        if kwargs:
+            # Explicit json.dumps arguments (indent, separators, ...) keep stdlib semantics
+            return super().dumps(obj, **kwargs)
+        return self.encode(obj).decode('utf-8')
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(self.encode(obj), mimetype=self.mimetype)
+
+
+def output_json(data, code, headers=None):
+    """flask_restful representation for application/json, encoded by app.json like jsonify."""
+    json = current_app.json
+    body = json.encode(data) if isinstance(json, OrjsonProvider) else json.dumps(data).encode('utf-8')
+    response = make_response(body + b"\n", code)
+    response.headers.extend(headers or {})
+    return response
+
+
+def install_json_provider(app):
+    """Use orjson for app.json and for every flask_restful Api created afterwards."""
+    if orjson is None:
+        return False
+    app.json = OrjsonProvider(app)
+    # Api() copies DEFAULT_REPRESENTATIONS when constructed, the api modules are imported after this
+    flask_restful.DEFAULT_REPRESENTATIONS[:] = [('application/json', output_json)]
+    return True
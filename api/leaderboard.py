@@ -11,6 +11,7 @@ from flask_restful import Api, Resource
 from flask_login import current_user
 
 from api.authorize import token_required
+from api.conditional import etag_version
 from model.leaderboard import ScoreCounterEvent, ElementaryLeaderboardEvent
 
 
@@ -33,6 +34,7 @@ def _normalize_payload(body):
 
 
 class ScoreCounterAPI(Resource):
+	@etag_version(ScoreCounterEvent.version)
 	def get(self):
 		game_name = request.args.get('gameName')
 		limit = request.args.get('limit', 200, type=int)
@@ -40,7 +42,7 @@ class ScoreCounterAPI(Resource):
 		events = ScoreCounterEvent.get_all(game_name=game_name, limit=limit)
 		return jsonify([event.read() for event in events])
 
-	@token_required()
+	@token_required(slim=True)
 	def post(self):
 		body = request.get_json() or {}
 		payload = _normalize_payload(body)
@@ -60,6 +62,7 @@ class ScoreCounterAPI(Resource):
 
 
 class ElementaryLeaderboardAPI(Resource):
+	@etag_version(ElementaryLeaderboardEvent.version)
 	def get(self):
 		game_name = request.args.get('gameName')
 		limit = request.args.get('limit', 200, type=int)
@@ -67,7 +70,7 @@ class ElementaryLeaderboardAPI(Resource):
 		events = ElementaryLeaderboardEvent.get_all(game_name=game_name, limit=limit)
 		return jsonify([event.read() for event in events])
 
-	@token_required()
+	@token_required(slim=True)
 	def post(self):
 		body = request.get_json() or {}
 		payload = _normalize_payload(body)
@@ -89,7 +92,7 @@ class ElementaryLeaderboardAPI(Resource):
 
 
 class ElementaryLeaderboardItemAPI(Resource):
-	@token_required()
+	@token_required(slim=True)
 	def delete(self, event_id):
 		event = ElementaryLeaderboardEvent.get_by_id(event_id)
 		if not event:
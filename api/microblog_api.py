@@ -5,20 +5,36 @@ Handles CRUD operations for micro blog posts, replies, reactions, and topics
 from flask import Blueprint, request, jsonify, g
 from flask_restful import Api, Resource
 from api.authorize import token_required
+from api.conditional import etag_version
+from api.response_cache import cached
 from model.microblog import MicroBlog, Topic
+from model.pagination import InvalidCursor
 from __init__ import db
 
 
 microblog_api = Blueprint('microblog_api', __name__, url_prefix='/api')
 api = Api(microblog_api)
 
+# Largest ?limit= of the page embed, each limit is cached separately
+PAGE_FEED_MAX_LIMIT = 100
+
+
+def _page_limit():
+    return min(max(request.args.get('limit', 20, type=int), 1), PAGE_FEED_MAX_LIMIT)
+
+
+def _page_feed_version(page_key):
+    """ETag fingerprint of a page's discussion, the caller's id is added by etag_version"""
+    feed = Topic.page_feed(page_key, _page_limit())
+    return feed['version'] if feed else None
+
 
 class MicroBlogAPI:
   
    class _CRUD(Resource):
        """MicroBlog CRUD operations"""
       
-       @token_required()
+       @token_required(slim=True)
        def post(self):
            """Create a new micro blog post"""
            current_user = g.current_user
@@ -76,11 +92,16 @@ class MicroBlogAPI:
            except Exception as e:
                return {'message': f'Error creating micro blog post: {str(e)}'}, 500
       
-       @token_required()
+       @token_required(slim=True)
        def get(self):
-           """Get micro blog posts with optional filtering"""
+           """
+           Get micro blog posts with optional filtering, most recent first
+
+           Pass nextCursor back as ?cursor= for the following page of the same filter.
+           """
            # Query parameters
            limit = request.args.get('limit', 200, type=int)
+           cursor = request.args.get('cursor')
            topic_id = request.args.get('topicId', type=int)
            page_path = request.args.get('pagePath')
            user_id = request.args.get('userId', type=int)
@@ -88,27 +109,30 @@ class MicroBlogAPI:
           
            try:
                if search:
-                   microblogs = MicroBlog.search_content(search, limit)
+                   microblogs = MicroBlog.search_content(search, limit, cursor)
                elif topic_id:
-                   microblogs = MicroBlog.get_by_topic(topic_id, limit)
+                   microblogs = MicroBlog.get_by_topic(topic_id, limit, cursor)
                elif page_path:
                    topic = Topic.get_by_page_path(page_path)
                    if topic:
-                       microblogs = MicroBlog.get_by_topic(topic.id, limit)
+                       microblogs = MicroBlog.get_by_topic(topic.id, limit, cursor)
                    else:
                        microblogs = []
                elif user_id:
-                   microblogs = MicroBlog.get_by_user(user_id, limit)
+                   microblogs = MicroBlog.get_by_user(user_id, limit, cursor)
                else:
-                   microblogs = MicroBlog.get_all(limit)
+                   microblogs = MicroBlog.get_all(limit, cursor)
                return jsonify({
                    'microblogs': microblogs,
-                   'count': len(microblogs)
+                   'count': len(microblogs),
+                   'nextCursor': getattr(microblogs, 'next_cursor', None)
                })
+           except InvalidCursor as e:
+               return {'message': e.description}, 400
            except Exception as e:
                return {'message': f'Error retrieving micro blog posts: {str(e)}'}, 500
       
-       @token_required()
+       @token_required(slim=True)
        def put(self):
            """Update a micro blog post"""
            current_user = g.current_user
@@ -142,7 +166,7 @@ class MicroBlogAPI:
            except Exception as e:
                return {'message': f'Error updating micro blog post: {str(e)}'}, 500
       
-       @token_required()
+       @token_required(slim=True)
        def delete(self):
            """Delete a micro blog post"""
            current_user = g.current_user
@@ -174,7 +198,7 @@ class MicroBlogAPI:
    class _Reply(Resource):
        """Handle replies to micro blog posts"""
       
-       @token_required()
+       @token_required(slim=True)
        def post(self):
            """Add a reply to a micro blog post"""
            current_user = g.current_user
@@ -214,19 +238,29 @@ class MicroBlogAPI:
 
 
        def get(self):
-           """Fetch replies for a specific microblog post (public)"""
+           """
+           Fetch replies for a specific microblog post (public), oldest first
+
+           count is the number of replies in the thread.  Pass nextCursor back as ?cursor= for the
+           following page.
+           """
            post_id = request.args.get('postId', type=int) or request.args.get('microblogId', type=int)
+           limit = request.args.get('limit', 50, type=int)
+           cursor = request.args.get('cursor')
            if not post_id:
                return {'message': 'postId query param is required'}, 400
            microblog = MicroBlog.get_by_id(post_id)
            if not microblog:
                return {'message': 'MicroBlog post not found'}, 404
-           replies = microblog.get_replies()
-           return jsonify({'replies': replies, 'count': len(replies)})
+           try:
+               replies = microblog.get_replies(limit, cursor)
+           except InvalidCursor as e:
+               return {'message': e.description}, 400
+           return jsonify({'replies': replies, 'count': microblog._reply_count, 'nextCursor': replies.next_cursor})
   
    class _Reaction(Resource):
        """Handle reactions to micro blog posts"""
-       @token_required()
+       @token_required(slim=True)
        def post(self):
            """Add a reaction to a micro blog post"""
            current_user = g.current_user
@@ -273,23 +307,20 @@ class MicroBlogAPI:
                microblog.add_reaction(user_id, reaction_type)
 
 
-               # Refresh the record to make sure we return updated data
-               from __init__ import db
-               db.session.refresh(microblog)
-
-
                return jsonify({
                    'message': 'Reaction added successfully',
                    'microblog': microblog.read()
                })
 
 
+           except ValueError as e:
+               return {'message': str(e)}, 400
            except Exception as e:
                return {'message': f'Error adding reaction: {str(e)}'}, 500
 
 
       
-       @token_required()
+       @token_required(slim=True)
        def delete(self):
            """Remove a reaction from a micro blog post"""
            current_user = g.current_user
@@ -333,7 +364,7 @@ class TopicAPI:
    class _CRUD(Resource):
        """Topic CRUD operations for page-based topics"""
       
-       @token_required()
+       @token_required(slim=True)
        def post(self):
            """Create a new topic for a page (Admin only)"""
            current_user = g.current_user
@@ -382,6 +413,7 @@ class TopicAPI:
            except Exception as e:
                return {'message': f'Error creating topic: {str(e)}'}, 500
       
+       @cached(ttl=60, tags=('topics',))
        def get(self):
            """Get topics with optional filtering (public endpoint)"""
            # Query parameters
@@ -426,7 +458,7 @@ class TopicAPI:
            except Exception as e:
                return {'message': f'Error retrieving topics: {str(e)}'}, 500
       
-       @token_required()
+       @token_required(slim=True)
        def put(self):
            """Update topic settings (Admin only)"""
            current_user = g.current_user
@@ -461,8 +493,15 @@ class TopicAPI:
    class _PageMicroblogs(Resource):
        """Get microblogs for a specific page/topic"""
       
+       @etag_version(_page_feed_version, private=True)
        def get(self, page_key):
-           """Get microblogs for a specific page (public endpoint with optional auth)"""
+           """
+           Get microblogs for a specific page (public endpoint with optional auth)
+
+           The topic and its posts come from Topic.page_feed, cached per topic; only canPost and
+           userPostCount depend on the caller, from a count cached per topic and user.  A cached
+           anonymous view runs no query.
+           """
            # Get current user if authenticated (optional)
            current_user = None
            try:
@@ -472,37 +511,27 @@ class TopicAPI:
            except:
                pass  # No auth provided, continue as anonymous
           
-           # Query parameters
-           limit = request.args.get('limit', 20, type=int)
-          
            try:
-               # Get topic by page key
-               topic = Topic.get_by_page_key(page_key)
-               if not topic:
+               feed = Topic.page_feed(page_key, _page_limit())
+               if not feed:
                    return {'message': 'Page topic not found'}, 404
+               topic = feed['topic']
               
-               if not topic._is_active:
+               if not topic['isActive']:
                    return {'message': 'This discussion is currently disabled'}, 403
               
                # Check if anonymous users can view
-               if not topic._allow_anonymous and not current_user:
+               if not topic['allowAnonymous'] and not current_user:
                    return {'message': 'Authentication required to view this discussion'}, 401
               
-               # Get recent posts for this topic
-               user_id = current_user.id if current_user else None
-               posts = topic.get_recent_posts(limit=limit, user_id=user_id)
-              
                # Check if user can post more messages
-               can_post = False
-               if current_user:
-                   can_post = topic.can_user_post(current_user.id)
-              
+               post_count = Topic.cached_user_post_count(topic['id'], current_user.id) if current_user else 0
                return jsonify({
-                   'topic': topic.read(),
-                   'microblogs': posts,
-                   'count': len(posts),
-                   'canPost': can_post,
-                   'userPostCount': topic.get_user_post_count(user_id) if user_id else 0
+                   'topic': topic,
+                   'microblogs': feed['microblogs'],
+                   'count': len(feed['microblogs']),
+                   'canPost': bool(current_user) and post_count < topic['maxPostsPerUser'],
+                   'userPostCount': post_count
                })
               
            except Exception as e:
@@ -512,7 +541,7 @@ class TopicAPI:
    class _AutoCreate(Resource):
        """Auto-create topic for a page if it doesn't exist"""
       
-       @token_required()
+       @token_required(slim=True)
        def post(self):
            """Auto-create or get topic for a page"""
            # Query parameters
@@ -0,0 +1,395 @@
+""" Per-request SQL and latency instrumentation, reported at /api/admin/perf """
+from collections import OrderedDict, deque
+from flask import Blueprint, request, g, current_app, has_request_context
+from flask_restful import Api, Resource
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+import threading
+import time
+
+from __init__ import app
+from api.authorize import auth_required
+from model.password import password_hasher
+from model.principal import principal_cache
+from model.cache import response_cache
+from model.engine import is_statement_timeout
+from model.http_client import http_client
+
+perf_api = Blueprint('perf_api', __name__, url_prefix='/api/admin')
+
+# API docs https://flask-restful.readthedocs.io/en/latest/api.html
+api = Api(perf_api)
+
+# Upper bounds (ms) of the wall time histogram buckets, the last bucket catches everything slower
+HISTOGRAM_BOUNDS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+
+
+class PerfRecorder:
+    """
+    PerfRecorder
+
+    Keeps the recent requests in a ring buffer and running totals per endpoint.
+
+    Endpoints are keyed by method and URL rule ("GET /api/microblog/<int:id>"), so path parameters
+    group together.  The totals cover everything since start or the last reset, while percentiles
+    are computed from the ring buffer and so describe recent traffic only.
+
+    Attributes:
+        recent (deque): The last max_size request records.
+        endpoints (dict): Running totals and a wall time histogram per endpoint.
+    """
+
+    def __init__(self, max_size=2000):
+        self.recent = deque(maxlen=max_size)
+        self.endpoints = {}
+        self.since = time.time()
+        self._lock = threading.Lock()
+
+    def record(self, entry):
+        with self._lock:
+            self.recent.append(entry)
+            totals = self.endpoints.get(entry['endpoint'])
+            if totals is None:
+                totals = self.endpoints[entry['endpoint']] = {
+                    'count': 0, 'errors': 0, 'queries': 0, 'max_queries': 0, 'max_repeat': 0,
+                    'sql_ms': 0.0, 'wall_ms': 0.0, 'max_wall_ms': 0.0, 'bytes': 0,
+                    'histogram': [0] * (len(HISTOGRAM_BOUNDS) + 1),
+                }
+            totals['count'] += 1
+            totals['errors'] += entry['status'] >= 500
+            totals['queries'] += entry['queries']
+            totals['max_queries'] = max(totals['max_queries'], entry['queries'])
+            totals['max_repeat'] = max(totals['max_repeat'], entry['max_repeat'])
+            totals['sql_ms'] += entry['sql_ms']
+            totals['wall_ms'] += entry['wall_ms']
+            totals['max_wall_ms'] = max(totals['max_wall_ms'], entry['wall_ms'])
+            totals['bytes'] += entry['bytes'] or 0
+            totals['histogram'][bucket_index(entry['wall_ms'])] += 1
+
+    def reset(self):
+        with self._lock:
+            self.recent.clear()
+            self.endpoints.clear()
+            self.since = time.time()
+
+    def report(self, endpoint=None, recent=20):
+        """Summarize every endpoint (or one), slowest average first, with the latest requests."""
+        with self._lock:
+            samples = {}
+            for entry in self.recent:
+                samples.setdefault(entry['endpoint'], []).append(entry['wall_ms'])
+            summary = []
+            for name, totals in self.endpoints.items():
+                if endpoint and name != endpoint:
+                    continue
+                count = totals['count']
+                walls = sorted(samples.get(name, []))
+                summary.append({
+                    'endpoint': name,
+                    'count': count,
+                    'errors': totals['errors'],
+                    'avg_queries': round(totals['queries'] / count, 2),
+                    'max_queries': totals['max_queries'],
+                    'max_repeat': totals['max_repeat'],
+                    'avg_sql_ms': round(totals['sql_ms'] / count, 2),
+                    'avg_wall_ms': round(totals['wall_ms'] / count, 2),
+                    'p50_ms': percentile(walls, 50),
+                    'p95_ms': percentile(walls, 95),
+                    'p99_ms': percentile(walls, 99),
+                    'max_wall_ms': round(totals['max_wall_ms'], 2),
+                    'avg_bytes': round(totals['bytes'] / count),
+                    'histogram': dict(zip([f"<={bound}ms" for bound in HISTOGRAM_BOUNDS] + ['slower'], totals['histogram'])),
+                })
+            latest = [entry for entry in self.recent if not endpoint or entry['endpoint'] == endpoint][-recent:]
+        summary.sort(key=lambda row: row['avg_wall_ms'], reverse=True)
+        return {'since': self.since, 'endpoints': summary, 'recent': latest}
+
+
+def bucket_index(wall_ms):
+    for index, bound in enumerate(HISTOGRAM_BOUNDS):
+        if wall_ms <= bound:
+            return index
+    return len(HISTOGRAM_BOUNDS)
+
+
+def percentile(ordered, pct):
+    if not ordered:
+        return None
+    return round(ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))], 2)
+
+
+def top_queries(queries, limit=5):
+    """Group identical statements, most total time first; a high count is the N+1 signature."""
+    grouped = OrderedDict()
+    for statement, seconds in queries:
+        count, total = grouped.get(statement, (0, 0.0))
+        grouped[statement] = (count + 1, total + seconds)
+    ranked = sorted(grouped.items(), key=lambda item: item[1][1], reverse=True)[:limit]
+    return [{'statement': statement[:500], 'count': count, 'ms': round(total * 1000, 2)} for statement, (count, total) in ranked]
+
+
+perf_recorder = PerfRecorder(max_size=app.config['PERF_BUFFER_SIZE'])
+
+
+# SQLAlchemy engine events, every engine, only counted while a request is being measured
+def _measuring():
+    return has_request_context() and 'perf_queries' in g
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if _measuring():
+        conn.info.setdefault('perf_started', []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    _pop_statement(conn, statement)
+
+
+def _execute_failed(context):
+    # Failed statements skip after_cursor_execute, pop their start so the stack stays balanced
+    if context.connection is not None:
+        _pop_statement(context.connection, context.statement)
+
+
+def _pop_statement(conn, statement):
+    started = conn.info.get('perf_started')
+    if not started:
+        return
+    seconds = time.perf_counter() - started.pop()
+    if statement is not None and _measuring():
+        g.perf_queries.append((statement, seconds))
+
+
+# Flask request lifecycle
+def _start_request():
+    g.perf_started = time.perf_counter()
+    g.perf_queries = []
+
+
+def _finish_request(response):
+    _record(response.status_code, response.calculate_content_length())
+    return response
+
+
+def _teardown_request(exc):
+    # Unhandled exceptions skip after_request, still count them as failed requests
+    if exc is not None:
+        _record(500, None)
+
+
+def _record(status, size):
+    started = g.pop('perf_started', None)
+    if started is None:
+        return
+    queries = g.pop('perf_queries', [])
+    wall_ms = (time.perf_counter() - started) * 1000
+    rule = request.url_rule.rule if request.url_rule else '<unmatched>'
+    repeats = {}
+    for statement, _ in queries:
+        repeats[statement] = repeats.get(statement, 0) + 1
+    entry = {
+        'endpoint': f"{request.method} {rule}",
+        'path': request.path,
+        'status': status,
+        'queries': len(queries),
+        'max_repeat': max(repeats.values(), default=0),
+        'sql_ms': round(sum(seconds for _, seconds in queries) * 1000, 2),
+        'wall_ms': round(wall_ms, 2),
+        'bytes': size,
+        'time': time.time(),
+    }
+    perf_recorder.record(entry)
+    if wall_ms >= current_app.config['PERF_SLOW_MS']:
+        current_app.logger.warning(
+            "Slow request %s %s: %.0f ms, %d queries (%.0f ms SQL), top queries: %s",
+            request.method, request.path, wall_ms, len(queries), entry['sql_ms'], top_queries(queries))
+
+
+class SlowQueryLog:
+    """
+    SlowQueryLog
+
+    The latest statements that ran longer than SLOW_QUERY_MS, or were stopped by the statement
+    timeout, with the endpoint that issued them.  Parameters are recorded by shape only (types and
+    counts), values such as password hashes never reach the log.
+    """
+
+    def __init__(self, max_size=500):
+        self.entries = deque(maxlen=max_size)
+        self.total = 0
+        self.timeouts = 0
+        self._lock = threading.Lock()
+
+    def record(self, entry):
+        with self._lock:
+            self.entries.append(entry)
+            self.total += 1
+            self.timeouts += entry['timed_out']
+
+    def clear(self):
+        with self._lock:
+            self.entries.clear()
+            self.total = 0
+            self.timeouts = 0
+
+    def report(self, limit=50):
+        """Latest entries first, and the slowest statements grouped over the whole buffer."""
+        with self._lock:
+            entries = list(self.entries)
+            total, timeouts = self.total, self.timeouts
+        grouped = {}
+        for entry in entries:
+            count, ms, slowest = grouped.get(entry['sql'], (0, 0.0, 0.0))
+            grouped[entry['sql']] = (count + 1, ms + entry['ms'], max(slowest, entry['ms']))
+        ranked = sorted(grouped.items(), key=lambda item: item[1][1], reverse=True)[:10]
+        return {
+            'total': total,
+            'timeouts': timeouts,
+            'top': [{'sql': sql, 'count': count, 'ms': round(ms, 2), 'max_ms': round(slowest, 2)}
+                    for sql, (count, ms, slowest) in ranked],
+            'recent': entries[-limit:][::-1] if limit > 0 else [],
+        }
+
+
+def parameters_shape(parameters, executemany):
+    """Types of the bound parameters, "3 x (int, str)" for executemany, never their values."""
+    def shape(params):
+        if isinstance(params, dict):
+            return '{' + ', '.join(f"{key}: {type(value).__name__}" for key, value in params.items()) + '}'
+        if isinstance(params, (list, tuple)):
+            return '(' + ', '.join(type(value).__name__ for value in params) + ')'
+        return type(params).__name__
+    if executemany and isinstance(parameters, (list, tuple)):
+        return f"{len(parameters)} x {shape(parameters[0]) if parameters else '()'}"
+    return shape(parameters)
+
+
+slow_query_log = SlowQueryLog(max_size=app.config['SLOW_QUERY_BUFFER_SIZE'])
+
+
+def _request_endpoint():
+    if not has_request_context():
+        return None, None
+    rule = request.url_rule.rule if request.url_rule else '<unmatched>'
+    return f"{request.method} {rule}", request.path
+
+
+def _record_slow(statement, parameters, executemany, seconds, timed_out=False):
+    ms = seconds * 1000
+    if ms < app.config['SLOW_QUERY_MS'] and not timed_out:
+        return
+    endpoint, path = _request_endpoint()
+    entry = {
+        'sql': ' '.join(statement.split())[:1000],
+        'params': parameters_shape(parameters, executemany)[:300],
+        'endpoint': endpoint,
+        'path': path,
+        'ms': round(ms, 2),
+        'timed_out': timed_out,
+        'time': time.time(),
+    }
+    slow_query_log.record(entry)
+    app.logger.warning("Slow query%s %.0f ms in %s: %s params %s", ' (timed out)' if timed_out else '',
+                       ms, endpoint or 'no request', entry['sql'][:300], entry['params'])
+
+
+def _before_slow_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('slow_started', []).append(time.perf_counter())
+
+
+def _after_slow_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info.get('slow_started')
+    if started:
+        _record_slow(statement, parameters, executemany, time.perf_counter() - started.pop())
+
+
+def _slow_execute_failed(context):
+    # Failed statements skip after_cursor_execute, record timeouts and keep the start stack balanced
+    started = context.connection.info.get('slow_started') if context.connection is not None else None
+    if not started:
+        return
+    seconds = time.perf_counter() - started.pop()
+    if context.statement is not None and is_statement_timeout(context.original_exception, context.dialect.name):
+        _record_slow(context.statement, context.parameters, bool(context.execution_context and
+                     context.execution_context.executemany), seconds, timed_out=True)
+
+
+def install_slow_query_log(flask_app):
+    """Record slow statements on every engine, see SLOW_QUERY_MS."""
+    if flask_app.extensions.get('slow_query_log_installed'):
+        return
+    event.listen(Engine, 'before_cursor_execute', _before_slow_execute)
+    event.listen(Engine, 'after_cursor_execute', _after_slow_execute)
+    event.listen(Engine, 'handle_error', _slow_execute_failed)
+    flask_app.extensions['slow_query_log_installed'] = True
+
+
+def install_perf(flask_app):
+    """Hook the recorder into SQLAlchemy and the Flask request lifecycle, see PERF_ENABLED."""
+    if flask_app.extensions.get('perf_installed'):
+        return
+    event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+    event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+    event.listen(Engine, 'handle_error', _execute_failed)
+    flask_app.before_request(_start_request)
+    flask_app.after_request(_finish_request)
+    flask_app.teardown_request(_teardown_request)
+    flask_app.extensions['perf_installed'] = True
+
+
+class PerfAPI:
+
+    class _Perf(Resource):
+        @auth_required(roles="Admin")
+        def get(self):
+            """Per-endpoint query counts, SQL time, latency percentiles and the latest requests."""
+            endpoint = request.args.get('endpoint')
+            recent = request.args.get('recent', 20, type=int)
+            report = perf_recorder.report(endpoint=endpoint, recent=recent)
+            report['enabled'] = bool(current_app.extensions.get('perf_installed'))
+            report['slow_ms'] = current_app.config['PERF_SLOW_MS']
+            report['password_hasher'] = password_hasher.stats()
+            report['principal_cache'] = principal_cache.stats()
+            report['response_cache'] = response_cache.stats()
+            report['http_client'] = http_client.stats()
+            return report
+
+        @auth_required(roles="Admin")
+        def delete(self):
+            """Start a new measurement window."""
+            perf_recorder.reset()
+            return {'message': 'Performance statistics reset'}
+
+    class _SlowQueries(Resource):
+        @auth_required(roles="Admin")
+        def get(self):
+            """Latest slow or timed out statements, newest first, and the costliest statements."""
+            report = slow_query_log.report(limit=request.args.get('limit', 50, type=int))
+            report['enabled'] = bool(current_app.extensions.get('slow_query_log_installed'))
+            report['slow_ms'] = current_app.config['SLOW_QUERY_MS']
+            report['statement_timeout_ms'] = current_app.config['DB_STATEMENT_TIMEOUT_MS']
+            return report
+
+        @auth_required(roles="Admin")
+        def delete(self):
+            slow_query_log.clear()
+            return {'message': 'Slow query log cleared'}
+
+    class _Upstreams(Resource):
+        @auth_required(roles="Admin")
+        def get(self):
+            """Outbound calls per upstream host: latency histogram and percentiles, statuses, retries, breaker state."""
+            return {
+                'upstreams': http_client.stats(),
+                'breaker': {'failures': http_client.breaker_failures, 'reset_s': http_client.breaker_reset},
+            }
+
+        @auth_required(roles="Admin")
+        def delete(self):
+            """Start a new measurement window, breakers keep their state."""
+            http_client.reset_stats()
+            return {'message': 'Upstream statistics reset'}
+
+    api.add_resource(_Perf, '/perf')
+    api.add_resource(_SlowQueries, '/slow-queries')
+    api.add_resource(_Upstreams, '/upstreams')
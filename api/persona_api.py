@@ -4,6 +4,8 @@ from flask import Blueprint, g, request, jsonify
 from flask_restful import Api, Resource
 from api.authorize import auth_required, token_required
 from model.persona import Persona, UserPersona
+from model.cache import response_cache
+from api.response_cache import cached
 from model.user import User
 from __init__ import db
 
@@ -425,6 +427,7 @@ class PersonaAPI:
             return {'message': f'Failed to create persona {alias}, possibly duplicate alias'}, 400
 
     class _Read(Resource):
+        @cached(ttl=300, tags=('personas',))
         def get(self, id=None):
             """Get persona by ID or all personas"""
             if id is not None:
@@ -475,6 +478,7 @@ class PersonaAPI:
             # Commit changes
             try:
                 db.session.commit()
+                response_cache.invalidate('personas')
                 return jsonify(persona.read())
             except Exception as e:
                 db.session.rollback()
@@ -493,6 +497,7 @@ class PersonaAPI:
             try:
                 db.session.delete(persona)
                 db.session.commit()
+                response_cache.invalidate('personas')
                 return {'message': f'Deleted persona: {json_data["alias"]}', 'persona': json_data}, 200
             except Exception as e:
                 db.session.rollback()
@@ -7,7 +7,29 @@ from flask_restful import Api, Resource
 from __init__ import db
 from model.post import Post
 from model.user import User
+from model.pagination import InvalidCursor
 from api.authorize import token_required
+from api.conditional import etag_version
+
+
+# Page size when a client pages with ?cursor= and gives no limit
+DEFAULT_PAGE_SIZE = 20
+
+
+def _post_list(fetch, *args):
+    """
+    Run a Post list query with the ?limit= and ?cursor= parameters.
+
+    Without cursor the response stays a plain list, all posts unless limit is given.  With cursor
+    (empty for the first page) it is {'posts', 'count', 'nextCursor'}, pass nextCursor back for the
+    next page, None on the last one.
+    """
+    limit = request.args.get('limit', type=int)
+    cursor = request.args.get('cursor')
+    if cursor is None:
+        return fetch(*args, limit=limit), 200
+    posts = fetch(*args, limit=limit or DEFAULT_PAGE_SIZE, cursor=cursor)
+    return {'posts': posts, 'count': len(posts), 'nextCursor': posts.next_cursor}, 200
 
 
 # Create Blueprint
@@ -20,7 +42,7 @@ class PostAPI(Resource):
     POST API - Create a new post
     Requires JWT authentication
     """
-    @token_required()
+    @token_required(slim=True)
     def post(self):
         """
         Create a new post
@@ -73,15 +95,18 @@ class PostListAPI(Resource):
     GET API - Get all posts
     Public endpoint - No authentication required for viewing
     """
+    @etag_version(Post.version)
     def get(self):
         """
         Get all top-level posts with their replies
         Returns posts in reverse chronological order
         Public endpoint - anyone can view posts
+        Query parameters: ?limit=, ?cursor= (see _post_list)
         """
         try:
-            posts = Post.get_all()
-            return posts, 200
+            return _post_list(Post.get_all)
+        except InvalidCursor as e:
+            return {'message': e.description}, 400
         except Exception as e:
             return {'message': f'Error fetching posts: {str(e)}'}, 500
 
@@ -91,18 +116,20 @@ class PostPageAPI(Resource):
     GET API - Get posts for a specific page
     Public endpoint (no authentication required)
     """
+    @etag_version(Post.version)
     def get(self):
         """
         Get all posts for a specific page
-        Query parameter: ?url=/lesson/url
+        Query parameter: ?url=/lesson/url, optional ?limit=, ?cursor= (see _post_list)
         """
         try:
             page_url = request.args.get('url')
             if not page_url:
                 return {'message': 'Page URL is required'}, 400
             
-            posts = Post.get_by_page(page_url)
-            return posts, 200
+            return _post_list(Post.get_by_page, page_url)
+        except InvalidCursor as e:
+            return {'message': e.description}, 400
         except Exception as e:
             return {'message': f'Error fetching posts: {str(e)}'}, 500
 
@@ -122,7 +149,7 @@ class PostDetailAPI(Resource):
         except Exception as e:
             return {'message': f'Error fetching post: {str(e)}'}, 500
     
-    @token_required()
+    @token_required(slim=True)
     def put(self, post_id):
         """
         Update a post
@@ -162,7 +189,7 @@ class PostDetailAPI(Resource):
         except Exception as e:
             return {'message': f'Error updating post: {str(e)}'}, 500
     
-    @token_required()
+    @token_required(slim=True)
     def delete(self, post_id):
         """
         Delete a post
@@ -194,7 +221,7 @@ class PostReplyAPI(Resource):
     POST API - Create a reply to a post
     Requires JWT authentication
     """
-    @token_required()
+    @token_required(slim=True)
     def post(self):
         """
         Create a reply to an existing post
@@ -259,8 +286,9 @@ class PostUserAPI(Resource):
             if not user:
                 return {'message': 'User not found'}, 404
             
-            posts = Post.get_by_user(user_id)
-            return posts, 200
+            return _post_list(Post.get_by_user, user_id)
+        except InvalidCursor as e:
+            return {'message': e.description}, 400
         except Exception as e:
             return {'message': f'Error fetching user posts: {str(e)}'}, 500
 
@@ -0,0 +1,75 @@
+""" cached(): application-level response cache for Resources and blueprint routes, see model/cache.py """
+from flask import current_app, request
+from flask_restful.utils import unpack
+from functools import wraps
+
+from api.authorize import get_current_user
+from model.cache import response_cache
+
+# Headers that belong to one client and are never replayed from the cache
+PRIVATE_HEADERS = ('Set-Cookie', 'Content-Length')
+
+
+def cache_key(vary):
+    """Path plus the request parts the response depends on."""
+    parts = [request.path]
+    if 'args' in vary:
+        parts.append(request.query_string.decode('utf-8', 'replace'))
+    if 'role' in vary or 'user' in vary:
+        user = get_current_user()
+        if 'role' in vary:
+            parts.append(f"role={getattr(user, 'role', None)}")
+        if 'user' in vary:
+            parts.append(f"user={user.id if user else None}")
+    return ' '.join(parts)
+
+
+def _as_response(result):
+    """A Resource's dict/tuple result or a view's Response, as a Response."""
+    if isinstance(result, current_app.response_class):
+        return result
+    data, code, headers = unpack(result)
+    response = current_app.json.response(data)
+    response.status_code = code
+    response.headers.extend(headers or {})
+    return response
+
+
+def cached(ttl, tags=(), vary=('args',)):
+    '''
+    Cache a GET view's successful responses in response_cache for ttl seconds.
+
+    Args:
+        ttl: seconds an entry may be served, also the bound on staleness for writes that do not
+             go through the model methods (bulk imports, other services)
+        tags: invalidation tags, formatted with the view's URL parameters ('topic:{page_key}');
+              models call response_cache.invalidate() with the same tags after committing
+        vary: request parts that make responses differ, any of 'args' (query string), 'role'
+              (the caller's role) and 'user' (the caller's id); the path is always part of the key
+
+    Only 200 responses are cached.  Set-Cookie is never replayed.  Place it inside etag_version so
+    unchanged polls are still answered 304 before the cache is looked at.
+    '''
+    def decorator(func):
+        @wraps(func)
+        def decorated(*args, **kwargs):
+            if request.method != 'GET' or not response_cache.enabled:
+                return func(*args, **kwargs)
+            key = cache_key(vary)
+            hit = response_cache.get(key)
+            if hit is not None:
+                response = current_app.response_class(hit['body'], status=hit['status'], headers=hit['headers'])
+                response.headers['X-Cache'] = 'HIT'
+                return response
+            entry_tags = [tag.format(**kwargs) for tag in tags]
+            # Versions before computing: a write committed meanwhile makes this entry stale at once
+            versions = response_cache.versions(entry_tags)
+            response = _as_response(func(*args, **kwargs))
+            if response.status_code == 200 and not response.is_streamed and not response.direct_passthrough:
+                headers = [(name, value) for name, value in response.headers.items() if name not in PRIVATE_HEADERS]
+                value = {'status': 200, 'headers': headers, 'body': response.get_data(as_text=True)}
+                response_cache.set(key, value, ttl, entry_tags, versions)
+            response.headers['X-Cache'] = 'MISS'
+            return response
+        return decorated
+    return decorator
@@ -0,0 +1,47 @@
+""" Full-text search API, GET /api/search over microblogs, replies, posts and topics """
+from flask import Blueprint, request, jsonify
+from flask_restful import Api, Resource
+
+from api.authorize import token_required
+from model.search import SOURCES, search
+
+search_api = Blueprint('search_api', __name__, url_prefix='/api')
+
+# API docs https://flask-restful.readthedocs.io/en/latest/api.html
+api = Api(search_api)
+
+MAX_LIMIT = 50
+
+
+class SearchAPI:
+
+    class _Search(Resource):
+        @token_required(slim=True)
+        def get(self):
+            """
+            Ranked search, best matches first.
+
+            ?q= words, all required, "flask*" also matches flasks and flask_restful
+            ?kinds= comma separated subset of microblog, reply, post, topic (all by default)
+            ?limit= results per page (default 20, at most 50), ?page= 1-based page, nextPage is
+            null on the last page
+            """
+            query = request.args.get('q', '').strip()
+            if not query:
+                return {'message': 'q is required'}, 400
+            kinds = [kind.strip() for kind in request.args.get('kinds', '').split(',') if kind.strip()]
+            unknown = [kind for kind in kinds if kind not in SOURCES]
+            if unknown:
+                return {'message': f"unknown kinds {', '.join(unknown)}, use {', '.join(SOURCES)}"}, 400
+            limit = min(max(request.args.get('limit', 20, type=int), 1), MAX_LIMIT)
+            page = max(request.args.get('page', 1, type=int), 1)
+
+            hits, more = search(query, kinds or None, limit, page)
+            return jsonify({
+                'results': hits,
+                'count': len(hits),
+                'page': page,
+                'nextPage': page + 1 if more else None,
+            })
+
+    api.add_resource(_Search, '/search')
@@ -3,6 +3,7 @@ from flask_restful import Api, Resource # used for REST API building
 from datetime import datetime
 import jwt
 from api.authorize import token_required
+from api.response_cache import cached
 from model.user import Section
 
 section_api = Blueprint('section_api', __name__,
@@ -42,6 +43,7 @@ class SectionAPI:
             # failure returns error
             return {'message': f'Processed {name}, either a format error or User ID {abbreviation} is duplicate'}, 400
 
+        @cached(ttl=300, tags=('sections',))
         def get(self):
             sections = Section.query.all() # extract all sections from the database
              
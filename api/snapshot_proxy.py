@@ -7,6 +7,7 @@ import os
 import requests
 from flask import Blueprint, jsonify
 from api.authorize import token_required
+from model.http_client import http_client
 
 snapshot_proxy = Blueprint('snapshot_proxy', __name__, url_prefix='/api/snapshot')
 
@@ -20,7 +21,7 @@ def _proxy_snapshot(snapshot_type: str):
         return jsonify({"success": False, "message": "AUTOMATOR_API_KEY not configured on Flask server"}), 500
 
     try:
-        resp = requests.post(
+        resp = http_client.post(
             f"{AUTOMATOR_URL}/api/snapshot/{snapshot_type}",
             headers={"X-API-Key": AUTOMATOR_API_KEY},
             timeout=30,
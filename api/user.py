@@ -3,10 +3,13 @@ from flask import Blueprint, app, request, jsonify, current_app, Response, g
 from flask_restful import Api, Resource # used for REST API building
 from datetime import datetime
 from __init__ import app, db
-from api.authorize import token_required
+from api.authorize import token_required, issue_token, set_token_cookie
 from model.user import User
 from model.github import GitHubUser
+from model.password import PasswordQueueFull
+from model.pagination import encode_cursor, keyset_page
 import os
+import time
 
 user_api = Blueprint('user_api', __name__,
                    url_prefix='/api')
@@ -14,6 +17,12 @@ user_api = Blueprint('user_api', __name__,
 # API docs https://flask-restful.readthedocs.io/en/latest/api.html
 api = Api(user_api)
 
+
+def _hasher_busy(e):
+    ''' 503 for a saturated pbkdf2 pool (model/password.py), the client backs off rather than queue '''
+    db.session.rollback()
+    return {'message': str(e), 'error': 'Service Unavailable'}, 503, {'Retry-After': '2'}
+
 class UserAPI:        
     class _ID(Resource):  # Individual identification API operation
         @token_required()
@@ -104,12 +113,15 @@ class UserAPI:
             ''' User object creation '''
             #1: Setup minimal User object using __init__ method
             password = body.get('password')
-            if password is not None:
-                if len(password) < 8 and not password.startswith("pbkdf2:sha256:"):
-                    return {'message': 'Password must be at least 8 characters'}, 400
-                user_obj = User(name=name, uid=uid, password=password)
-            else:
-                user_obj = User(name=name, uid=uid)
+            try:
+                if password is not None:
+                    if len(password) < 8 and not password.startswith("pbkdf2:sha256:"):
+                        return {'message': 'Password must be at least 8 characters'}, 400
+                    user_obj = User(name=name, uid=uid, password=password)
+                else:
+                    user_obj = User(name=name, uid=uid)
+            except PasswordQueueFull as e:
+                return _hasher_busy(e)
             
             # Handle additional fields that frontend sends
             # Create a cleaned body with only the fields User model expects
@@ -158,6 +170,8 @@ class UserAPI:
                 # return response, the created user details as a JSON object
                 return jsonify(user.read())
                 
+            except PasswordQueueFull as e:
+                return _hasher_busy(e)
             except Exception as e:
                 #print(f"Error creating user: {e}")
                 return {'message': f'Error creating user: {str(e)}'}, 500
@@ -171,6 +185,8 @@ class UserAPI:
             
             Query Parameters:
                 page (int): Page number for pagination (starts at 1)
+                cursor (str): Keyset pagination instead of page, empty for the first page, then the
+                              previous response's next_cursor; stable while users are added
                 per_page (int): Number of users per page (default: 50, max: 200)
 
             Returns:
@@ -181,16 +197,27 @@ class UserAPI:
             
             # Get query parameters for pagination
             page = request.args.get('page', type=int)
-            per_page = min(request.args.get('per_page', 50, type=int), 200)
+            cursor = request.args.get('cursor')
+            per_page = max(1, min(request.args.get('per_page', 50, type=int), 200))
+            next_cursor = None
             
             """ User SQLAlchemy query returning list of all users """
-            if page:
+            if cursor is not None:
+                # Keyset pagination on id, no COUNT and no OFFSET
+                users = keyset_page(User.query, (User.id,), per_page, cursor, descending=False)
+                next_cursor = users.next_cursor
+                has_next = next_cursor is not None
+                has_prev = bool(cursor)
+                total = None
+            elif page:
                 # Paginated query
-                pagination = User.query.paginate(page=page, per_page=per_page, error_out=False)
+                pagination = User.query.order_by(User.id).paginate(page=page, per_page=per_page, error_out=False)
                 users = pagination.items
                 has_next = pagination.has_next
                 has_prev = pagination.has_prev
                 total = pagination.total
+                if has_next and users:
+                    next_cursor = encode_cursor([users[-1].id])
             else:
                 users = User.query.all() # extract all users from the database
                 has_next = False
@@ -209,7 +236,7 @@ class UserAPI:
                 json_ready.append(user_data)
             
             # return response, a list of user dictionaries in JSON format
-            if page:
+            if page or cursor is not None:
                 return jsonify({
                     'users': json_ready,
                     'pagination': {
@@ -217,7 +244,8 @@ class UserAPI:
                         'per_page': per_page,
                         'total': total,
                         'has_next': has_next,
-                        'has_prev': has_prev
+                        'has_prev': has_prev,
+                        'next_cursor': next_cursor
                     }
                 })
             else:
@@ -261,7 +289,10 @@ class UserAPI:
                     return {'message': f'User ID {body.get("uid")} not a valid GitHub account' }, 404
             
             # Update the User object to the database using custom update method
-            user.update(body)
+            try:
+                user.update(body)
+            except PasswordQueueFull as e:
+                return _hasher_busy(e)
             
             # return response, the updated user details as a JSON object
             return jsonify(user.read())
@@ -384,21 +415,22 @@ class UserAPI:
                 ''' Find user '''
     
                 user = User.query.filter_by(_uid=uid).first()
+
+                try:
+                    valid = user is not None and user.is_password(password)
+                except PasswordQueueFull as e:
+                    # Login storm, ask the client to back off rather than queue behind pbkdf2
+                    return _hasher_busy(e)
                 
-                if user is None or not user.is_password(password):
+                if not valid:
                     
                     return {'message': f"Invalid user id or password"}, 401
                             
                 # Check if user is found
                 if user:
                     try:
-                        token = jwt.encode(
-                            {"_uid": user._uid},
-                            current_app.config["SECRET_KEY"],
-                            algorithm="HS256"
-                        )
-                        # Return JSON response with cookie
-                        is_production = os.environ.get('IS_PRODUCTION', 'false').lower() == 'true'
+                        # Signed claims (id, role, version) with a short expiry, see api/authorize.py
+                        token = issue_token(user)
                         
                         # Create JSON response
                         response_data = {
@@ -412,28 +444,8 @@ class UserAPI:
                         }
                         resp = jsonify(response_data)
                         
-                        # Set cookie
-                        if is_production:
-                            resp.set_cookie(
-                                current_app.config["JWT_TOKEN_NAME"],
-                                token,
-                                max_age=43200,  # 12 hours in seconds
-                                secure=True,
-                                httponly=True,
-                                path='/',
-                                samesite='None',
-                                domain='.opencodingsociety.com'
-                            )
-                        else:
-                            resp.set_cookie(
-                                current_app.config["JWT_TOKEN_NAME"],
-                                token,
-                                max_age=43200,  # 12 hours in seconds
-                                secure=False,
-                                httponly=False,  # Set to True for more security if JS access not needed
-                                path='/',
-                                samesite='Lax'
-                            )
+                        # Set cookie, it outlives the access expiry so the token can be renewed
+                        set_token_cookie(resp, token, max_age=current_app.config["JWT_REFRESH_TTL"])
                         print(f"Token set: {token}")
                         return resp 
                     except Exception as e:
@@ -469,29 +481,7 @@ class UserAPI:
                 
                 # Prepare a response indicating the token has been invalidated
                 resp = Response("Token invalidated successfully")
-                is_production = os.environ.get('IS_PRODUCTION', 'false').lower() == 'true'
-                if is_production:
-                    resp.set_cookie(
-                        current_app.config["JWT_TOKEN_NAME"],
-                        token,
-                        max_age=0,  # Immediately expire the cookie
-                        secure=True,
-                        httponly=True,
-                        path='/',
-                        samesite='None',
-                        domain='.opencodingsociety.com'
-                
-                    )
-                else:
-                    resp.set_cookie(
-                        current_app.config["JWT_TOKEN_NAME"],
-                        token,
-                        max_age=0,  # Immediately expire the cookie
-                        secure=False,
-                        httponly=False,  # Set to True for more security if JS access not needed
-                        path='/',
-                        samesite='Lax'
-                    )
+                set_token_cookie(resp, token, max_age=0)  # Immediately expire the cookie
                 return resp
             except Exception as e:
                 return {
@@ -499,6 +489,39 @@ class UserAPI:
                     "error": str(e)
                 }, 500
 
+    class _Refresh(Resource):
+        def post(self):
+            ''' Renew the JWT cookie, re-checking the user's token version against the database '''
+            token = request.cookies.get(current_app.config["JWT_TOKEN_NAME"])
+            if not token:
+                return {'message': 'Token is missing', 'data': None, 'error': 'Unauthorized'}, 401
+            try:
+                data = jwt.decode(token, current_app.config["SECRET_KEY"], algorithms=["HS256"], options={"verify_exp": False})
+            except jwt.InvalidTokenError:
+                return {'message': 'Invalid token!', 'data': None, 'error': 'Unauthorized'}, 401
+            
+            # The refresh deadline is fixed at login, renewals never extend it
+            refresh_until = data.get('rexp')
+            if refresh_until is not None and refresh_until <= int(time.time()):
+                return {'message': 'Token has expired!', 'data': None, 'error': 'Unauthorized'}, 401
+            
+            user = User.query.filter_by(_uid=data.get('_uid')).first()
+            if user is None:
+                return {'message': 'Invalid Authentication token!', 'data': None, 'error': 'Unauthorized'}, 401
+            # A password or role change since the token was issued revokes it
+            if 'ver' in data and data['ver'] != user.token_version:
+                return {'message': 'Token has been revoked', 'data': None, 'error': 'Unauthorized'}, 401
+            
+            token = issue_token(user, refresh_until=refresh_until)
+            claims = jwt.decode(token, options={"verify_signature": False})
+            resp = jsonify({
+                'message': f'Token refreshed for {user._uid}',
+                'expires': claims['exp'],
+                'refresh_until': claims['rexp']
+            })
+            set_token_cookie(resp, token, max_age=claims['rexp'] - claims['iat'])
+            return resp
+
     class _GradeData(Resource):
         """
         Grade data API operations
@@ -693,7 +716,10 @@ class UserAPI:
             school = "?"
 
             # Create User object with auto-generated name
-            user_obj = User(name=name, uid=uid, password=password)
+            try:
+                user_obj = User(name=name, uid=uid, password=password)
+            except PasswordQueueFull as e:
+                return _hasher_busy(e)
 
             # Build cleaned body with all fields filled
             cleaned_body = {
@@ -723,6 +749,8 @@ class UserAPI:
                 # Return the created user details
                 return jsonify(user.read())
 
+            except PasswordQueueFull as e:
+                return _hasher_busy(e)
             except Exception as e:
                 return {'message': f'Error creating guest user: {str(e)}'}, 500
 
@@ -733,6 +761,7 @@ class UserAPI:
     api.add_resource(_GuestCRUD, '/user/guest')
     api.add_resource(_Section, '/user/section')
     api.add_resource(_Security, '/authenticate')
+    api.add_resource(_Refresh, '/authenticate/refresh')
     api.add_resource(_GradeData, '/grade_data')
     api.add_resource(_APExam, '/apexam')
     api.add_resource(_School, '/school')
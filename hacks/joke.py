@@ -4,6 +4,8 @@ import requests  # used for testing
 import random
 
 from hacks.jokes import *
+from api.conditional import etag_version  # 304 while the jokes file is unchanged
+from api.response_cache import cached
 
 joke_api = Blueprint('joke_api', __name__,
                    url_prefix='/api/jokes')
@@ -19,6 +21,8 @@ class JokesAPI:
             
     # getJokes()
     class _Read(Resource):
+        @etag_version(jokesVersion)
+        @cached(ttl=60, tags=('jokes',))
         def get(self):
             return jsonify(getJokes())
 
@@ -1,5 +1,6 @@
 import random, json, os, fcntl
 from flask import current_app
+from model.cache import response_cache
 
 jokes_data = []
 joke_list = [
@@ -33,7 +34,8 @@ def get_jokes_file():
 def _read_jokes_file():
     JOKES_FILE = get_jokes_file()
     if not os.path.exists(JOKES_FILE):
-        return []
+        # Created on first use rather than at app import
+        initJokes()
     with open(JOKES_FILE, 'r') as f:
         fcntl.flock(f, fcntl.LOCK_SH)
         try:
@@ -114,6 +116,7 @@ def _vote_joke(id, field):
         # Truncate file to remove any leftover data from previous content
         f.truncate()
         fcntl.flock(f, fcntl.LOCK_UN)
+    response_cache.invalidate('jokes')
     return jokes[id][field]
 
 def addJokeHaHa(id):
@@ -125,6 +128,14 @@ def addJokeBooHoo(id):
 def printJoke(joke):
     print(joke['id'], joke['joke'], "\n", "haha:", joke['haha'], "\n", "boohoo:", joke['boohoo'], "\n")
 
+def jokesVersion():
+    # The file's size and modification time change with every vote, used for ETags
+    try:
+        stat = os.stat(get_jokes_file())
+    except FileNotFoundError:
+        return None
+    return (stat.st_size, stat.st_mtime_ns)
+
 def countJokes():
     jokes = _read_jokes_file()
     return len(jokes)
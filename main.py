@@ -32,12 +32,20 @@ from hacks.joke import joke_api  # Import the joke API blueprint
 from api.post import post_api  # Import the social media post API
 from api.profile_game import profile_game_api  # CS Pathway Game profile persistence
 from api.snapshot_proxy import snapshot_proxy
+from api.perf import perf_api, install_perf, install_slow_query_log  # SQL and latency instrumentation
+from api.health import health_api  # Database health and pool statistics
+from api.conditional import install_compression  # gzip/brotli response compression
+from api.batch import batch_api  # Several API calls in one round trip
+from api.search import search_api  # Full-text search
+from model.engine import install_unit_of_work  # Request-scoped transactions
 #from api.announcement import announcement_api ##temporary revert
 
 # database Initialization functions
 from model.user import User, initUsers
 from model.user import Section;
 from model.github import GitHubUser
+from model.http_client import http_client
+from model.password import PasswordQueueFull
 from model.feedback import Feedback
 from api.analytics import get_date_range
 # from api.grade_api import grade_api
@@ -54,8 +62,11 @@ from hacks.jokes import initJokes
 
 # server only Views
 
+import click
+import json
 import os
 import requests
+import time
 
 # Load environment variables
 load_dotenv()
@@ -92,12 +103,24 @@ app.register_blueprint(joke_api)  # Register the joke API blueprint
 app.register_blueprint(post_api)  # Register the social media post API
 app.register_blueprint(profile_game_api)  # CS Pathway Game profile persistence
 app.register_blueprint(snapshot_proxy)  # Register the snapshot proxy API
+app.register_blueprint(perf_api)  # Admin performance report, /api/admin/perf
+app.register_blueprint(health_api)  # Database health and pool statistics, /api/health/db
+app.register_blueprint(batch_api)  # Request batching, /api/batch
+app.register_blueprint(search_api)  # Full-text search, /api/search
+
+# Opt-in instrumentation, set PERF_ENABLED=true to record per-endpoint query counts and latency
+if app.config['PERF_ENABLED']:
+    install_perf(app)
+# Statements slower than SLOW_QUERY_MS are logged and listed at /api/admin/slow-queries
+if app.config['SLOW_QUERY_MS'] > 0:
+    install_slow_query_log(app)
+# gzip/brotli for JSON and text bodies above COMPRESS_MIN_SIZE, disable with COMPRESS_ENABLED=false
+if app.config['COMPRESS_ENABLED']:
+    install_compression(app)
+# Endpoints decorated with unit_of_work, and every write request with UNIT_OF_WORK=true, commit once
+install_unit_of_work(app)
 # app.register_blueprint(announcement_api) ##temporary revert
 
-# Jokes file initialization
-with app.app_context():
-    initJokes()
-
 # Tell Flask-Login the view function name of your login route
 login_manager.login_view = "login"
 
@@ -126,11 +149,17 @@ def login():
     next_page = request.args.get('next', '') or request.form.get('next', '')
     if request.method == 'POST':
         user = User.query.filter_by(_uid=request.form['username']).first()
-        if user and user.is_password(request.form['password']):
+        try:
+            valid = user is not None and user.is_password(request.form['password'])
+        except PasswordQueueFull:
+            valid = None
+        if valid:
             login_user(user)
             if not is_safe_url(next_page):
                 return abort(400)
             return redirect(next_page or url_for('index'))
+        elif valid is None:
+            error = 'Too many logins right now, please try again in a few seconds.'
         else:
             error = 'Invalid username or password.'
     return render_template("login.html", error=error, next=next_page)
@@ -199,7 +228,12 @@ def reset_password(user_id):
         return jsonify({'error': 'User not found'}), 404
 
     # Set the new password
-    if user.update({"password": app.config['DEFAULT_PASSWORD']}):
+    try:
+        updated = user.update({"password": app.config['DEFAULT_PASSWORD']})
+    except PasswordQueueFull as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 503, {'Retry-After': '2'}
+    if updated:
         return jsonify({'message': 'Password reset successfully'}), 200
     return jsonify({'error': 'Password reset failed'}), 500
 
@@ -223,7 +257,7 @@ def kasm_users():
         }
 
         # Perform the POST request
-        response = requests.post(url, json=data, timeout=10)  # Added timeout for reliability
+        response = http_client.post(url, json=data, timeout=10)  # Added timeout for reliability
 
         # Validate the API response
         if response.status_code != 200:
@@ -283,7 +317,7 @@ def delete_user_kasm(user_id):
             "target_user": {"user_id": user_id},
             "force": False
         }
-        response = requests.post(url, json=data)
+        response = http_client.post(url, json=data)
 
         if response.status_code == 200:
             return {'message': 'User deleted successfully'}, 200
@@ -328,10 +362,54 @@ custom_cli = AppGroup('custom', help='Custom commands')
 @custom_cli.command('generate_data')
 def generate_data():
     initUsers()
+    initJokes()
     initMicroblogs()
     initPersonas()
     initPersonaUsers()
 
+# Define a command to move reactions out of the microblog JSON column into their own tables
+@custom_cli.command('migrate_reactions')
+def migrate_reactions():
+    from model.microblog import migrate_reactions as migrate
+    print(f"Reactions migrated: {migrate()}")
+
+# Define a command to move replies out of the microblog JSON column into their own table
+@custom_cli.command('migrate_replies')
+def migrate_replies():
+    from model.microblog import migrate_replies as migrate
+    print(f"Replies migrated: {migrate()}")
+
+# Define a command to rebuild the full-text search index from the tables
+@custom_cli.command('search_rebuild')
+def search_rebuild():
+    from model.search import rebuild_search_index
+    print(f"Search index rebuilt: {rebuild_search_index()}")
+
+# Define a command to populate the database at benchmark scale
+@custom_cli.command('synthetic')
+@click.option('--users', default=10000, show_default=True, help='Student accounts to create, activity scales with it')
+@click.option('--seed', default=2025, show_default=True, help='Random seed, same seed same data')
+def synthetic(users, seed):
+    from model.synthetic import generate_synthetic
+    started = time.perf_counter()
+    counts = generate_synthetic(users=users, seed=seed)
+    print(f"Synthetic data created in {time.perf_counter() - started:.1f}s: {counts}")
+
+# Define a command to benchmark the API endpoints, compare the JSON output between commits
+@custom_cli.command('bench')
+@click.option('--requests', default=200, show_default=True, help='Measured requests per endpoint')
+@click.option('--concurrency', default=1, show_default=True, help='Threads issuing requests at once')
+@click.option('--endpoint', 'only', multiple=True, help='Only run the named endpoint, repeatable')
+@click.option('--output', type=click.Path(), help='Write the JSON report to this file')
+def bench(requests, concurrency, only, output):
+    from scripts.bench_endpoints import run_bench, format_report
+    report = run_bench(requests=requests, concurrency=concurrency, only=list(only))
+    print(format_report(report))
+    if output:
+        with open(output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"Report written to {output}")
+
 # Register the custom command group with the Flask application
 app.cli.add_command(custom_cli)
         
@@ -0,0 +1,189 @@
+""" Response cache with tag invalidation, used by api/response_cache.py and invalidated by the models """
+from collections import OrderedDict
+import json
+import sqlite3
+import threading
+import time
+
+from __init__ import app
+from model.engine import after_commit
+
+
+class SqliteCacheBackend:
+    """
+    SqliteCacheBackend
+
+    Shared store for ResponseCache: one SQLite file on the host, seen by every gunicorn worker, a
+    local stand-in for Redis or memcached.  It holds the cached entries and a version per tag.
+    Invalidating a tag bumps its version, so entries cached under the old version, in this store or
+    in any worker's LRU, stop being served.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        with self._connection() as connection:
+            connection.execute("CREATE TABLE IF NOT EXISTS cache_entries "
+                               "(key TEXT PRIMARY KEY, expires REAL, tags TEXT, versions TEXT, value BLOB)")
+            connection.execute("CREATE TABLE IF NOT EXISTS cache_tags (tag TEXT PRIMARY KEY, version INTEGER)")
+
+    def _connection(self):
+        # One connection per thread, sqlite3 connections are not shared between threads
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self._local.connection = connection
+        return connection
+
+    def get(self, key):
+        row = self._connection().execute(
+            "SELECT expires, tags, versions, value FROM cache_entries WHERE key = ?", (key,)).fetchone()
+        if row is None or row[0] < time.time():
+            return None
+        return row[0], tuple(json.loads(row[1])), json.loads(row[2]), json.loads(row[3])
+
+    def set(self, key, expires, tags, versions, value):
+        self._connection().execute(
+            "INSERT OR REPLACE INTO cache_entries (key, expires, tags, versions, value) VALUES (?, ?, ?, ?, ?)",
+            (key, expires, json.dumps(tags), json.dumps(versions), json.dumps(value)))
+
+    def versions(self, tags):
+        if not tags:
+            return {}
+        rows = self._connection().execute(
+            f"SELECT tag, version FROM cache_tags WHERE tag IN ({','.join('?' * len(tags))})", tuple(tags)).fetchall()
+        found = dict(rows)
+        return {tag: found.get(tag, 0) for tag in tags}
+
+    def bump(self, tags):
+        connection = self._connection()
+        connection.executemany(
+            "INSERT INTO cache_tags (tag, version) VALUES (?, 1) "
+            "ON CONFLICT(tag) DO UPDATE SET version = version + 1", [(tag,) for tag in tags])
+        # Expired entries are only garbage, drop them while writing anyway
+        connection.execute("DELETE FROM cache_entries WHERE expires < ?", (time.time(),))
+
+    def clear(self):
+        self._connection().execute("DELETE FROM cache_entries")
+
+
+class ResponseCache:
+    """
+    ResponseCache
+
+    A bounded, thread-safe LRU of rendered responses with a per-entry time-to-live and tags.
+
+    Every entry remembers the version of each of its tags when its response started to be computed.
+    invalidate(tag) bumps the tag's version, and a lookup that finds an older version drops the
+    entry, so a new MicroBlog in one topic evicts that topic's feed and nothing else.
+
+    Without a backend, tag versions live in this worker only: this worker's writes invalidate
+    immediately and the other workers serve their copies until the TTL.  With a shared backend
+    (RESPONSE_CACHE_SQLITE) tag versions are read from it on every hit, so a write in any worker
+    invalidates everywhere, and entries cached by one worker are served by the others.
+    """
+
+    def __init__(self, max_size=512, backend=None, enabled=True):
+        self.max_size = max_size
+        self.backend = backend
+        self.enabled = enabled and max_size > 0
+        self._entries = OrderedDict()
+        self._versions = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def versions(self, tags):
+        """Current version of each tag, taken before computing a response that will be cached under them."""
+        if self.backend is not None:
+            return self.backend.versions(tags)
+        with self._lock:
+            return {tag: self._versions.get(tag, 0) for tag in tags}
+
+    def get(self, key):
+        """The cached value for key, or None if missing, expired or invalidated."""
+        if not self.enabled:
+            return None
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] < now:
+                del self._entries[key]
+                entry = None
+        if entry is None and self.backend is not None:
+            entry = self.backend.get(key)
+        if entry is None or self.versions(entry[1]) != entry[2]:
+            with self._lock:
+                self._entries.pop(key, None)
+                self.misses += 1
+            return None
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+            self.hits += 1
+        return entry[3]
+
+    def set(self, key, value, ttl, tags=(), versions=None):
+        """
+        Cache a JSON-serializable value for ttl seconds under tags.
+
+        versions must come from versions(tags) before the value was computed; an invalidation in
+        between then makes the entry stale right away instead of caching outdated data.
+        """
+        if not self.enabled or ttl <= 0:
+            return
+        tags = tuple(tags)
+        versions = versions if versions is not None else self.versions(tags)
+        entry = (time.time() + ttl, tags, versions, value)
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+        if self.backend is not None:
+            self.backend.set(key, *entry)
+
+    def invalidate(self, *tags):
+        """Make every entry cached under any of the tags stale, once the write is committed (see after_commit)."""
+        tags = [tag for tag in tags if tag]
+        if tags:
+            after_commit(lambda: self._bump(tags))
+
+    def _bump(self, tags):
+        with self._lock:
+            for tag in tags:
+                self._versions[tag] = self._versions.get(tag, 0) + 1
+            self.invalidations += len(tags)
+        if self.backend is not None:
+            self.backend.bump(tags)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+        if self.backend is not None:
+            self.backend.clear()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'enabled': self.enabled,
+                'size': len(self._entries),
+                'max_size': self.max_size,
+                'shared': self.backend is not None,
+                'hits': self.hits,
+                'misses': self.misses,
+                'invalidations': self.invalidations,
+            }
+
+
+# One cache per worker process, configured from RESPONSE_CACHE_* in __init__.py
+response_cache = ResponseCache(
+    max_size=app.config['RESPONSE_CACHE_SIZE'],
+    backend=SqliteCacheBackend(app.config['RESPONSE_CACHE_SQLITE']) if app.config['RESPONSE_CACHE_SQLITE'] else None,
+    enabled=app.config['RESPONSE_CACHE_ENABLED'],
+)
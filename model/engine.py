@@ -0,0 +1,303 @@
+""" Database engine configuration applied by __init__.py: SQLite pragmas, the MySQL pool, statement timeouts,
+replica routing, unit of work """
+from flask import current_app, g, has_request_context, request
+from flask_sqlalchemy.session import Session
+from functools import wraps
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import Engine
+from sqlalchemy.pool import Pool
+from werkzeug.exceptions import ServiceUnavailable
+import sqlite3
+import time
+
+# SQLite virtual machine instructions between two deadline checks, about a millisecond of work
+SQLITE_PROGRESS_OPS = 1000
+
+# MySQL error raised when max_execution_time interrupts a SELECT
+ER_QUERY_TIMEOUT = 3024
+
+
+class StatementTimeout(ServiceUnavailable):
+    """A statement ran past DB_STATEMENT_TIMEOUT_MS and was interrupted, answered as 503."""
+    description = 'The database query took too long and was stopped, try again or narrow the request'
+
+
+def sqlite_pragmas(config):
+    """
+    The PRAGMA statements run on every new SQLite connection, from the SQLITE_* settings.
+
+    - journal_mode=WAL lets readers carry on while one writer commits, the rollback journal locks
+      the whole file and the other gunicorn workers answer "database is locked"
+    - busy_timeout makes a blocked writer wait for the lock instead of failing immediately
+    - synchronous=NORMAL is durable with WAL except for the last commits on power loss
+    - foreign_keys enforces the declared ForeignKeys, SQLite ignores them by default
+    - mmap_size and cache_size (negative is KiB) keep hot pages in memory per connection
+    """
+    if not config['SQLITE_TUNING']:
+        return []
+    return [
+        f"PRAGMA journal_mode={config['SQLITE_JOURNAL_MODE']}",
+        f"PRAGMA busy_timeout={int(config['SQLITE_BUSY_TIMEOUT'])}",
+        f"PRAGMA synchronous={config['SQLITE_SYNCHRONOUS']}",
+        f"PRAGMA foreign_keys={'ON' if config['SQLITE_FOREIGN_KEYS'] else 'OFF'}",
+        f"PRAGMA mmap_size={int(config['SQLITE_MMAP_SIZE'])}",
+        f"PRAGMA cache_size={int(config['SQLITE_CACHE_SIZE'])}",
+    ]
+
+
+def mysql_engine_options(config):
+    """SQLALCHEMY_ENGINE_OPTIONS for the MySQL backend, from the DB_POOL_* and DB_*_TIMEOUT settings."""
+    return {
+        'pool_size': config['DB_POOL_SIZE'],
+        'max_overflow': config['DB_MAX_OVERFLOW'],
+        'pool_recycle': config['DB_POOL_RECYCLE'],
+        'pool_pre_ping': config['DB_POOL_PRE_PING'],
+        'pool_timeout': config['DB_POOL_TIMEOUT'],
+        'connect_args': {
+            'connect_timeout': config['DB_CONNECT_TIMEOUT'],
+            'read_timeout': config['DB_READ_TIMEOUT'],
+            'write_timeout': config['DB_READ_TIMEOUT'],
+        },
+    }
+
+
+def pool_status(engine):
+    """Connection pool counters for a QueuePool, other pool classes only report their name."""
+    pool = engine.pool
+    status = {'class': type(pool).__name__}
+    for name in ('size', 'checkedin', 'checkedout', 'overflow'):
+        counter = getattr(pool, name, None)
+        if callable(counter):
+            status[name] = counter()
+    max_overflow = getattr(pool, '_max_overflow', None)
+    if max_overflow is not None:
+        status['max_overflow'] = max_overflow
+    return status
+
+
+def statement_timeout_ms():
+    """Time limit for the statements of the current request, 0 (none) for CLI commands and scripts."""
+    if not has_request_context():
+        return 0
+    return current_app.config['DB_STATEMENT_TIMEOUT_MS']
+
+
+def is_statement_timeout(error, dialect_name):
+    """True for the driver error of an interrupted statement, see configure_engine."""
+    if dialect_name == 'sqlite':
+        return isinstance(error, sqlite3.OperationalError) and str(error) == 'interrupted'
+    if dialect_name == 'mysql':
+        return bool(getattr(error, 'args', None)) and error.args[0] == ER_QUERY_TIMEOUT
+    return False
+
+
+def configure_engine(app):
+    """Register the engine events, call once before the first connection is opened."""
+    pragmas = sqlite_pragmas(app.config)
+    timeouts = app.config['DB_STATEMENT_TIMEOUT_MS'] > 0
+
+    @event.listens_for(Engine, 'connect')
+    def set_sqlite_pragmas(dbapi_connection, connection_record):
+        # Only SQLite connections, the MySQL backend manages its own settings
+        if not isinstance(dbapi_connection, sqlite3.Connection):
+            return
+        if timeouts:
+            # SQLite has no statement timeout: the progress handler aborts the running statement
+            # ("interrupted") once the deadline set in apply_statement_timeout has passed
+            info = connection_record.info
+
+            def past_deadline():
+                deadline = info.get('statement_deadline')
+                return deadline is not None and time.monotonic() > deadline
+            dbapi_connection.set_progress_handler(past_deadline, SQLITE_PROGRESS_OPS)
+        if not pragmas:
+            return
+        cursor = dbapi_connection.cursor()
+        try:
+            for pragma in pragmas:
+                cursor.execute(pragma)
+        finally:
+            cursor.close()
+
+    if not timeouts:
+        return
+
+    @event.listens_for(Engine, 'before_cursor_execute')
+    def apply_statement_timeout(conn, cursor, statement, parameters, context, executemany):
+        timeout = statement_timeout_ms()
+        if conn.dialect.name == 'sqlite':
+            # Covers the execute and the fetch of the rows, cleared when the transaction ends
+            conn.info['statement_deadline'] = time.monotonic() + timeout / 1000 if timeout else None
+        elif conn.dialect.name == 'mysql' and conn.info.get('max_execution_time', 0) != timeout:
+            # Session setting, MySQL applies it to SELECT statements only
+            cursor.execute(f"SET SESSION max_execution_time = {int(timeout)}")
+            conn.info['max_execution_time'] = timeout
+
+    @event.listens_for(Engine, 'commit')
+    @event.listens_for(Engine, 'rollback')
+    def clear_statement_deadline(conn):
+        # A deadline left from the last statement must not interrupt COMMIT or ROLLBACK
+        conn.info.pop('statement_deadline', None)
+
+    @event.listens_for(Pool, 'reset')
+    def clear_deadline_on_reset(dbapi_connection, connection_record, reset_state):
+        connection_record.info.pop('statement_deadline', None)
+
+    @event.listens_for(Engine, 'handle_error', retval=True)
+    def raise_statement_timeout(context):
+        if is_statement_timeout(context.original_exception, context.dialect.name):
+            return StatementTimeout()
+        return None
+
+
+def sqlite_settings(connection):
+    """Read the effective pragma values back, for health reports and the contention benchmark."""
+    names = ('journal_mode', 'busy_timeout', 'synchronous', 'foreign_keys', 'mmap_size', 'cache_size')
+    return {name: connection.exec_driver_sql(f"PRAGMA {name}").scalar() for name in names}
+
+
+# Methods that never write, their requests may read from the replica
+READ_ONLY_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+
+def replica_engine():
+    """The read replica engine, created on first use from SQLALCHEMY_REPLICA_URI, None if not set."""
+    app = current_app._get_current_object()
+    engine = app.extensions.get('replica_engine')
+    if engine is None and app.config.get('SQLALCHEMY_REPLICA_URI'):
+        engine = create_engine(app.config['SQLALCHEMY_REPLICA_URI'], **app.config.get('SQLALCHEMY_ENGINE_OPTIONS', {}))
+        app.extensions['replica_engine'] = engine
+    return engine
+
+
+def use_primary():
+    """Per-request override: send the rest of this request's queries to the primary."""
+    if has_request_context():
+        g.db_use_primary = True
+
+
+def primary_reads(func):
+    """Endpoint decorator, reads that must see the latest writes (e.g. right after a redirect)."""
+    @wraps(func)
+    def decorated(*args, **kwargs):
+        use_primary()
+        return func(*args, **kwargs)
+    return decorated
+
+
+class RoutingSession(Session):
+    """
+    RoutingSession
+
+    db.session for the app, sends read-only requests to the replica when SQLALCHEMY_REPLICA_URI is set.
+
+    Queries go to the primary when any of these holds:
+      - there is no request (CLI commands, init functions, scripts) or no replica configured
+      - the request method can write (POST, PUT, PATCH, DELETE)
+      - the session has flushed or executed DML in this request, so later reads see the write
+      - the endpoint called use_primary() or is decorated with primary_reads
+      - the model has its own bind_key
+
+    Everything else, i.e. the reads of a GET request, goes to the replica.
+    """
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        primary = super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+        if bind is not None or not has_request_context() or primary is not self._db.engines.get(None):
+            return primary
+        if self._flushing or (clause is not None and getattr(clause, 'is_dml', False)):
+            # Read-after-write: stay on the primary for the rest of the request
+            g.db_use_primary = True
+        if g.get('db_use_primary') or request.method not in READ_ONLY_METHODS:
+            return primary
+        return replica_engine() or primary
+
+    def commit(self):
+        # Inside a unit of work the request's writes are committed once, in _end_unit_of_work
+        if in_unit_of_work():
+            self.flush()
+            g.unit_of_work_commits += 1
+            return
+        super().commit()
+
+
+def in_unit_of_work():
+    return has_request_context() and g.get('unit_of_work', False)
+
+
+def begin_unit_of_work():
+    """Per-request opt-in: db.session.commit() only flushes until the request ends, see install_unit_of_work."""
+    if has_request_context() and not g.get('unit_of_work', False):
+        g.unit_of_work = True
+        g.unit_of_work_commits = 0
+        g.unit_of_work_callbacks = []
+
+
+def unit_of_work(func):
+    """Endpoint decorator, the request's writes are committed once when it returns."""
+    @wraps(func)
+    def decorated(*args, **kwargs):
+        begin_unit_of_work()
+        return func(*args, **kwargs)
+    return decorated
+
+
+def after_commit(callback):
+    """
+    Run callback once the current writes are committed: now, or at the end of the unit of work.
+
+    Cache invalidations go through here, so another request can not reload and cache the old rows
+    between the invalidation and the deferred commit.  Callbacks are dropped on rollback.
+    """
+    if in_unit_of_work():
+        g.unit_of_work_callbacks.append(callback)
+    else:
+        callback()
+
+
+def _start_unit_of_work():
+    if current_app.config['UNIT_OF_WORK'] and request.method not in READ_ONLY_METHODS:
+        begin_unit_of_work()
+
+
+def _end_unit_of_work(response):
+    """Commit the request's writes if it succeeded, roll them back if it answered an error."""
+    if not g.pop('unit_of_work', False):
+        return response
+    session = current_app.extensions['sqlalchemy'].session
+    callbacks = g.pop('unit_of_work_callbacks')
+    if response.status_code >= 400:
+        session.rollback()
+        return response
+    try:
+        session.commit()
+    except Exception:
+        session.rollback()
+        raise
+    for callback in callbacks:
+        callback()
+    return response
+
+
+def _abort_unit_of_work(exc):
+    # Unhandled exceptions skip after_request, nothing of the request is committed
+    if g.pop('unit_of_work', False):
+        g.pop('unit_of_work_callbacks', None)
+        current_app.extensions['sqlalchemy'].session.rollback()
+
+
+def install_unit_of_work(flask_app):
+    """
+    Request-scoped transactions: model methods' commits only flush, and a request commits once at
+    the end, or rolls back when it answers 4xx/5xx or raises.
+
+    UNIT_OF_WORK=true applies it to every POST, PUT, PATCH and DELETE, otherwise only endpoints
+    decorated with unit_of_work use it.  A model method's rollback() after a failed flush rolls
+    back the whole request, not only that method's changes.
+    """
+    if flask_app.extensions.get('unit_of_work_installed'):
+        return
+    flask_app.before_request(_start_unit_of_work)
+    flask_app.after_request(_end_unit_of_work)
+    flask_app.teardown_request(_abort_unit_of_work)
+    flask_app.extensions['unit_of_work_installed'] = True
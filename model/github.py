@@ -1,7 +1,7 @@
 from flask_restful import Resource
 from datetime import datetime
-import requests
 from __init__ import app
+from model.http_client import http_client
 
 class GitHubUser(Resource):
     def get(self, uid):
@@ -13,7 +13,7 @@ class GitHubUser(Resource):
 
         try:
             headers = {'Authorization': f'token {token}'}
-            response = requests.get(url, headers=headers)
+            response = http_client.get(url, headers=headers)
 
             if response.status_code == 404:
                 return {'message': f'Invalid UID {uid}'}, 404
@@ -45,7 +45,7 @@ class GitHubUser(Resource):
 
         headers = {'Authorization': f'bearer {token}'}
         try:
-            response = requests.post(url, json={'query': query, 'variables': variables}, headers=headers)
+            response = http_client.post(url, json={'query': query, 'variables': variables}, headers=headers)
             
             if response.status_code != 200:
                 return {'message': 'GitHub API failed to fetch data'}, response.status_code
@@ -263,7 +263,7 @@ class GitHubOrg(Resource):
 
         try:
             headers = {'Authorization': f'token {token}'}
-            response = requests.get(url, headers=headers)
+            response = http_client.get(url, headers=headers)
 
             if response.status_code != 200:
                 return {'message': 'GitHub API failed to fetch organization members'}, response.status_code
@@ -281,7 +281,7 @@ class GitHubOrg(Resource):
 
         try:
             headers = {'Authorization': f'token {token}'}
-            response = requests.get(url, headers=headers)
+            response = http_client.get(url, headers=headers)
 
             if response.status_code != 200:
                 return {'message': 'GitHub API failed to fetch organization repositories'}, response.status_code
@@ -1,8 +1,9 @@
-import pandas as pd
-from sklearn.linear_model import LinearRegression
-
 class GradePredictionModel:
     def __init__(self):
+        # pandas and scikit-learn take about a second to import, load them only when a model is built
+        import pandas as pd
+        from sklearn.linear_model import LinearRegression
+
         # Load dataset
         data = pd.read_csv("datasets/ap_predict_data.csv")
 
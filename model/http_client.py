@@ -0,0 +1,298 @@
+""" Shared outbound HTTP client: keep-alive pools, default timeouts, retries and per-upstream metrics """
+from collections import deque
+from http.cookiejar import DefaultCookiePolicy
+from urllib.parse import urlsplit
+import random
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import NewConnectionError
+
+from __init__ import app
+
+# Statuses worth another attempt: rate limited, or the upstream or a proxy in front of it failed
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+# Methods that may be sent again after the upstream may have processed them
+IDEMPOTENT_METHODS = ('GET', 'HEAD', 'OPTIONS', 'PUT', 'DELETE')
+# Statuses that mean the request was not processed, so even a POST can be sent again
+NOT_PROCESSED_STATUSES = (429, 503)
+
+
+# Upper bounds (ms) of the upstream latency histogram buckets, the last bucket catches everything slower
+LATENCY_BOUNDS = (100, 250, 500, 1000, 2500, 5000, 10000, 30000, 60000)
+
+
+class CircuitOpen(requests.ConnectionError):
+    """Raised without sending while the upstream's breaker is open, handled like any connection error."""
+
+
+class CircuitBreaker:
+    """
+    CircuitBreaker
+
+    Fast-fails calls to an upstream that keeps failing, so request threads do not each wait out a
+    timeout while it is down.
+
+    - closed: calls go through; failure_threshold consecutive failures (connection errors,
+      timeouts, 5xx) open the breaker
+    - open: calls raise CircuitOpen at once, for reset_timeout seconds
+    - half-open: then one probe call goes through, its success closes the breaker, its failure
+      opens it again; other calls keep failing fast while the probe runs
+    """
+
+    CLOSED, OPEN, HALF_OPEN = 'closed', 'open', 'half-open'
+
+    def __init__(self, failure_threshold=5, reset_timeout=30):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = None
+        self.opens = 0
+        self.rejected = 0
+        self._lock = threading.Lock()
+
+    def available(self):
+        """False while calls would be rejected, without taking the half-open probe."""
+        with self._lock:
+            return self.state == self.CLOSED or time.monotonic() - self.opened_at >= self.reset_timeout
+
+    def allow(self):
+        """Whether a call may be sent now, the first call after reset_timeout becomes the probe."""
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            # A probe that never reported back (an unexpected error) is replaced after reset_timeout too
+            if time.monotonic() - self.opened_at >= self.reset_timeout:
+                self.state = self.HALF_OPEN
+                self.opened_at = time.monotonic()
+                return True
+            self.rejected += 1
+            return False
+
+    def success(self):
+        with self._lock:
+            self.state = self.CLOSED
+            self.failures = 0
+
+    def failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.failure_threshold > 0 and (self.state == self.HALF_OPEN or self.failures >= self.failure_threshold):
+                if self.state != self.OPEN:
+                    self.opens += 1
+                self.state = self.OPEN
+                self.opened_at = time.monotonic()
+
+    def snapshot(self):
+        with self._lock:
+            retry_in = None
+            if self.state != self.CLOSED:
+                retry_in = round(max(0.0, self.reset_timeout - (time.monotonic() - self.opened_at)), 2)
+            return {
+                'state': self.state,
+                'failures': self.failures,
+                'opens': self.opens,
+                'rejected': self.rejected,
+                'retry_in_s': retry_in,
+            }
+
+
+def not_sent(error):
+    """True when the request never reached the upstream, the connection could not be opened."""
+    if isinstance(error, requests.ConnectTimeout):
+        return True
+    reason = getattr(error.args[0], 'reason', None) if error.args else None
+    return isinstance(reason, NewConnectionError)
+
+
+class HttpClient:
+    """
+    HttpClient
+
+    One requests.Session per worker process for every outbound integration (GitHub, Kasm, Groq,
+    Gemini, the snapshot service).  Connections are kept alive in a pool per host, so repeated calls
+    skip the TCP and TLS handshakes.
+
+    - every call gets a (connect, read) timeout unless it passes its own
+    - failures are retried with jittered exponential backoff: connection errors, timeouts and
+      429/5xx for idempotent methods; for POST and PATCH, which the upstream may have processed,
+      only refused connections and 429/503; Retry-After is honored up to backoff_max
+    - cookies are never stored, the session is shared by all users' requests
+    - each upstream host has a CircuitBreaker, calls to a failing one raise CircuitOpen at once
+    - latency histograms, status and retry counts are kept per upstream host, see stats()
+
+    Calls return the requests.Response of the last attempt and raise the requests exceptions, so
+    call sites handle errors as they did with requests.get/post.
+    """
+
+    def __init__(self, connect_timeout=3.05, read_timeout=10, retries=2, backoff=0.5, backoff_max=5,
+                 pool_size=10, breaker_failures=5, breaker_reset=30, samples=200):
+        self.timeout = (connect_timeout, read_timeout)
+        self.retries = retries
+        self.backoff = backoff
+        self.backoff_max = backoff_max
+        self.pool_size = pool_size
+        self.breaker_failures = breaker_failures
+        self.breaker_reset = breaker_reset
+        self._samples = samples
+        self._breakers = {}
+        self._session = None
+        self._lock = threading.Lock()
+        self._upstreams = {}
+
+    @property
+    def session(self):
+        # Created on first use, so each gunicorn worker opens its own connections after the fork
+        if self._session is None:
+            with self._lock:
+                if self._session is None:
+                    session = requests.Session()
+                    session.cookies.set_policy(DefaultCookiePolicy(allowed_domains=[]))
+                    adapter = HTTPAdapter(pool_connections=self.pool_size, pool_maxsize=self.pool_size, max_retries=0)
+                    session.mount('https://', adapter)
+                    session.mount('http://', adapter)
+                    self._session = session
+        return self._session
+
+    def breaker(self, url):
+        """The CircuitBreaker of the url's host, created on first use."""
+        upstream = urlsplit(url).netloc
+        with self._lock:
+            breaker = self._breakers.get(upstream)
+            if breaker is None:
+                breaker = self._breakers[upstream] = CircuitBreaker(self.breaker_failures, self.breaker_reset)
+            return breaker
+
+    def available(self, url):
+        """False while the url's upstream breaker is open, callers can go straight to a fallback."""
+        return self.breaker(url).available()
+
+    def get(self, url, **kwargs):
+        return self.request('GET', url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request('POST', url, **kwargs)
+
+    def put(self, url, **kwargs):
+        return self.request('PUT', url, **kwargs)
+
+    def delete(self, url, **kwargs):
+        return self.request('DELETE', url, **kwargs)
+
+    def request(self, method, url, retries=None, **kwargs):
+        """
+        Send a request, retrying transient failures.
+
+        Args:
+            method, url, **kwargs: as for requests.request (json, headers, params, timeout, ...)
+            retries: attempts after the first, HTTP_RETRIES by default, 0 for calls that must not wait
+
+        Returns:
+            requests.Response of the last attempt, a 429/5xx once the retries are used up
+
+        Raises:
+            CircuitOpen (a requests.ConnectionError) without sending while the upstream's breaker is open
+        """
+        method = method.upper()
+        kwargs.setdefault('timeout', self.timeout)
+        retries = self.retries if retries is None else retries
+        idempotent = method in IDEMPOTENT_METHODS
+        upstream = urlsplit(url).netloc
+        breaker = self.breaker(url)
+        for attempt in range(retries + 1):
+            if not breaker.allow():
+                raise CircuitOpen(f"{upstream} is failing, calls are paused (circuit open)")
+            started = time.perf_counter()
+            try:
+                response = self.session.request(method, url, **kwargs)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                breaker.failure()
+                self._record(upstream, time.perf_counter() - started, None, retried=attempt > 0)
+                if attempt == retries or not (idempotent or not_sent(e)):
+                    raise
+                self._sleep(attempt, None)
+                continue
+            # 4xx answers, 429 included, come from a working upstream
+            if response.status_code >= 500:
+                breaker.failure()
+            else:
+                breaker.success()
+            self._record(upstream, time.perf_counter() - started, response.status_code, retried=attempt > 0)
+            retry = response.status_code in (RETRY_STATUSES if idempotent else NOT_PROCESSED_STATUSES)
+            if not retry or attempt == retries:
+                return response
+            self._sleep(attempt, response.headers.get('Retry-After'))
+            response.close()
+
+    def _sleep(self, attempt, retry_after):
+        """Full jitter backoff, so workers retrying the same outage do not retry in step."""
+        delay = random.uniform(0, min(self.backoff_max, self.backoff * 2 ** attempt))
+        if retry_after is not None:
+            try:
+                delay = max(delay, min(self.backoff_max, float(retry_after)))
+            except ValueError:
+                pass  # an HTTP date, keep the computed backoff
+        time.sleep(delay)
+
+    def _record(self, upstream, seconds, status, retried):
+        ms = seconds * 1000
+        with self._lock:
+            stats = self._upstreams.get(upstream)
+            if stats is None:
+                stats = self._upstreams[upstream] = {
+                    'requests': 0, 'errors': 0, 'retries': 0, 'statuses': {},
+                    'ms': 0.0, 'max_ms': 0.0, 'recent_ms': deque(maxlen=self._samples),
+                    'histogram': [0] * (len(LATENCY_BOUNDS) + 1),
+                }
+            stats['requests'] += 1
+            stats['retries'] += retried
+            # Connection failures and timeouts have no status and count as errors, like 5xx answers
+            key = f"{status // 100}xx" if status else 'failed'
+            stats['statuses'][key] = stats['statuses'].get(key, 0) + 1
+            stats['errors'] += status is None or status >= 500
+            stats['ms'] += ms
+            stats['max_ms'] = max(stats['max_ms'], ms)
+            stats['recent_ms'].append(ms)
+            stats['histogram'][next((i for i, bound in enumerate(LATENCY_BOUNDS) if ms <= bound), len(LATENCY_BOUNDS))] += 1
+
+    def stats(self):
+        """Per-upstream counters and latency histogram since start, percentiles over the recent calls, breaker state."""
+        with self._lock:
+            report = {}
+            breakers = dict(self._breakers)
+            for upstream, stats in self._upstreams.items():
+                recent = sorted(stats['recent_ms'])
+                report[upstream] = {
+                    'requests': stats['requests'],
+                    'errors': stats['errors'],
+                    'retries': stats['retries'],
+                    'statuses': dict(stats['statuses']),
+                    'avg_ms': round(stats['ms'] / stats['requests'], 2),
+                    'p50_ms': round(recent[len(recent) // 2], 2) if recent else None,
+                    'p95_ms': round(recent[min(len(recent) - 1, int(len(recent) * 0.95))], 2) if recent else None,
+                    'max_ms': round(stats['max_ms'], 2),
+                    'histogram': dict(zip([f"<={bound}ms" for bound in LATENCY_BOUNDS] + ['slower'], stats['histogram'])),
+                }
+        for upstream, breaker in breakers.items():
+            report.setdefault(upstream, {'requests': 0})['breaker'] = breaker.snapshot()
+        return report
+
+    def reset_stats(self):
+        with self._lock:
+            self._upstreams.clear()
+
+
+# One client per worker process, configured from HTTP_* in __init__.py
+http_client = HttpClient(
+    connect_timeout=app.config['HTTP_CONNECT_TIMEOUT'],
+    read_timeout=app.config['HTTP_READ_TIMEOUT'],
+    retries=app.config['HTTP_RETRIES'],
+    backoff=app.config['HTTP_BACKOFF'],
+    backoff_max=app.config['HTTP_BACKOFF_MAX'],
+    pool_size=app.config['HTTP_POOL_SIZE'],
+    breaker_failures=app.config['HTTP_BREAKER_FAILURES'],
+    breaker_reset=app.config['HTTP_BREAKER_RESET'],
+)
@@ -1,5 +1,6 @@
 import requests
 from __init__ import app
+from model.http_client import http_client
 
 class KasmUtils:
     @staticmethod
@@ -22,7 +23,7 @@ class KasmUtils:
                 "api_key": API_KEY,
                 "api_key_secret": API_KEY_SECRET
             }
-            response = requests.post(url, json=data)
+            response = http_client.post(url, json=data)
             if response.status_code != 200:
                 return None, response
         except requests.RequestException as e:
@@ -65,7 +66,7 @@ class KasmUtils:
                 "api_key": API_KEY,
                 "api_key_secret": API_KEY_SECRET
             }
-            response = requests.post(url, json=data)
+            response = http_client.post(url, json=data)
             if response.status_code != 200:
                 return None, {'message': 'Failed to get users', 'code': response.status_code}
 
@@ -102,7 +103,7 @@ class KasmUtils:
                 "api_key": API_KEY,
                 "api_key_secret": API_KEY_SECRET
             }
-            response = requests.post(url, json=data)
+            response = http_client.post(url, json=data)
             if response.status_code != 200:
                 return None, {'message': 'Failed to get groups', 'code': response.status_code}
 
@@ -132,7 +133,7 @@ class KasmUtils:
                     "password": password,
                 }
             }
-            response = requests.post(url, json=data)
+            response = http_client.post(url, json=data)
             if response.status_code != 200:
                 return None, response
              
@@ -156,7 +157,7 @@ class KasmUtils:
                     "password": new_password
                 }
             }
-            response = requests.post(url, json=data)
+            response = http_client.post(url, json=data)
             if response.status_code != 200:
                 return None, response
         except requests.RequestException as e:
@@ -181,7 +182,7 @@ class KasmUtils:
                     "last_name": last_name
                 }
             }
-            response = requests.post(url, json=data)
+            response = http_client.post(url, json=data)
             if response.status_code != 200:
                 return None, response
         except requests.RequestException as e:
@@ -204,7 +205,7 @@ class KasmUtils:
                     "user_id": user_id
                 }
             }
-            response = requests.post(url, json=data)
+            response = http_client.post(url, json=data)
             if response.status_code != 200:
                 return None, response
         except requests.RequestException as e:
@@ -227,7 +228,7 @@ class KasmUtils:
                 },
                 "force": False
             }
-            response = requests.post(url, json=data)
+            response = http_client.post(url, json=data)
             if response.status_code != 200:
                 return None, response 
             
@@ -283,7 +284,7 @@ class KasmUtils:
             }
 
             # Send a POST request to the Kasm server to update the user
-            response = requests.post(url, json=data)
+            response = http_client.post(url, json=data)
 
             # Check the status code of the response
             if response.status_code != 200:
@@ -7,6 +7,8 @@ so the frontend can read/write both modes through /api/events/* endpoints.
 from datetime import datetime
 from sqlite3 import IntegrityError
 
+from sqlalchemy import func
+
 from __init__ import db
 
 
@@ -70,6 +72,11 @@ class ScoreCounterEvent(db.Model):
 	def get_by_id(event_id):
 		return ScoreCounterEvent.query.get(event_id)
 
+	@staticmethod
+	def version():
+		"""(count, highest id, latest timestamp), changes on every insert or delete, for ETags."""
+		return tuple(db.session.query(func.count(ScoreCounterEvent.id), func.max(ScoreCounterEvent.id), func.max(ScoreCounterEvent._timestamp)).one())
+
 	@staticmethod
 	def get_all(game_name=None, limit=200):
 		query = ScoreCounterEvent.query.order_by(ScoreCounterEvent._timestamp.desc()).limit(limit)
@@ -146,6 +153,11 @@ class ElementaryLeaderboardEvent(db.Model):
 	def get_by_id(event_id):
 		return ElementaryLeaderboardEvent.query.get(event_id)
 
+	@staticmethod
+	def version():
+		"""(count, highest id, latest timestamp), changes on every insert or delete, for ETags."""
+		return tuple(db.session.query(func.count(ElementaryLeaderboardEvent.id), func.max(ElementaryLeaderboardEvent.id), func.max(ElementaryLeaderboardEvent._timestamp)).one())
+
 	@staticmethod
 	def get_all(game_name=None, limit=200):
 		query = ElementaryLeaderboardEvent.query.order_by(ElementaryLeaderboardEvent._timestamp.desc()).limit(limit)
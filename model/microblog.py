@@ -3,10 +3,15 @@ Micro Blog Model
 Defines the database schema for micro blog posts with JSON flexibility
 """
 from sqlite3 import IntegrityError
-from sqlalchemy import Text, JSON
+from sqlalchemy import Text, JSON, event, func, exc, inspect
 from sqlalchemy.orm.attributes import flag_modified
-from __init__ import db
+from flask import g, has_request_context
+from __init__ import app, db
+from model.pagination import Page, encode_cursor, keyset_page
+from model.cache import response_cache
+from model.search import ID_LIST_MAX, matching_ids
 from datetime import datetime
+import hashlib
 import json
 
 
@@ -17,9 +22,16 @@ class MicroBlog(db.Model):
    MicroBlog Model
   
    Represents a micro blog post with flexible JSON content and topic organization.
-   Supports replies, reactions, and custom frontend attributes through JSON storage.
+   Supports custom frontend attributes through JSON storage.  Replies are rows of MicroBlogReply
+   counted in _reply_count, reactions are rows of MicroBlogReaction with a MicroBlogReactionCount
+   per type.
    """
    __tablename__ = 'microblogs'
+   # Keyset pagination order of the feeds, see _feed
+   __table_args__ = (
+       db.Index('ix_microblogs_timestamp_id', '_timestamp', 'id'),
+       db.Index('ix_microblogs_topic_timestamp', '_topic_id', '_timestamp'),
+   )
 
 
    # Primary Key
@@ -34,6 +46,9 @@ class MicroBlog(db.Model):
   
    # JSON field for flexible data storage
    _data = db.Column(JSON, nullable=True)
+
+   # Kept in step with the microblog_replies rows by add_reply
+   _reply_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
   
    # Metadata
    _timestamp = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
@@ -42,6 +57,10 @@ class MicroBlog(db.Model):
    # Relationships
    user = db.relationship('User', foreign_keys=[_user_id], backref=db.backref('microblogs', lazy=True))
    topic = db.relationship('Topic', foreign_keys=[_topic_id], backref=db.backref('microblogs', lazy=True))
+   # Written with statements in add_reaction/remove_reaction, never through these collections
+   reaction_rows = db.relationship('MicroBlogReaction', lazy=True, viewonly=True,
+                                   order_by='MicroBlogReaction._timestamp')
+   reaction_counters = db.relationship('MicroBlogReactionCount', lazy=True, viewonly=True)
 
 
    def __init__(self, user_id, content, topic_id=None, data=None):
@@ -61,14 +80,36 @@ class MicroBlog(db.Model):
        self._content = content
        self._topic_id = topic_id
        self._data = data or {}
+       self._reply_count = 0
        self._timestamp = datetime.utcnow()
 
 
+   def _cache_tags(self, listing=False):
+       """
+       Response cache tags of this post's topic feed, plus the topic list (postCount) and the author's
+       post count in the topic when listing
+       """
+       tags = [self.topic.cache_tag] if self.topic else []
+       if listing:
+           tags.append('topics')
+           if self._topic_id:
+               tags.append(Topic.user_posts_tag(self._topic_id, self._user_id))
+       return tags
+
+
    def create(self):
        """Create a new micro blog post in the database"""
        try:
            db.session.add(self)
+           # Imported posts may still carry replies and reactions in the old JSON layout
+           if self._data and isinstance(self._data.get('replies'), list):
+               db.session.flush()
+               MicroBlogReply.migrate_json(self)
+           if self._data and isinstance(self._data.get('reactions'), dict):
+               db.session.flush()
+               MicroBlogReaction.migrate_json(self)
            db.session.commit()
+           response_cache.invalidate(*self._cache_tags(listing=True))
            return self
        except IntegrityError:
            db.session.rollback()
@@ -80,31 +121,40 @@ class MicroBlog(db.Model):
 
    def read(self):
        """Read micro blog data as a dictionary, including topic key and path if available"""
-       # Get topic info if available
-       topic_key = None
-       topic_path = None
-       if self.topic:
-           topic_key = getattr(self.topic, '_page_key', None)
-           topic_path = getattr(self.topic, '_page_path', None)
+       return MicroBlog._serialize(
+           self.id, self._user_id, self._topic_id, self._content, self._data,
+           self._timestamp, self._updated_at, self._reply_count,
+           self.user.name if self.user else None, self.user.uid if self.user else None,
+           self.topic._page_key if self.topic else None, self.topic._page_path if self.topic else None,
+           self.get_reactions(), self.get_reaction_counts(), MicroBlogReply.first_pages([self.id]).get(self.id, Page()))
+
+
+   @staticmethod
+   def _serialize(id, user_id, topic_id, content, data, timestamp, updated_at, reply_count,
+                  user_name, user_uid, topic_key, topic_path, reactions, reaction_counts, replies):
+       """The read() dict, from column values, shared by read() and the feeds (see _feed), replies a Page of reply dicts"""
        base_data = {
-           'id': self.id,
-           'userId': self._user_id,
-           'userName': self.user.name if self.user else 'Unknown',
-           'userUid': self.user.uid if self.user else None,
-           'content': self._content,
-           'topicId': self._topic_id,
+           'id': id,
+           'userId': user_id,
+           'userName': user_name if user_name is not None else 'Unknown',
+           'userUid': user_uid,
+           'content': content,
+           'topicId': topic_id,
            'topicKey': topic_key,
            'topicPath': topic_path,
-           'timestamp': self._timestamp.isoformat() if self._timestamp else None,
-           'updatedAt': self._updated_at.isoformat() if self._updated_at else None,
-           'characterCount': len(self._content),
+           'timestamp': timestamp.isoformat() if timestamp else None,
+           'updatedAt': updated_at.isoformat() if updated_at else None,
+           'characterCount': len(content),
+           'replyCount': reply_count,
+           'replies': list(replies),
+           'repliesNextCursor': replies.next_cursor,
+           'reactions': reactions,
+           'reactionCounts': reaction_counts,
        }
        # Merge with JSON data, giving priority to base_data for core fields
-       if self._data:
-           merged_data = {**self._data, **base_data}
-       else:
-           merged_data = base_data
-       return merged_data
+       if data:
+           return {**data, **base_data}
+       return base_data
 
 
    def update(self, content=None, data=None):
@@ -124,86 +174,73 @@ class MicroBlog(db.Model):
                   
            self._updated_at = datetime.utcnow()
            db.session.commit()
+           response_cache.invalidate(*self._cache_tags())
            return self
        except Exception as e:
            db.session.rollback()
            raise e
 
 
-   def get_replies(self):
-       """Return replies array; empty list if none or malformed."""
-       if not self._data or 'replies' not in self._data or not isinstance(self._data['replies'], list):
-           return []
-       return self._data['replies']
+   def get_replies(self, limit=None, cursor=None):
+       """
+       Replies oldest first, keyset on (_timestamp, id): a Page of reply dicts with next_cursor.
+       Author names are resolved in one query for the page.
+       """
+       query = MicroBlogReply.query.filter_by(_microblog_id=self.id)
+       page = keyset_page(query, (MicroBlogReply._timestamp, MicroBlogReply.id), limit, cursor, descending=False)
+       return Page(MicroBlogReply.read_all(page), page.next_cursor)
 
 
    def add_reply(self, user_id, reply_content):
-       """Add a reply to the JSON data structure, including userName for display."""
-       if len(reply_content) > 280:
-           raise ValueError("Reply content must be 280 characters or less")
-      
-       if not self._data:
-           self._data = {}
-      
-       if 'replies' not in self._data or not isinstance(self._data['replies'], list):
-           self._data['replies'] = []
-      
-       # Attempt to include userName for frontend display
-       user_name = None
-       try:
-           from model.user import User
-           u = User.query.get(user_id)
-           user_name = u.name if u else None
-       except Exception:
-           user_name = None
-      
-       reply = {
-           'id': len(self._data['replies']) + 1,  # Simple incrementing ID
-           'userId': user_id,
-           'userName': user_name,
-           'content': reply_content,
-           'timestamp': datetime.utcnow().isoformat()
-       }
-      
-       self._data['replies'].append(reply)
-       self._updated_at = datetime.utcnow()
-      
-       flag_modified(self, '_data')
-      
+       """
+       Add a reply, one row insert and an increment of _reply_count computed by the database, so
+       concurrent replies neither overwrite each other nor share an id.
+       """
+       reply = MicroBlogReply(self.id, user_id, reply_content)
+       # Before the writes, the write lock is then held for the two statements only
+       names = MicroBlogReply.author_names([reply])
        try:
+           db.session.add(reply)
+           MicroBlog.query.filter_by(id=self.id).update(
+               {MicroBlog._reply_count: MicroBlog._reply_count + 1, MicroBlog._updated_at: datetime.utcnow()},
+               synchronize_session=False)
+           db.session.flush()
+           result = MicroBlogReply.read_all([reply], names)[0]
            db.session.commit()
-           return reply
+           db.session.expire(self, ['_reply_count', '_updated_at'])
+           response_cache.invalidate(*self._cache_tags())
+           return result
        except Exception as e:
            db.session.rollback()
            raise e
 
 
    def add_reaction(self, user_id, reaction_type):
-       """Add a reaction (like, heart, etc.) to the JSON data"""
-       if not self._data:
-           self._data = {}
-          
-       if 'reactions' not in self._data:
-           self._data['reactions'] = {}
-          
-       if reaction_type not in self._data['reactions']:
-           self._data['reactions'][reaction_type] = []
-          
-       # Remove user's previous reaction of this type if exists
-       self._data['reactions'][reaction_type] = [
-           uid for uid in self._data['reactions'][reaction_type] if uid != user_id
-       ]
-      
-       # Add new reaction
-       self._data['reactions'][reaction_type].append(user_id)
-       self._updated_at = datetime.utcnow()
-      
-       # CRITICAL: Mark the _data column as modified for SQLAlchemy
-       flag_modified(self, '_data')
-      
+       """
+       Add a user's reaction (like, heart, etc.), a no-op when it is already there.
+
+       One row insert and one counter increment, whatever the number of reactions on the post, and
+       concurrent reactions from other workers are separate rows rather than rewrites of one blob.
+       """
+       if not reaction_type or len(reaction_type) > 32:
+           raise ValueError("Reaction type must be 1 to 32 characters")
        try:
+           try:
+               # A statement rather than session.add, the row may already be loaded in this session
+               with db.session.begin_nested():
+                   db.session.execute(MicroBlogReaction.__table__.insert().values(
+                       _microblog_id=self.id, _user_id=user_id, _reaction_type=reaction_type))
+           except exc.IntegrityError:
+               # Only the primary key clash of a reaction already there (possibly from a concurrent
+               # request) is a no-op, a missing user or microblog still fails
+               if db.session.get(MicroBlogReaction, (self.id, user_id, reaction_type)) is None:
+                   raise
+               return True
+           MicroBlogReactionCount.add(self.id, reaction_type, 1)
+           self._updated_at = datetime.utcnow()
            db.session.commit()
-           db.session.refresh(self)
+           db.session.expire(self, ['reaction_rows', 'reaction_counters'])
+           response_cache.invalidate(*self._cache_tags())
            return True
        except Exception as e:
            db.session.rollback()
@@ -211,50 +248,39 @@ class MicroBlog(db.Model):
 
 
    def remove_reaction(self, user_id, reaction_type):
-       """Remove a reaction from the JSON data"""
-       if not self._data or 'reactions' not in self._data:
-           return False
-          
-       if reaction_type in self._data['reactions']:
-           self._data['reactions'][reaction_type] = [
-               uid for uid in self._data['reactions'][reaction_type] if uid != user_id
-           ]
+       """Remove a user's reaction, False when there was none"""
+       try:
+           removed = MicroBlogReaction.query.filter_by(
+               _microblog_id=self.id, _user_id=user_id, _reaction_type=reaction_type
+           ).delete(synchronize_session='fetch')
+           if not removed:
+               return False
+           MicroBlogReactionCount.add(self.id, reaction_type, -1)
            self._updated_at = datetime.utcnow()
-          
-           flag_modified(self, '_data')
-          
-           try:
-               db.session.commit()
-               db.session.refresh(self)
-               return True
-           except Exception as e:
-               db.session.rollback()
-               raise e
-      
-       return False
+           db.session.commit()
+           db.session.expire(self, ['reaction_rows', 'reaction_counters'])
+           response_cache.invalidate(*self._cache_tags())
+           return True
+       except Exception as e:
+           db.session.rollback()
+           raise e
   
    def get_reactions(self):
-       """Return reactions dictionary; empty dict if none or malformed."""
-       if not self._data or 'reactions' not in self._data or not isinstance(self._data['reactions'], dict):
-           return {}
-       return self._data['reactions']
+       """Return reactions as {reaction type: [user ids]}, in reaction order"""
+       reactions = {}
+       for reaction in self.reaction_rows:
+           reactions.setdefault(reaction._reaction_type, []).append(reaction._user_id)
+       return reactions
 
 
    def get_reaction_counts(self):
-       """Return a dictionary with reaction counts"""
-       reactions = self.get_reactions()
-       reaction_counts = {}
-       for reaction_type, user_ids in reactions.items():
-           reaction_counts[reaction_type] = len(user_ids)
-       return reaction_counts
+       """Return a dictionary with reaction counts, from the maintained counters"""
+       return {counter._reaction_type: counter._count for counter in self.reaction_counters if counter._count > 0}
 
 
    def user_has_reacted(self, user_id, reaction_type):
-       """Check if a user has already reacted with a specific reaction type"""
-       reactions = self.get_reactions()
-       if reaction_type not in reactions:
-           return False
-       return user_id in reactions[reaction_type]
+       """Check if a user has already reacted with a specific reaction type, a primary key lookup"""
+       return db.session.get(MicroBlogReaction, (self.id, user_id, reaction_type)) is not None
 
 
    def toggle_reaction(self, user_id, reaction_type):
@@ -267,9 +293,15 @@ class MicroBlog(db.Model):
 
    def delete(self):
        """Delete the micro blog post"""
+       tags = self._cache_tags(listing=True)
        try:
+           # Also declared ON DELETE CASCADE, deleted here for SQLite without foreign_keys
+           MicroBlogReply.query.filter_by(_microblog_id=self.id).delete(synchronize_session=False)
+           MicroBlogReaction.query.filter_by(_microblog_id=self.id).delete(synchronize_session=False)
+           MicroBlogReactionCount.query.filter_by(_microblog_id=self.id).delete(synchronize_session=False)
            db.session.delete(self)
            db.session.commit()
+           response_cache.invalidate(*tags)
            return True
        except Exception as e:
            db.session.rollback()
@@ -283,31 +315,400 @@ class MicroBlog(db.Model):
 
 
    @staticmethod
-   def get_all(limit=50):
+   def _feed(query, limit, cursor=None):
+       """
+       Most recent first, keyset on (_timestamp, id): a Page of read() dicts with next_cursor.
+
+       The page is read as column tuples with the author and topic joined in, no ORM objects, and
+       the page's reactions, counters and first replies are read in bulk: four queries whatever the limit.
+       """
+       from model.user import User
+       query = (query.with_entities(
+                    MicroBlog.id, MicroBlog._user_id, MicroBlog._topic_id, MicroBlog._content, MicroBlog._data,
+                    MicroBlog._timestamp, MicroBlog._updated_at, MicroBlog._reply_count,
+                    User._name.label('user_name'), User._uid.label('user_uid'),
+                    Topic._page_key.label('topic_key'), Topic._page_path.label('topic_path'))
+                .outerjoin(User, User.id == MicroBlog._user_id)
+                .outerjoin(Topic, Topic.id == MicroBlog._topic_id))
+       page = keyset_page(query, (MicroBlog._timestamp, MicroBlog.id), limit, cursor)
+       reactions, reaction_counts, replies = {}, {}, {}
+       ids = [row.id for row in page]
+       if ids:
+           replies = MicroBlogReply.first_pages(ids)
+           for microblog_id, user_id, reaction_type in (
+                   db.session.query(MicroBlogReaction._microblog_id, MicroBlogReaction._user_id, MicroBlogReaction._reaction_type)
+                   .filter(MicroBlogReaction._microblog_id.in_(ids)).order_by(MicroBlogReaction._timestamp)):
+               reactions.setdefault(microblog_id, {}).setdefault(reaction_type, []).append(user_id)
+           for microblog_id, reaction_type, count in (
+                   db.session.query(MicroBlogReactionCount._microblog_id, MicroBlogReactionCount._reaction_type, MicroBlogReactionCount._count)
+                   .filter(MicroBlogReactionCount._microblog_id.in_(ids), MicroBlogReactionCount._count > 0)):
+               reaction_counts.setdefault(microblog_id, {})[reaction_type] = count
+       return Page([MicroBlog._serialize(*row, reactions.get(row.id, {}), reaction_counts.get(row.id, {}),
+                                         replies.get(row.id, Page())) for row in page],
+                   page.next_cursor)
+
+
+   @staticmethod
+   def get_all(limit=50, cursor=None):
        """Get all micro blog posts (most recent first)"""
-       microblogs = MicroBlog.query.order_by(MicroBlog._timestamp.desc()).limit(limit).all()
-       return [microblog.read() for microblog in microblogs]
+       return MicroBlog._feed(MicroBlog.query, limit, cursor)
 
 
    @staticmethod
-   def get_by_topic(topic_id, limit=50):
+   def get_by_topic(topic_id, limit=50, cursor=None):
        """Get all micro blog posts for a specific topic"""
-       microblogs = MicroBlog.query.filter_by(_topic_id=topic_id).order_by(MicroBlog._timestamp.desc()).limit(limit).all()
-       return [microblog.read() for microblog in microblogs]
+       return MicroBlog._feed(MicroBlog.query.filter_by(_topic_id=topic_id), limit, cursor)
 
 
    @staticmethod
-   def get_by_user(user_id, limit=50):
+   def get_by_user(user_id, limit=50, cursor=None):
        """Get all micro blog posts by a specific user"""
-       microblogs = MicroBlog.query.filter_by(_user_id=user_id).order_by(MicroBlog._timestamp.desc()).limit(limit).all()
-       return [microblog.read() for microblog in microblogs]
+       return MicroBlog._feed(MicroBlog.query.filter_by(_user_id=user_id), limit, cursor)
+
+
+   @staticmethod
+   def search_content(search_term, limit=50, cursor=None):
+       """Search micro blog posts by content, newest first: every word must start a word of the post (search index)"""
+       ids = matching_ids('microblog', search_term)
+       if ids is None:
+           return Page([])
+       # A rare word's few matches are looked up by id.  A common word's would all be fetched and
+       # sorted that way, so on SQLite id + 0 keeps the planner on the timestamp index instead, newest
+       # first until the page is full
+       ids = ids.subquery()
+       found = db.session.scalars(db.select(ids.c.id).limit(ID_LIST_MAX + 1)).all()
+       if len(found) <= ID_LIST_MAX:
+           return MicroBlog._feed(MicroBlog.query.filter(MicroBlog.id.in_(found)), limit, cursor)
+       key = MicroBlog.id + 0 if db.engine.dialect.name == 'sqlite' else MicroBlog.id
+       return MicroBlog._feed(MicroBlog.query.filter(key.in_(db.select(ids.c.id))), limit, cursor)
+
 
 
+
+class MicroBlogReply(db.Model):
+   """
+   MicroBlogReply
+
+   A reply in a microblog's thread, read oldest first in pages of get_replies.
+   """
+   __tablename__ = 'microblog_replies'
+   __table_args__ = (
+       db.Index('ix_microblog_replies_microblog_timestamp', '_microblog_id', '_timestamp'),
+   )
+
+   id = db.Column(db.Integer, primary_key=True)
+   _microblog_id = db.Column(db.Integer, db.ForeignKey('microblogs.id', ondelete='CASCADE'), nullable=False)
+   _user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), nullable=False)
+   _content = db.Column(db.String(280), nullable=False)
+   _timestamp = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+
+   def __init__(self, microblog_id, user_id, content, timestamp=None):
+       if not content or len(content) > 280:
+           raise ValueError("Reply content must be 1 to 280 characters")
+       self._microblog_id = microblog_id
+       self._user_id = user_id
+       self._content = content
+       self._timestamp = timestamp or datetime.utcnow()
+
    @staticmethod
-   def search_content(search_term, limit=50):
-       """Search micro blog posts by content"""
-       microblogs = MicroBlog.query.filter(MicroBlog._content.contains(search_term)).order_by(MicroBlog._timestamp.desc()).limit(limit).all()
-       return [microblog.read() for microblog in microblogs]
+   def author_names(replies):
+       """{user id: name} of the replies' authors, in one query"""
+       from model.user import User
+       user_ids = {reply._user_id for reply in replies}
+       return dict(db.session.query(User.id, User._name).filter(User.id.in_(user_ids)).all()) if user_ids else {}
+
+   @staticmethod
+   def read_all(replies, names=None):
+       """Reply dicts for frontend display, with the authors' userName"""
+       names = MicroBlogReply.author_names(replies) if names is None else names
+       return [{
+           'id': reply.id,
+           'microblogId': reply._microblog_id,
+           'userId': reply._user_id,
+           'userName': names.get(reply._user_id),
+           'content': reply._content,
+           'timestamp': reply._timestamp.isoformat() if reply._timestamp else None,
+       } for reply in replies]
+
+   @staticmethod
+   def first_pages(microblog_ids, limit=None):
+       """
+       {microblog id: Page of reply dicts} of each thread's first replies, oldest first, with the
+       next_cursor of GET /api/microblog/reply when the thread goes on.  One query for all the
+       microblogs, numbered per thread by ROW_NUMBER, author names joined in.
+       """
+       from model.user import User
+       limit = app.config['MICROBLOG_INLINE_REPLIES'] if limit is None else limit
+       if not microblog_ids or limit <= 0:
+           return {}
+       position = func.row_number().over(partition_by=MicroBlogReply._microblog_id,
+                                         order_by=(MicroBlogReply._timestamp, MicroBlogReply.id)).label('position')
+       numbered = (db.session.query(MicroBlogReply.id, MicroBlogReply._microblog_id, MicroBlogReply._user_id,
+                                    MicroBlogReply._content, MicroBlogReply._timestamp, position)
+                   .filter(MicroBlogReply._microblog_id.in_(microblog_ids)).subquery())
+       rows = (db.session.query(numbered, User._name)
+               .outerjoin(User, User.id == numbered.c._user_id)
+               .filter(numbered.c.position <= limit + 1)
+               .order_by(numbered.c._microblog_id, numbered.c.position).all())
+       threads, names = {}, {}
+       for row in rows:
+           threads.setdefault(row._microblog_id, []).append(row)
+           names[row._user_id] = row._name
+       pages = {}
+       for microblog_id, thread in threads.items():
+           # One extra reply tells whether the thread goes on, like keyset_page
+           next_cursor = encode_cursor([thread[limit - 1]._timestamp, thread[limit - 1].id]) if len(thread) > limit else None
+           pages[microblog_id] = Page(MicroBlogReply.read_all(thread[:limit], names), next_cursor)
+       return pages
+
+   @staticmethod
+   def export_threads(microblog_ids):
+       """{microblog id: every reply dict, oldest first, with the author's userUid} for backups, in one query"""
+       from model.user import User
+       if not microblog_ids:
+           return {}
+       rows = (db.session.query(MicroBlogReply.id, MicroBlogReply._microblog_id, MicroBlogReply._user_id,
+                                MicroBlogReply._content, MicroBlogReply._timestamp, User._name, User._uid)
+               .outerjoin(User, User.id == MicroBlogReply._user_id)
+               .filter(MicroBlogReply._microblog_id.in_(microblog_ids))
+               .order_by(MicroBlogReply._microblog_id, MicroBlogReply._timestamp, MicroBlogReply.id).all())
+       threads = {}
+       for row in rows:
+           reply = MicroBlogReply.read_all([row], {row._user_id: row._name})[0]
+           reply['userUid'] = row._uid
+           threads.setdefault(row._microblog_id, []).append(reply)
+       return threads
+
+   @staticmethod
+   def import_json(microblog, replies):
+       """
+       Recreate an exported thread (export_threads dicts) under a newly imported microblog, authors
+       found by userUid, and set _reply_count.  Replies of unknown users or without content are
+       skipped.  Returns the replies imported, flushes, the caller commits.
+       """
+       from model.user import User
+       replies = [reply for reply in replies if isinstance(reply, dict)] if isinstance(replies, list) else []
+       uids = {reply.get('userUid') for reply in replies if reply.get('userUid')}
+       users = dict(db.session.query(User._uid, User.id).filter(User._uid.in_(uids)).all()) if uids else {}
+       imported = 0
+       for reply in replies:
+           user_id = users.get(reply.get('userUid'))
+           content = str(reply.get('content') or '')[:280]
+           try:
+               timestamp = datetime.fromisoformat(reply['timestamp']) if reply.get('timestamp') else None
+           except (TypeError, ValueError):
+               timestamp = None
+           if user_id and content:
+               db.session.add(MicroBlogReply(microblog.id, user_id, content, timestamp or microblog._timestamp))
+               imported += 1
+       db.session.flush()
+       microblog._reply_count = MicroBlogReply.query.filter_by(_microblog_id=microblog.id).count()
+       db.session.flush()
+       return imported
+
+   @staticmethod
+   def migrate_json(microblog):
+       """
+       Move one microblog's replies out of the old _data['replies'] list into rows, in list order,
+       set _reply_count, then drop the key from _data.  Replies of unknown users or without content
+       are skipped.  Flushes, the caller commits.
+       """
+       from model.user import User
+       legacy = (microblog._data or {}).get('replies')
+       legacy = [reply for reply in legacy if isinstance(reply, dict)] if isinstance(legacy, list) else []
+       user_ids = set()
+       for reply in legacy:
+           try:
+               user_ids.add(int(reply.get('userId')))
+           except (TypeError, ValueError):
+               continue
+       known_users = {user_id for (user_id,) in db.session.query(User.id).filter(User.id.in_(user_ids)).all()} if user_ids else set()
+       for reply in legacy:
+           try:
+               user_id = int(reply.get('userId'))
+               timestamp = datetime.fromisoformat(reply['timestamp']) if reply.get('timestamp') else None
+           except (TypeError, ValueError):
+               continue
+           content = str(reply.get('content') or '')[:280]
+           if user_id in known_users and content:
+               db.session.add(MicroBlogReply(microblog.id, user_id, content, timestamp or microblog._timestamp))
+       db.session.flush()
+       microblog._reply_count = MicroBlogReply.query.filter_by(_microblog_id=microblog.id).count()
+       microblog._data = {key: value for key, value in microblog._data.items() if key != 'replies'}
+       flag_modified(microblog, '_data')
+       db.session.flush()
+
+
+class MicroBlogReaction(db.Model):
+   """
+   MicroBlogReaction
+
+   One user's reaction of one type to a microblog, the primary key makes reacting twice impossible.
+   """
+   __tablename__ = 'microblog_reactions'
+
+   _microblog_id = db.Column(db.Integer, db.ForeignKey('microblogs.id', ondelete='CASCADE'), primary_key=True)
+   _user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), primary_key=True)
+   _reaction_type = db.Column(db.String(32), primary_key=True)
+   _timestamp = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+
+   def __init__(self, microblog_id, user_id, reaction_type):
+       if not reaction_type or len(reaction_type) > 32:
+           raise ValueError("Reaction type must be 1 to 32 characters")
+       self._microblog_id = microblog_id
+       self._user_id = user_id
+       self._reaction_type = reaction_type
+       self._timestamp = datetime.utcnow()
+
+   @staticmethod
+   def migrate_json(microblog):
+       """
+       Move one microblog's reactions out of the old _data['reactions'] {type: [user ids]} layout into
+       rows and counters, then drop the key from _data.  Reactions already stored as rows are kept,
+       unknown users are skipped.  Flushes, the caller commits.
+       """
+       from model.user import User
+       legacy = (microblog._data or {}).get('reactions')
+       wanted = set()
+       if isinstance(legacy, dict):
+           for reaction_type, user_ids in legacy.items():
+               if not isinstance(user_ids, list) or not reaction_type or len(reaction_type) > 32:
+                   continue
+               for user_id in user_ids:
+                   try:
+                       wanted.add((reaction_type, int(user_id)))
+                   except (TypeError, ValueError):
+                       continue
+       existing = set(db.session.query(MicroBlogReaction._reaction_type, MicroBlogReaction._user_id)
+                      .filter(MicroBlogReaction._microblog_id == microblog.id).all())
+       known_users = {user_id for (user_id,) in db.session.query(User.id).filter(
+           User.id.in_({user_id for _, user_id in wanted - existing})).all()} if wanted - existing else set()
+       db.session.add_all([MicroBlogReaction(microblog.id, user_id, reaction_type)
+                           for reaction_type, user_id in sorted(wanted - existing) if user_id in known_users])
+       db.session.flush()
+       MicroBlogReactionCount.recount(microblog.id)
+       microblog._data = {key: value for key, value in microblog._data.items() if key != 'reactions'}
+       flag_modified(microblog, '_data')
+       db.session.flush()
+
+
+class MicroBlogReactionCount(db.Model):
+   """
+   MicroBlogReactionCount
+
+   Number of reactions of one type on a microblog, kept in step with MicroBlogReaction by
+   MicroBlog.add_reaction/remove_reaction, so counts are read without counting rows.
+   """
+   __tablename__ = 'microblog_reaction_counts'
+
+   _microblog_id = db.Column(db.Integer, db.ForeignKey('microblogs.id', ondelete='CASCADE'), primary_key=True)
+   _reaction_type = db.Column(db.String(32), primary_key=True)
+   _count = db.Column(db.Integer, nullable=False, default=0)
+
+   def __init__(self, microblog_id, reaction_type, count=0):
+       self._microblog_id = microblog_id
+       self._reaction_type = reaction_type
+       self._count = count
+
+   @staticmethod
+   def add(microblog_id, reaction_type, delta):
+       """
+       Change a counter in one UPDATE computed by the database, so concurrent writers do not lose
+       increments.  The first reaction of a type creates the counter, if another worker created it at
+       the same time the insert fails and the UPDATE is repeated.
+       """
+       def update():
+           query = MicroBlogReactionCount.query.filter_by(_microblog_id=microblog_id, _reaction_type=reaction_type)
+           if delta < 0:
+               query = query.filter(MicroBlogReactionCount._count >= -delta)
+           return query.update({MicroBlogReactionCount._count: MicroBlogReactionCount._count + delta},
+                               synchronize_session=False)
+
+       if update() or delta < 0:
+           return
+       try:
+           with db.session.begin_nested():
+               db.session.add(MicroBlogReactionCount(microblog_id, reaction_type, delta))
+       except exc.IntegrityError:
+           update()
+
+   @staticmethod
+   def recount(microblog_id):
+       """Rebuild a microblog's counters from its reaction rows"""
+       MicroBlogReactionCount.query.filter_by(_microblog_id=microblog_id).delete(synchronize_session=False)
+       counts = (db.session.query(MicroBlogReaction._reaction_type, func.count())
+                 .filter(MicroBlogReaction._microblog_id == microblog_id)
+                 .group_by(MicroBlogReaction._reaction_type).all())
+       db.session.add_all([MicroBlogReactionCount(microblog_id, reaction_type, count) for reaction_type, count in counts])
+
+
+def _migrate_json(key, migrate, batch_size):
+   """Run migrate(microblog) on every microblog whose _data still has key, in batches, see migrate_replies"""
+   from __init__ import app
+   migrated = 0
+   with app.app_context():
+       db.create_all()  # also adds _reply_count to an older microblogs table, see ensure_reply_count
+       last_id = 0
+       while True:
+           batch = MicroBlog.query.filter(MicroBlog.id > last_id).order_by(MicroBlog.id).limit(batch_size).all()
+           if not batch:
+               break
+           last_id = batch[-1].id
+           for microblog in batch:
+               if microblog._data and key in microblog._data:
+                   migrate(microblog)
+                   migrated += 1
+           db.session.commit()
+           db.session.expunge_all()
+   return migrated
+
+
+def migrate_reactions(batch_size=500):
+   """
+   Move reactions from MicroBlog._data['reactions'] into the reaction tables, `flask custom
+   migrate_reactions`.  Safe to run again, migrated posts no longer have the key.
+
+   Returns:
+       dict: microblogs migrated and reaction rows afterwards
+   """
+   from __init__ import app
+   migrated = _migrate_json('reactions', MicroBlogReaction.migrate_json, batch_size)
+   with app.app_context():
+       return {'microblogs': migrated, 'reactions': MicroBlogReaction.query.count()}
+
+
+def migrate_replies(batch_size=500):
+   """
+   Move replies from MicroBlog._data['replies'] into the replies table and set _reply_count, `flask
+   custom migrate_replies`.  Safe to run again, migrated posts no longer have the key.
+
+   Returns:
+       dict: microblogs migrated and reply rows afterwards
+   """
+   from __init__ import app
+   migrated = _migrate_json('replies', MicroBlogReply.migrate_json, batch_size)
+   with app.app_context():
+       return {'microblogs': migrated, 'replies': MicroBlogReply.query.count()}
+
+
+def ensure_reply_count(connection):
+   """
+   Add _reply_count to a microblogs table from before it, filled from the replies table, returns
+   True when the column was added.  Every feed query reads the column, create_all only adds
+   missing tables.
+   """
+   if '_reply_count' in {column['name'] for column in inspect(connection).get_columns('microblogs')}:
+       return False
+   connection.exec_driver_sql("ALTER TABLE microblogs ADD COLUMN _reply_count INTEGER NOT NULL DEFAULT 0")
+   connection.exec_driver_sql("UPDATE microblogs SET _reply_count = (SELECT COUNT(*) FROM microblog_replies "
+                              "WHERE microblog_replies._microblog_id = microblogs.id)")
+   return True
+
+
+# Every create_all (initUsers, migrate_replies, search_rebuild) also upgrades a microblogs table that predates _reply_count
+@event.listens_for(db.metadata, 'after_create')
+def _add_reply_count(target, connection, **kw):
+   ensure_reply_count(connection)
 
 
 
@@ -388,11 +789,17 @@ class Topic(db.Model):
        # Ensure it's not too long
        return key[:100].strip('_')
   
+   @property
+   def cache_tag(self):
+       """Response cache tag of this topic's page feed"""
+       return f'topic:{self._page_key}'
+  
    def create(self):
        """Create a new topic"""
        try:
            db.session.add(self)
            db.session.commit()
+           response_cache.invalidate('topics', self.cache_tag)
            return self
        except IntegrityError as e:
            db.session.rollback()
@@ -415,6 +822,7 @@ class Topic(db.Model):
           
            self._updated_at = datetime.utcnow()
            db.session.commit()
+           response_cache.invalidate('topics', self.cache_tag)
            return self
        except Exception as e:
            db.session.rollback()
@@ -436,7 +844,7 @@ class Topic(db.Model):
            'maxPostsPerUser': self._max_posts_per_user,
            'isActive': self._is_active,
            'settings': self._settings,
-           'postCount': len(self.microblogs),
+           'postCount': MicroBlog.query.filter_by(_topic_id=self.id).count(),
            'createdAt': self._created_at.isoformat() if self._created_at else None,
            'updatedAt': self._updated_at.isoformat() if self._updated_at else None
        }
@@ -445,30 +853,74 @@ class Topic(db.Model):
        """Get number of posts by a specific user in this topic"""
        return MicroBlog.query.filter_by(_topic_id=self.id, _user_id=user_id).count()
   
-   def can_user_post(self, user_id):
-       """Check if user can post more messages in this topic"""
+   def can_user_post(self, user_id, post_count=None):
+       """Check if user can post more messages in this topic, post_count when it is known already"""
        if not self._is_active:
            return False
       
-       current_count = self.get_user_post_count(user_id)
+       current_count = self.get_user_post_count(user_id) if post_count is None else post_count
        return current_count < self._max_posts_per_user
   
    def get_recent_posts(self, limit=10, user_id=None):
        """Get recent posts for this topic"""
-       query = MicroBlog.query.filter_by(_topic_id=self.id)
-      
        # If not allowing anonymous and no user_id, return empty
        if not self._allow_anonymous and not user_id:
            return []
       
-       posts = query.order_by(MicroBlog._timestamp.desc()).limit(limit).all()
-       return [post.read() for post in posts]
+       return list(MicroBlog._feed(MicroBlog.query.filter_by(_topic_id=self.id), limit))
   
    @staticmethod
    def get_by_page_path(page_path):
        """Get topic by page path"""
        return Topic.query.filter_by(_page_path=page_path).first()
   
+   @staticmethod
+   def page_feed(page_key, limit=20, ttl=30):
+       """
+       The part of a page's embedded discussion that is the same for every viewer: the topic and its
+       latest microblogs, serialized.
+
+       Cached per page and limit under the topic's tag, which microblog create, update, delete, reply
+       and reaction invalidate, and kept for the rest of the request (the ETag and the body both use
+       it).  A cache hit costs no query.
+
+       Returns:
+           dict {topic, microblogs, version}, version a digest of both; None if there is no such topic
+       """
+       key = f'topic-feed {page_key} {limit}'
+       memo = g.setdefault('topic_page_feeds', {}) if has_request_context() else {}
+       if key in memo:
+           return memo[key]
+       feed = response_cache.get(key)
+       if feed is None:
+           tags = [f'topic:{page_key}']
+           versions = response_cache.versions(tags)
+           topic = Topic.get_by_page_key(page_key)
+           if topic is not None:
+               feed = {'topic': topic.read(),
+                       'microblogs': list(MicroBlog._feed(MicroBlog.query.filter_by(_topic_id=topic.id), limit))}
+               feed['version'] = hashlib.blake2b(json.dumps(feed, sort_keys=True).encode('utf-8'), digest_size=12).hexdigest()
+               response_cache.set(key, feed, ttl, tags, versions)
+       memo[key] = feed
+       return feed
+  
+   @staticmethod
+   def user_posts_tag(topic_id, user_id):
+       """Response cache tag of a user's post count in a topic"""
+       return f'topic-posts:{topic_id}:{user_id}'
+  
+   @staticmethod
+   def cached_user_post_count(topic_id, user_id, ttl=30):
+       """get_user_post_count for display, cached per topic and user until the user posts or deletes in the topic"""
+       key = f'topic-posts {topic_id} {user_id}'
+       count = response_cache.get(key)
+       if count is None:
+           tags = [Topic.user_posts_tag(topic_id, user_id)]
+           versions = response_cache.versions(tags)
+           count = MicroBlog.query.filter_by(_topic_id=topic_id, _user_id=user_id).count()
+           response_cache.set(key, count, ttl, tags, versions)
+       return count
+  
    @staticmethod
    def get_by_page_key(page_key):
        """Get topic by page key"""
@@ -511,13 +963,11 @@ class Topic(db.Model):
   
    @staticmethod
    def search_by_title(search_term):
-       """Search topics by title or description"""
-       topics = Topic.query.filter(
-           db.or_(
-               Topic._page_title.contains(search_term),
-               Topic._page_description.contains(search_term)
-           )
-       ).filter_by(_is_active=True).all()
+       """Search active topics by title or description, every word must start a word of either (search index)"""
+       ids = matching_ids('topic', search_term)
+       if ids is None:
+           return []
+       topics = Topic.query.filter(Topic.id.in_(ids)).order_by(Topic._page_title).all()
        return [topic.read() for topic in topics]
 
 
@@ -630,9 +1080,7 @@ def initMicroblogs():
                "data": {
                    "lessonProgress": "completed",
                    "rating": 5,
-                   "hashtags": ["flask", "python", "webdev"],
-                   "reactions": {"👍": [], "🎉": []},
-                   "replies": []
+                   "hashtags": ["flask", "python", "webdev"]
                }
            },
            {
@@ -641,9 +1089,7 @@ def initMicroblogs():
                "data": {
                    "helpRequested": True,
                    "difficulty": "medium",
-                   "hashtags": ["javascript", "arrays", "help"],
-                   "reactions": {"🤔": [], "💡": []},
-                   "replies": []
+                   "hashtags": ["javascript", "arrays", "help"]
                }
            },
            {
@@ -653,9 +1099,7 @@ def initMicroblogs():
                    "projectType": "react",
                    "features": ["dark-mode", "responsive"],
                    "seeking": "feedback",
-                   "hashtags": ["portfolio", "react", "showcase"],
-                   "reactions": {"❤️": [], "🔥": []},
-                   "replies": []
+                   "hashtags": ["portfolio", "react", "showcase"]
                }
            },
            {
@@ -666,9 +1110,7 @@ def initMicroblogs():
                    "tasks": ["database-models", "api-planning", "quiz-prep"],
                    "blockers": [],
                    "mood": "productive",
-                   "hashtags": ["standup", "progress"],
-                   "reactions": {"💪": []},
-                   "replies": []
+                   "hashtags": ["standup", "progress"]
                }
            },
            {
@@ -679,9 +1121,7 @@ def initMicroblogs():
                    "resourceUrl": "https://developer.mozilla.org",
                    "subject": "javascript",
                    "recommendation": True,
-                   "hashtags": ["resources", "javascript", "documentation"],
-                   "reactions": {"📚": [], "👍": []},
-                   "replies": []
+                   "hashtags": ["resources", "javascript", "documentation"]
                }
            }
        ]
@@ -0,0 +1,130 @@
+""" Keyset (cursor) pagination for feeds, listings and exports """
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from datetime import date, datetime
+from sqlalchemy import and_, event, inspect, or_
+from werkzeug.exceptions import BadRequest
+import json
+
+from __init__ import db
+
+# Most rows one keyset page returns, whatever limit the caller asks for
+MAX_PAGE_LIMIT = 1000
+
+
+class InvalidCursor(BadRequest):
+    """The cursor was not produced by this order, or was altered, answered as 400 Bad Request."""
+    description = 'Invalid cursor'
+
+
+class Page(list):
+    """
+    Page
+
+    One page of results, a plain list for existing callers, plus next_cursor: the opaque cursor of
+    the following page, None on the last page.
+    """
+
+    def __init__(self, items=(), next_cursor=None):
+        super().__init__(items)
+        self.next_cursor = next_cursor
+
+
+def encode_cursor(values):
+    """Opaque cursor for the sort key of the last row of a page."""
+    values = [value.isoformat() if isinstance(value, (date, datetime)) else value for value in values]
+    return urlsafe_b64encode(json.dumps(values, separators=(',', ':')).encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor, order):
+    """Sort key values from a cursor, typed like the order columns.  Raises InvalidCursor."""
+    try:
+        values = json.loads(urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+    except ValueError:
+        raise InvalidCursor()
+    if not isinstance(values, list) or len(values) != len(order):
+        raise InvalidCursor()
+    typed = []
+    for column, value in zip(order, values):
+        python_type = column.expression.type.python_type
+        try:
+            if python_type is datetime:
+                value = datetime.fromisoformat(value)
+            elif python_type is int:
+                value = int(value)
+        except (TypeError, ValueError):
+            raise InvalidCursor()
+        typed.append(value)
+    return typed
+
+
+def _after(order, values, descending):
+    """
+    Rows strictly after the cursor, expanded as (a < x) OR (a = x AND b < y) ...
+    rather than a row-value comparison, so SQLite and MySQL both use the index on the order columns.
+    """
+    clauses = []
+    for i, column in enumerate(order):
+        bound = column < values[i] if descending else column > values[i]
+        clauses.append(and_(*[order[j] == values[j] for j in range(i)], bound))
+    return or_(*clauses)
+
+
+def keyset_page(query, order, limit, cursor=None, descending=True):
+    '''
+    Fetch one page of query, ordered by the order columns, after cursor.
+
+    The last order column must be unique (the primary key) so the order is total: rows inserted while
+    a client pages through the results never shift later pages, unlike OFFSET, and every page costs
+    the same index seek however deep it is.
+
+    Args:
+        query: the filtered Model.query, without order_by or limit
+        order: sort key columns, e.g. (MicroBlog._timestamp, MicroBlog.id)
+        limit: rows per page, clamped to 1..MAX_PAGE_LIMIT, None for all rows (no next_cursor)
+        cursor: next_cursor of the previous page, None or '' for the first page
+        descending: newest first (feeds) or oldest first (exports)
+
+    Returns:
+        Page of model instances with next_cursor set
+    '''
+    if cursor:
+        query = query.filter(_after(order, decode_cursor(cursor, order), descending))
+    query = query.order_by(*[column.desc() if descending else column.asc() for column in order])
+    if limit is None:
+        return Page(query.all())
+    limit = max(1, min(limit, MAX_PAGE_LIMIT))
+    # One extra row tells whether there is a next page without a COUNT
+    rows = query.limit(limit + 1).all()
+    if not rows:
+        return Page()
+    if len(rows) <= limit:
+        return Page(rows)
+    rows = rows[:limit]
+    last = rows[-1]
+    return Page(rows, encode_cursor([getattr(last, column.key) for column in order]))
+
+
+def ensure_indexes(connection):
+    """
+    Create the declared indexes that are missing on existing tables, returns their names.
+
+    create_all only creates missing tables, so a database from before the keyset sort indexes
+    (ix_microblogs_timestamp_id, ix_posts_parent_timestamp_id, ...) would page by full sorts.
+    """
+    inspector = inspect(connection)
+    created = []
+    for table in db.metadata.sorted_tables:
+        if not inspector.has_table(table.name):
+            continue
+        existing = {index['name'] for index in inspector.get_indexes(table.name)}
+        for index in table.indexes:
+            if index.name not in existing:
+                index.create(connection)
+                created.append(index.name)
+    return created
+
+
+# Every create_all (initUsers and the other init paths) also adds them to an existing database
+@event.listens_for(db.metadata, 'after_create')
+def _create_missing_indexes(target, connection, **kw):
+    ensure_indexes(connection)
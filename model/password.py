@@ -0,0 +1,110 @@
+""" Bounded pbkdf2 hashing and verification used by model/user.py """
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+from werkzeug.security import generate_password_hash, check_password_hash
+import threading
+import time
+
+from __init__ import app
+
+
+class PasswordQueueFull(Exception):
+    """Raised when too many hashes are already waiting, the caller should answer 503."""
+
+
+class PasswordHasher:
+    """
+    PasswordHasher
+
+    Runs pbkdf2 on a small, bounded thread pool instead of in the request thread.
+
+    pbkdf2 at 1,000,000 iterations costs hundreds of milliseconds of CPU.  When a class logs in at
+    once, every gunicorn thread ends up hashing and nothing else gets served.  The pool caps how
+    many hashes run at the same time per worker (hashlib releases the GIL while hashing), and the
+    queue bound turns an overload into a fast 503 instead of requests timing out behind each other.
+
+    Attributes:
+        iterations (int): The configured pbkdf2:sha256 cost, PASSWORD_HASH_ITERATIONS.
+        max_queue (int): Hashes allowed to wait or run before new ones are rejected.
+        timeout (float): Seconds a caller waits for its hash before giving up.
+    """
+
+    def __init__(self, iterations, workers=2, max_queue=32, timeout=10):
+        self.iterations = iterations
+        self.method = f"pbkdf2:sha256:{iterations}"
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='pbkdf2')
+        self._workers = workers
+        self._lock = threading.Lock()
+        self._depth = 0
+        self.completed = 0
+        self.rejected = 0
+        self.rehashed = 0
+        self.total_seconds = 0.0
+
+    def _run(self, func, *args):
+        with self._lock:
+            if self._depth >= self.max_queue:
+                self.rejected += 1
+                raise PasswordQueueFull("Too many logins in progress, try again shortly")
+            self._depth += 1
+        started = time.perf_counter()
+        try:
+            future = self._executor.submit(func, *args)
+        except BaseException:
+            self._release(None, started)
+            raise
+        # The slot is freed when the job really ends, not when its caller stops waiting
+        future.add_done_callback(lambda done: self._release(done, started))
+        try:
+            return future.result(timeout=self.timeout)
+        except TimeoutError:
+            # Drop it if it is still queued, a running hash holds its slot until it finishes
+            future.cancel()
+            raise PasswordQueueFull("Password check timed out, try again shortly")
+
+    def _release(self, future, started):
+        with self._lock:
+            self._depth -= 1
+            if future is not None and not future.cancelled():
+                self.completed += 1
+                self.total_seconds += time.perf_counter() - started
+
+    def hash(self, password):
+        """Hash a password with the configured method."""
+        return self._run(generate_password_hash, password, self.method, 10)
+
+    def verify(self, pwhash, password):
+        """Check a password against a stored hash, whatever parameters it was made with."""
+        return self._run(check_password_hash, pwhash, password)
+
+    def record_rehash(self):
+        """Count a stored hash upgraded to the configured parameters."""
+        with self._lock:
+            self.rehashed += 1
+
+    def needs_rehash(self, pwhash):
+        """True if the stored hash was made with other parameters than the configured ones."""
+        return not pwhash.startswith(self.method + "$")
+
+    def stats(self):
+        with self._lock:
+            return {
+                'method': self.method,
+                'workers': self._workers,
+                'queue_depth': self._depth,
+                'max_queue': self.max_queue,
+                'completed': self.completed,
+                'rejected': self.rejected,
+                'rehashed': self.rehashed,
+                'avg_ms': round(1000 * self.total_seconds / self.completed, 1) if self.completed else None,
+            }
+
+
+# One pool per worker process, sized from PASSWORD_HASH_* in __init__.py
+password_hasher = PasswordHasher(
+    iterations=app.config['PASSWORD_HASH_ITERATIONS'],
+    workers=app.config['PASSWORD_HASH_WORKERS'],
+    max_queue=app.config['PASSWORD_HASH_QUEUE'],
+    timeout=app.config['PASSWORD_HASH_TIMEOUT'],
+)
@@ -1,4 +1,5 @@
 from __init__ import app, db
+from model.cache import response_cache
 from sqlalchemy import JSON
 from sqlalchemy.orm import validates
 from sqlalchemy.exc import IntegrityError
@@ -219,6 +220,7 @@ class Persona(db.Model):
     def create(self):
         db.session.add(self)
         db.session.commit()
+        response_cache.invalidate('personas')
         return self
 
     def read(self):
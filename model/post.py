@@ -3,8 +3,9 @@ Social Media Post Model
 Defines the database schema for posts and replies
 """
 from sqlite3 import IntegrityError
-from sqlalchemy import Text
+from sqlalchemy import Text, func
 from __init__ import db
+from model.pagination import Page, keyset_page
 from datetime import datetime
 import json
 
@@ -17,6 +18,10 @@ class Post(db.Model):
     Supports threaded comments through parent-child relationships.
     """
     __tablename__ = 'posts'
+    # Keyset pagination order of the top-level feeds, see _feed
+    __table_args__ = (
+        db.Index('ix_posts_parent_timestamp_id', '_parent_id', '_timestamp', 'id'),
+    )
 
     # Primary Key
     id = db.Column(db.Integer, primary_key=True)
@@ -144,22 +149,33 @@ class Post(db.Model):
         return Post.query.get(post_id)
 
     @staticmethod
-    def get_all():
+    def version():
+        """
+        (count, highest id, latest edit) of posts and replies together, for ETags.
+        Any new post, reply, edit or delete changes it.
+        """
+        return tuple(db.session.query(func.count(Post.id), func.max(Post.id), func.max(Post._updated_at)).one())
+
+    @staticmethod
+    def _feed(query, limit=None, cursor=None):
+        """Most recent first, keyset on (_timestamp, id): a Page of read() dicts, all posts when limit is None"""
+        page = keyset_page(query, (Post._timestamp, Post.id), limit, cursor)
+        return Page([post.read() for post in page], page.next_cursor)
+
+    @staticmethod
+    def get_all(limit=None, cursor=None):
         """Get all top-level posts (not replies)"""
-        posts = Post.query.filter_by(_parent_id=None).order_by(Post._timestamp.desc()).all()
-        return [post.read() for post in posts]
+        return Post._feed(Post.query.filter_by(_parent_id=None), limit, cursor)
 
     @staticmethod
-    def get_by_page(page_url):
+    def get_by_page(page_url, limit=None, cursor=None):
         """Get all posts for a specific page"""
-        posts = Post.query.filter_by(_page_url=page_url, _parent_id=None).order_by(Post._timestamp.desc()).all()
-        return [post.read() for post in posts]
+        return Post._feed(Post.query.filter_by(_page_url=page_url, _parent_id=None), limit, cursor)
 
     @staticmethod
-    def get_by_user(user_id):
+    def get_by_user(user_id, limit=None, cursor=None):
         """Get all posts by a specific user"""
-        posts = Post.query.filter_by(_user_id=user_id, _parent_id=None).order_by(Post._timestamp.desc()).all()
-        return [post.read() for post in posts]
+        return Post._feed(Post.query.filter_by(_user_id=user_id, _parent_id=None), limit, cursor)
 
 
 def init_posts():
@@ -0,0 +1,193 @@
+""" Per-worker cache of authenticated principals used by api/authorize.py """
+from collections import OrderedDict
+from copy import deepcopy
+from sqlalchemy import inspect
+from sqlalchemy.orm import make_transient_to_detached
+from sqlalchemy.orm.attributes import set_committed_value
+import threading
+import time
+
+from __init__ import app, db
+from model.engine import after_commit
+
+
+class PrincipalCache:
+    """
+    PrincipalCache
+
+    A bounded, thread-safe LRU cache with a time-to-live, keyed by user uid.
+
+    Values are plain dictionaries of column values (a snapshot of the users row), never ORM objects,
+    so nothing bound to one request's session leaks into another request.  Each gunicorn worker keeps
+    its own cache; staleness across workers is bounded by the TTL, and this worker's own writes
+    invalidate immediately through User.update, User.delete and User.set_uid.
+    """
+
+    def __init__(self, ttl=30, max_size=1024):
+        self.ttl = ttl
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, uid):
+        """Return the cached snapshot for uid, or None if missing or expired."""
+        if self.ttl <= 0 or uid is None:
+            return None
+        with self._lock:
+            entry = self._entries.get(uid)
+            if entry is None:
+                self.misses += 1
+                return None
+            expires, snapshot = entry
+            if expires < time.monotonic():
+                del self._entries[uid]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(uid)
+            self.hits += 1
+            return snapshot
+
+    def set(self, uid, snapshot):
+        """Store a snapshot for uid, evicting the least recently used entry when full."""
+        if self.ttl <= 0 or uid is None:
+            return
+        with self._lock:
+            self._entries[uid] = (time.monotonic() + self.ttl, snapshot)
+            self._entries.move_to_end(uid)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, *uids):
+        """Drop the given uids from the cache, once the write is committed (see after_commit)."""
+        after_commit(lambda: self._drop(uids))
+
+    def _drop(self, uids):
+        with self._lock:
+            for uid in uids:
+                self._entries.pop(uid, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'size': len(self._entries),
+                'max_size': self.max_size,
+                'ttl': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+            }
+
+
+# One cache per worker process, sized from AUTH_CACHE_TTL / AUTH_CACHE_SIZE in __init__.py
+principal_cache = PrincipalCache(ttl=app.config['AUTH_CACHE_TTL'], max_size=app.config['AUTH_CACHE_SIZE'])
+
+
+def snapshot_user(user):
+    """Capture the column values of a loaded User as a plain dictionary."""
+    mapper = inspect(user).mapper
+    return deepcopy({attr.key: getattr(user, attr.key) for attr in mapper.column_attrs})
+
+
+def restore_user(model, snapshot):
+    """
+    Rebuild a persistent User from a snapshot without querying the database.
+
+    The instance is attached to the current session as if it had just been loaded, so endpoints can
+    read, update and commit it as usual.  Relationships (sections, personas) are not part of the
+    snapshot and load lazily on first access, as do any columns missing from a slim snapshot.
+    """
+    identity = db.session.identity_map.get(db.session.identity_key(model, snapshot['id']))
+    if identity is not None:
+        return identity
+    user = model.__mapper__.class_manager.new_instance()
+    # JSON columns are mutable, copy so in-place edits never reach the cached snapshot
+    for key, value in deepcopy(snapshot).items():
+        set_committed_value(user, key, value)
+    make_transient_to_detached(user)
+    db.session.add(user)
+    return user
+
+
+class Principal:
+    """
+    Principal
+
+    The lightweight identity handed to endpoints that use auth_required(slim=True).
+
+    Most guarded endpoints only need who is calling (id, uid, role, name), so the slim path loads
+    just those columns.  Anything else, e.g. principal.read() or principal.sections, loads the full
+    User once on first access and delegates to it, so existing endpoint code keeps working.
+
+    Attributes:
+        id (int): The user's primary key.
+        uid (str): The user's unique identifier (GitHub username).
+        role (str): The user's role, "Admin", "Teacher" or "User".
+        name (str): The user's display name.
+    """
+    # _password is only kept to derive the token version, it is never exposed as an attribute
+    COLUMNS = ('id', '_uid', '_role', '_name', '_password')
+
+    def __init__(self, id, uid, role, name, password_hash=None):
+        self.id = id
+        self.uid = uid
+        self.role = role
+        self.name = name
+        self._password_hash = password_hash
+        self._user = None
+
+    @classmethod
+    def from_snapshot(cls, snapshot):
+        return cls(snapshot['id'], snapshot['_uid'], snapshot['_role'], snapshot['_name'], snapshot.get('_password'))
+
+    # Underscore aliases match the User column names used throughout the api package
+    @property
+    def _uid(self):
+        return self.uid
+
+    @property
+    def _role(self):
+        return self.role
+
+    @property
+    def _name(self):
+        return self.name
+
+    @property
+    def is_authenticated(self):
+        return True
+
+    def is_admin(self):
+        return self.role == "Admin"
+
+    def is_teacher(self):
+        return self.role == "Teacher"
+
+    @property
+    def token_version(self):
+        """Same value as User.token_version, without loading the User when the hash is known."""
+        if self._password_hash is None:
+            return self.user.token_version
+        from model.user import User
+        return User.compute_token_version(self._password_hash, self.role)
+
+    @property
+    def user(self):
+        """The full User, loaded from the database on first access."""
+        if self._user is None:
+            from model.user import User
+            self._user = db.session.get(User, self.id)
+        return self._user
+
+    def __getattr__(self, name):
+        # Only called for attributes not defined above, i.e. anything that needs the full User
+        if name.startswith('__'):
+            raise AttributeError(name)
+        return getattr(self.user, name)
+
+    def __repr__(self):
+        return f"Principal(id={self.id}, uid={self.uid}, role={self.role})"
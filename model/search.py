@@ -0,0 +1,208 @@
+""" Full-text search over microblogs, their replies, posts and topics: SQLite FTS5 or MySQL FULLTEXT """
+import re
+
+from sqlalchemy import Integer, event, text
+
+from __init__ import db
+
+# Searchable kinds: table and its indexed columns, ranked by weight (SQLite bm25 column weights)
+SOURCES = {
+    'microblog': ('microblogs', ('_content',), (1.0,)),
+    'reply': ('microblog_replies', ('_content',), (1.0,)),
+    'post': ('posts', ('_content',), (1.0,)),
+    'topic': ('topics', ('_page_title', '_page_description'), (2.0, 1.0)),
+}
+# Extra condition on a kind's base table, inactive topics are not listed anywhere else either
+SOURCE_FILTERS = {'topic': 'topics._is_active = 1'}
+# Words of a query, a trailing * makes the word a prefix
+TERM = re.compile(r'(\w+)(\*?)', re.UNICODE)
+MAX_TERMS = 8
+# Up to this many matches are looked up by id, more are found walking a time ordered index (search_content)
+ID_LIST_MAX = 1000
+
+
+def parse_terms(query, prefix_all=False):
+    """[(word, prefix), ...] of a user query, punctuation and FTS operators are dropped"""
+    return [(word.lower(), prefix_all or bool(star)) for word, star in TERM.findall(query or '')][:MAX_TERMS]
+
+
+def match_expression(terms, dialect):
+    """Every term required: FTS5 '"word" "pre"*', MySQL boolean mode '+word +pre*'"""
+    if dialect == 'mysql':
+        return ' '.join(f"+{word}{'*' if prefix else ''}" for word, prefix in terms)
+    return ' '.join(f'"{word}"{"*" if prefix else ""}' for word, prefix in terms)
+
+
+def _fts(table):
+    return f'{table}_fts'
+
+
+def _matches(kind, dialect, ranked=True):
+    """SQL of the (kind, id, score) rows matching :match for one kind, lower scores rank first, (id) rows unranked"""
+    table, columns, weights = SOURCES[kind]
+    condition = SOURCE_FILTERS.get(kind)
+    if dialect == 'mysql':
+        against = f"MATCH({', '.join(columns)}) AGAINST (:match IN BOOLEAN MODE)"
+        where = f"{against} AND {condition}" if condition else against
+        select = f"'{kind}' AS kind, {table}.id AS id, -{against} AS score" if ranked else f"{table}.id AS id"
+        return f"SELECT {select} FROM {table} WHERE {where}"
+    fts = _fts(table)
+    join = f" JOIN {table} ON {table}.id = {fts}.rowid" if condition else ''
+    where = f"{fts} MATCH :match" + (f" AND {condition}" if condition else '')
+    select = (f"'{kind}' AS kind, {fts}.rowid AS id, bm25({fts}, {', '.join(map(str, weights))}) AS score"
+              if ranked else f"{fts}.rowid AS id")
+    return f"SELECT {select} FROM {fts}{join} WHERE {where}"
+
+
+def matching_ids(kind, query, prefix_all=True):
+    """
+    Selectable of the ids of kind matching query, for Model.id.in_(...) filters that keep their
+    own order (MicroBlog.search_content), None when the query has no words.
+    """
+    terms = parse_terms(query, prefix_all)
+    if not terms:
+        return None
+    dialect = db.engine.dialect.name
+    return text(_matches(kind, dialect, ranked=False)).bindparams(match=match_expression(terms, dialect)).columns(id=Integer)
+
+
+def search(query, kinds=None, limit=20, page=1):
+    """
+    Ranked full-text search, best matches first.
+
+    Args:
+        query: words to find, all required, "word*" matches words starting with word
+        kinds: subset of SOURCES, all kinds by default
+        limit, page: page size and 1-based page number
+
+    Returns:
+        (hits, more): hit dicts {kind, id, score, item} with the item serialized like its API does,
+        and whether another page follows.  One ranked query, then one to three per kind found.
+    """
+    terms = parse_terms(query)
+    kinds = [kind for kind in (kinds or SOURCES) if kind in SOURCES]
+    if not terms or not kinds:
+        return [], False
+    dialect = db.engine.dialect.name
+    sql = (' UNION ALL '.join(_matches(kind, dialect) for kind in kinds) +
+           ' ORDER BY score, kind, id LIMIT :limit OFFSET :offset')
+    rows = db.session.execute(text(sql), {'match': match_expression(terms, dialect), 'limit': limit + 1,
+                                          'offset': (page - 1) * limit}).all()
+    more = len(rows) > limit
+    rows = rows[:limit]
+    items = _items(rows)
+    hits = [{'kind': kind, 'id': id, 'score': round(-score, 4), 'item': items[kind].get(id)}
+            for kind, id, score in rows]
+    # A row deleted between the ranked query and the item queries has no item
+    return [hit for hit in hits if hit['item'] is not None], more
+
+
+def _items(rows):
+    """{kind: {id: item dict}} of the ranked rows, in one batch per kind"""
+    from model.microblog import MicroBlog, MicroBlogReply, Topic
+    from model.post import Post
+    from model.user import User
+    ids = {kind: [id for row_kind, id, _ in rows if row_kind == kind] for kind in SOURCES}
+    items = {kind: {} for kind in SOURCES}
+    if ids['microblog']:
+        items['microblog'] = {item['id']: item for item in
+                              MicroBlog._feed(MicroBlog.query.filter(MicroBlog.id.in_(ids['microblog'])), None)}
+    if ids['reply']:
+        items['reply'] = {item['id']: item for item in
+                          MicroBlogReply.read_all(MicroBlogReply.query.filter(MicroBlogReply.id.in_(ids['reply'])).all())}
+    if ids['post']:
+        # Columns with the author's name joined in, loading User objects would load their sections and personas
+        rows = (db.session.query(Post.id, Post._user_id, User._name, Post._content, Post._timestamp, Post._parent_id,
+                                 Post._page_url, Post._page_title)
+                .outerjoin(User, User.id == Post._user_id).filter(Post.id.in_(ids['post'])))
+        for id, user_id, name, content, timestamp, parent_id, page_url, page_title in rows:
+            items['post'][id] = {'id': id, 'userId': user_id, 'studentName': name or 'Unknown', 'content': content,
+                                 'timestamp': timestamp.isoformat() if timestamp else None,
+                                 'parentId': parent_id, 'pageUrl': page_url, 'pageTitle': page_title}
+    if ids['topic']:
+        for topic in Topic.query.filter(Topic.id.in_(ids['topic'])):
+            items['topic'][topic.id] = {'id': topic.id, 'pageKey': topic._page_key, 'pagePath': topic._page_path,
+                                        'pageTitle': topic._page_title, 'pageDescription': topic._page_description,
+                                        'displayName': topic._display_name}
+    return items
+
+
+def _sqlite_ddl(table, columns):
+    """FTS5 external content table over table.columns and the triggers that keep it in step"""
+    fts = _fts(table)
+    names = ', '.join(columns)
+    new = ', '.join(f'new.{column}' for column in columns)
+    old = ', '.join(f'old.{column}' for column in columns)
+    return [
+        f"CREATE VIRTUAL TABLE {fts} USING fts5({names}, content='{table}', content_rowid='id', "
+        f"tokenize='unicode61 remove_diacritics 2', prefix='2 3')",
+        f"CREATE TRIGGER IF NOT EXISTS {fts}_insert AFTER INSERT ON {table} BEGIN "
+        f"INSERT INTO {fts}(rowid, {names}) VALUES (new.id, {new}); END",
+        f"CREATE TRIGGER IF NOT EXISTS {fts}_delete AFTER DELETE ON {table} BEGIN "
+        f"INSERT INTO {fts}({fts}, rowid, {names}) VALUES ('delete', old.id, {old}); END",
+        f"CREATE TRIGGER IF NOT EXISTS {fts}_update AFTER UPDATE OF {names} ON {table} BEGIN "
+        f"INSERT INTO {fts}({fts}, rowid, {names}) VALUES ('delete', old.id, {old}); "
+        f"INSERT INTO {fts}(rowid, {names}) VALUES (new.id, {new}); END",
+    ]
+
+
+def ensure_search_index(connection):
+    """
+    Create what is missing of the search index, returns the kinds whose index was created.
+
+    SQLite: an FTS5 table per kind with insert/update/delete triggers on the base table, filled
+    from the existing rows when it is created.  MySQL: a FULLTEXT index per table, maintained by
+    InnoDB.  Either way the database keeps the index in step with every write, bulk inserts and
+    query.delete() included.
+    """
+    dialect = connection.dialect.name
+    created = []
+    for kind, (table, columns, _) in SOURCES.items():
+        if dialect == 'sqlite':
+            exists = connection.exec_driver_sql(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (_fts(table),)).first()
+            if not exists:
+                for statement in _sqlite_ddl(table, columns):
+                    connection.exec_driver_sql(statement)
+                connection.exec_driver_sql(f"INSERT INTO {_fts(table)}({_fts(table)}) VALUES ('rebuild')")
+                created.append(kind)
+        elif dialect == 'mysql':
+            exists = connection.execute(text(
+                "SELECT 1 FROM information_schema.statistics WHERE table_schema = DATABASE() "
+                "AND table_name = :table AND index_name = :index"), {'table': table, 'index': f'ft_{table}'}).first()
+            if not exists:
+                connection.exec_driver_sql(f"ALTER TABLE {table} ADD FULLTEXT INDEX ft_{table} ({', '.join(columns)})")
+                created.append(kind)
+    return created
+
+
+def rebuild_search_index():
+    """
+    Rebuild the search index from the tables, `flask custom search_rebuild`: creates whatever is
+    missing, then SQLite rebuilds and optimizes every FTS5 table, MySQL re-creates the FULLTEXT indexes.
+
+    Returns:
+        dict: indexed rows per kind
+    """
+    from __init__ import app
+    with app.app_context():
+        db.create_all()
+        with db.engine.begin() as connection:
+            ensure_search_index(connection)
+            dialect = connection.dialect.name
+            counts = {}
+            for kind, (table, columns, _) in SOURCES.items():
+                if dialect == 'sqlite':
+                    connection.exec_driver_sql(f"INSERT INTO {_fts(table)}({_fts(table)}) VALUES ('rebuild')")
+                    connection.exec_driver_sql(f"INSERT INTO {_fts(table)}({_fts(table)}) VALUES ('optimize')")
+                elif dialect == 'mysql':
+                    connection.exec_driver_sql(f"ALTER TABLE {table} DROP INDEX ft_{table}, "
+                                               f"ADD FULLTEXT INDEX ft_{table} ({', '.join(columns)})")
+                counts[kind] = connection.exec_driver_sql(f"SELECT count(*) FROM {table}").scalar()
+    return counts
+
+
+# Every create_all also creates the search index, and fills it on a database that predates it
+@event.listens_for(db.metadata, 'after_create')
+def _create_search_index(target, connection, **kw):
+    ensure_search_index(connection)
@@ -0,0 +1,215 @@
+""" Scalable synthetic data for benchmarks, `flask custom synthetic` """
+from datetime import datetime, timedelta
+from werkzeug.security import generate_password_hash
+import random
+import re
+
+from __init__ import app, db
+from model.user import User, Section, UserSection
+from model.microblog import MicroBlog, MicroBlogReaction, MicroBlogReactionCount, MicroBlogReply, Topic
+from model.post import Post
+from model.study import Study
+from model.leaderboard import ScoreCounterEvent, ElementaryLeaderboardEvent
+from model.skill_snapshot import SkillSnapshot
+from model.classroom import Classroom, classroom_student
+
+# Every synthetic account shares this password, so benchmarks can log in as any of them
+SYNTHETIC_PASSWORD = 'Synthetic#2025'
+SYNTHETIC_UID_PREFIX = 'synth'
+
+SECTIONS = [('Computer Science Principles', 'CSP'), ('Computer Science A', 'CSA'),
+            ('Computer Science and Software Engineering', 'CSSE'), ('Data Structures', 'DS'),
+            ('Robotics', 'ROBO'), ('Cybersecurity', 'CYBER')]
+SCHOOLS = ['Del Norte High School', 'Westview High School', 'Poway High School', 'Rancho Bernardo High School']
+REACTIONS = ['like', 'heart', 'laugh', 'wow']
+STUDY_TOPICS = {'Python': ['Lists', 'Loops', 'Classes'], 'JavaScript': ['DOM', 'Fetch', 'Events'],
+                'SQL': ['Joins', 'Indexes', 'Transactions'], 'Java': ['Inheritance', 'Recursion', 'ArrayList']}
+WORDS = ('flask api model query index cache session token route blueprint student lesson sprint '
+         'commit review deploy debug test python javascript sql join loop class object frontend backend').split()
+
+
+def sentence(rng, words=12, limit=280):
+    return ' '.join(rng.choice(WORDS) for _ in range(words)).capitalize()[:limit]
+
+
+def insert_rows(model, rows, chunk_size=5000):
+    """Bulk insert plain dictionaries with executemany, bypassing the ORM unit of work."""
+    for start in range(0, len(rows), chunk_size):
+        db.session.execute(model.__table__.insert(), rows[start:start + chunk_size])
+    db.session.commit()
+
+
+def generate_synthetic(users=10000, seed=2025, microblogs_per_user=2, posts_per_user=1, verbose=True):
+    """
+    Populate the database with a realistic, reproducible volume of rows.
+
+    Volumes scale with the number of users: one topic per 100 users, one classroom per 30, microblogs
+    with replies and reactions, posts with threaded replies, study records, leaderboard events and
+    skill snapshots.
+    Rows are inserted with executemany in chunks, so 100k users take minutes rather than hours.
+    Synthetic accounts use the uid prefix "synth" and log in with SYNTHETIC_PASSWORD.  Running it
+    again adds another batch rather than replacing the first one.
+
+    Args:
+        users (int): Number of student accounts to create.
+        seed (int): Random seed, the same seed always produces the same data.
+        microblogs_per_user (int): Average microblogs per user.
+        posts_per_user (int): Average top level posts per user.
+        verbose (bool): Print progress.
+
+    Returns:
+        dict: Row counts per table.
+    """
+    rng = random.Random(seed)
+    counts = {}
+    log = print if verbose else (lambda *args: None)
+    now = datetime.utcnow()
+
+    def ago(days=120):
+        return now - timedelta(seconds=rng.randint(0, days * 86400))
+
+    with app.app_context():
+        db.create_all()
+
+        # Sections, reused if they already exist
+        existing = {section._abbreviation for section in Section.query.all()}
+        insert_rows(Section, [{'_name': name, '_abbreviation': abbr} for name, abbr in SECTIONS if abbr not in existing])
+        section_ids = [section_id for (section_id,) in db.session.query(Section.id).all()]
+
+        # Users, one pbkdf2 hash for everybody, hashing 100k passwords would take a day
+        pwhash = generate_password_hash(SYNTHETIC_PASSWORD, f"pbkdf2:sha256:{app.config['PASSWORD_HASH_ITERATIONS']}", salt_length=10)
+        start = db.session.query(db.func.count(User.id)).filter(User._uid.like(f'{SYNTHETIC_UID_PREFIX}%')).scalar()
+        rows = []
+        for i in range(start, start + users):
+            classes = rng.sample([abbr for _, abbr in SECTIONS], rng.randint(1, 2))
+            rows.append({
+                '_name': f'Synthetic Student {i}', '_uid': f'{SYNTHETIC_UID_PREFIX}{i}', '_email': '?',
+                '_sid': str(100000 + i), '_password': pwhash,
+                '_role': 'Teacher' if i % 200 == 0 else 'User', '_pfp': '', 'kasm_server_needed': False,
+                '_grade_data': {}, '_ap_exam': {}, '_class': classes, '_school': rng.choice(SCHOOLS),
+                '_game_profile': None,
+            })
+        insert_rows(User, rows)
+        # The new accounts are the highest synthetic ids
+        user_ids = [user_id for (user_id,) in db.session.query(User.id)
+                    .filter(User._uid.like(f'{SYNTHETIC_UID_PREFIX}%')).order_by(User.id).all()][-users:]
+        counts['users'] = len(user_ids)
+        log(f"users: {len(user_ids)}")
+
+        insert_rows(UserSection, [{'user_id': user_id, 'section_id': section_id, 'year': now.year}
+                                  for user_id in user_ids
+                                  for section_id in rng.sample(section_ids, min(len(section_ids), rng.randint(1, 2)))])
+
+        # Topics, one per 100 users, named like the lesson pages they hang off
+        base = db.session.query(db.func.count(Topic.id)).scalar()
+        topic_rows = []
+        for i in range(base, base + max(1, users // 100)):
+            path = f'/synthetic/{rng.choice(["lessons", "hacks", "projects"])}/{rng.choice(WORDS)}-{i}'
+            key = re.sub(r'_+', '_', re.sub(r'[^a-zA-Z0-9\-_]', '_', path.strip('/')))[:100].strip('_')
+            topic_rows.append({
+                '_page_key': key, '_page_path': path, '_page_title': f'Synthetic Lesson {i}',
+                '_page_description': sentence(rng, 20), '_display_name': f'Synthetic Lesson {i}',
+                '_color': '#007bff', '_icon': None, '_allow_anonymous': False, '_moderated': False,
+                '_max_posts_per_user': 10, '_created_at': ago(), '_updated_at': now, '_is_active': True,
+                '_settings': {},
+            })
+        insert_rows(Topic, topic_rows)
+        topic_ids = [topic_id for (topic_id,) in db.session.query(Topic.id).filter(
+            Topic._page_key.in_([row['_page_key'] for row in topic_rows])).all()]
+        counts['topics'] = len(topic_ids)
+        log(f"topics: {len(topic_ids)}")
+
+        # Microblogs, then their reply rows, reaction rows and counters
+        first_id = (db.session.query(db.func.max(MicroBlog.id)).scalar() or 0) + 1
+        rows, replies, reactions = [], [], []
+        for _ in range(users * microblogs_per_user):
+            created = ago()
+            replies.append([{'_user_id': rng.choice(user_ids), '_content': sentence(rng, 8),
+                             '_timestamp': created + timedelta(minutes=r + 1)}
+                            for r in range(rng.choice((0, 0, 1, 2, 3, 5)))])
+            reactions.append({kind: rng.sample(user_ids, min(len(user_ids), rng.randint(1, 5)))
+                              for kind in rng.sample(REACTIONS, rng.randint(0, 2))})
+            rows.append({
+                '_user_id': rng.choice(user_ids), '_topic_id': rng.choice(topic_ids),
+                '_content': sentence(rng), '_data': {}, '_reply_count': len(replies[-1]),
+                '_timestamp': created, '_updated_at': created,
+            })
+        insert_rows(MicroBlog, rows)
+        # The new microblogs are the highest ids, in insertion order
+        microblog_ids = [microblog_id for (microblog_id,) in db.session.query(MicroBlog.id)
+                         .filter(MicroBlog.id >= first_id).order_by(MicroBlog.id).all()]
+        insert_rows(MicroBlogReply, [{'_microblog_id': microblog_id, **reply}
+                                     for microblog_id, thread in zip(microblog_ids, replies) for reply in thread])
+        insert_rows(MicroBlogReaction, [{'_microblog_id': microblog_id, '_user_id': user_id, '_reaction_type': kind,
+                                         '_timestamp': now}
+                                        for microblog_id, kinds in zip(microblog_ids, reactions)
+                                        for kind, reactor_ids in kinds.items() for user_id in reactor_ids])
+        insert_rows(MicroBlogReactionCount, [{'_microblog_id': microblog_id, '_reaction_type': kind, '_count': len(reactor_ids)}
+                                             for microblog_id, kinds in zip(microblog_ids, reactions)
+                                             for kind, reactor_ids in kinds.items()])
+        counts['microblogs'] = len(rows)
+        counts['microblog_replies'] = sum(len(thread) for thread in replies)
+        counts['reactions'] = sum(len(reactor_ids) for kinds in reactions for reactor_ids in kinds.values())
+        log(f"microblogs: {len(rows)}, replies: {counts['microblog_replies']}, reactions: {counts['reactions']}")
+
+        # Posts, top level first, then replies pointing at them
+        page_urls = [f'/synthetic/page/{i}' for i in range(max(1, users // 50))]
+        rows = []
+        for _ in range(users * posts_per_user):
+            created = ago()
+            url = rng.choice(page_urls)
+            rows.append({'_user_id': rng.choice(user_ids), '_parent_id': None, '_content': sentence(rng, 25, 1000),
+                         '_grade_received': rng.choice((None, 'A', 'B', 'C')), '_page_url': url,
+                         '_page_title': url.rsplit('/', 1)[-1], '_timestamp': created, '_updated_at': created})
+        insert_rows(Post, rows)
+        post_ids = [post_id for (post_id,) in db.session.query(Post.id).filter(
+            Post._parent_id.is_(None), Post._page_url.like('/synthetic/%')).all()]
+        replies = []
+        for post_id in rng.sample(post_ids, len(post_ids) // 2):
+            for _ in range(rng.randint(1, 3)):
+                created = ago()
+                replies.append({'_user_id': rng.choice(user_ids), '_parent_id': post_id, '_content': sentence(rng),
+                                '_grade_received': None, '_page_url': None, '_page_title': None,
+                                '_timestamp': created, '_updated_at': created})
+        insert_rows(Post, replies)
+        counts['posts'] = len(rows) + len(replies)
+        log(f"posts: {counts['posts']}")
+
+        rows = [{'user_id': user_id, 'topic': topic, 'subtopic': rng.choice(STUDY_TOPICS[topic]),
+                 'studied': rng.random() < 0.6, 'timestamp': ago().isoformat()}
+                for user_id in user_ids for topic in rng.sample(list(STUDY_TOPICS), 2)]
+        insert_rows(Study, rows)
+        counts['study'] = len(rows)
+
+        games = ['snake', 'pong', 'tetris', 'quiz']
+        rows = [{'_user_id': rng.choice(user_ids), '_timestamp': ago(30),
+                 '_payload': {'gameName': rng.choice(games), 'score': rng.randint(0, 5000)}} for _ in range(users)]
+        insert_rows(ScoreCounterEvent, rows)
+        rows = [{'_user_id': rng.choice(user_ids), '_timestamp': ago(30),
+                 '_payload': {'user': f'{SYNTHETIC_UID_PREFIX}{rng.randint(0, users - 1)}', 'gameName': rng.choice(games),
+                              'score': rng.randint(0, 5000)}} for _ in range(users)]
+        insert_rows(ElementaryLeaderboardEvent, rows)
+        counts['leaderboard_events'] = 2 * users
+
+        rows = [{'user_id': user_id, 'project_name': f'Sprint {sprint}', 'snapshot_date': ago(),
+                 'coding_ability': rng.randint(1, 5), 'collaboration': rng.randint(1, 5),
+                 'problem_solving': rng.randint(1, 5), 'initiative': rng.randint(1, 5)}
+                for user_id in user_ids for sprint in range(1, rng.randint(2, 4))]
+        insert_rows(SkillSnapshot, rows)
+        counts['skill_snapshots'] = len(rows)
+        log(f"study: {counts['study']}, leaderboard events: {counts['leaderboard_events']}, skill snapshots: {counts['skill_snapshots']}")
+
+        # Classrooms owned by the synthetic teachers, every student enrolled in one
+        teacher_ids = [user_id for (user_id,) in db.session.query(User.id).filter(
+            User.id.in_(user_ids), User._role == 'Teacher').all()] or user_ids[:1]
+        base = db.session.query(db.func.count(Classroom.id)).scalar()
+        insert_rows(Classroom, [{'_name': f'Synthetic Period {i}', '_school_name': rng.choice(SCHOOLS),
+                                 '_owner_teacher_id': rng.choice(teacher_ids), '_status': 'active', '_created_at': ago()}
+                                for i in range(base, base + max(1, users // 30))])
+        classroom_ids = [classroom_id for (classroom_id,) in db.session.query(Classroom.id).order_by(Classroom.id).all()][base:]
+        db.session.execute(classroom_student.insert(), [{'classroom_id': rng.choice(classroom_ids), 'student_id': user_id}
+                                                        for user_id in user_ids])
+        db.session.commit()
+        counts['classrooms'] = len(classroom_ids)
+
+    return counts
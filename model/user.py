@@ -3,13 +3,17 @@ from flask import current_app
 from flask_login import UserMixin
 from datetime import date
 from sqlalchemy.exc import IntegrityError
-from werkzeug.security import generate_password_hash, check_password_hash
+import hashlib
 import os
 import json
 
 from __init__ import app, db
 from model.github import GitHubUser
 from model.kasm import KasmUser
+from model.principal import principal_cache, snapshot_user
+from model.cache import response_cache
+from model.password import password_hasher
+from model.engine import after_commit
 
 """ Helper Functions """
 
@@ -96,6 +100,7 @@ class Section(db.Model):
         try:
             db.session.add(self)
             db.session.commit()
+            response_cache.invalidate('sections')
             return self
         except IntegrityError:
             db.session.rollback()
@@ -114,6 +119,7 @@ class Section(db.Model):
     def delete(self):
         db.session.delete(self)
         db.session.commit()
+        response_cache.invalidate('sections')
         return None
 
 
@@ -273,15 +279,38 @@ class User(db.Model, UserMixin):
             # Already hashed, set directly
             self._password = password
         else:
-            # Not hashed, hash it
-            self._password = generate_password_hash(password, "pbkdf2:sha256", salt_length=10)            
+            # Not hashed, hash it on the bounded pbkdf2 pool (PASSWORD_HASH_ITERATIONS)
+            self._password = password_hasher.hash(password)
 
     # check password parameter versus stored/encrypted password
     def is_password(self, password):
-        """Check against hashed password."""
-        result = check_password_hash(self._password, password)
+        """
+        Check against hashed password.
+
+        Runs on the bounded pbkdf2 pool and raises PasswordQueueFull when it is saturated.  A correct
+        password stored with other hash parameters than PASSWORD_HASH_ITERATIONS is rehashed and saved.
+        """
+        result = password_hasher.verify(self._password, password)
+        if result and password_hasher.needs_rehash(self._password):
+            self.rehash_password(password)
         return result
 
+    def rehash_password(self, password):
+        """
+        Store the password again with the configured hash parameters, keeping the login if it fails.
+
+        The new hash changes token_version, so the user's other sessions are revoked at their next
+        renewal; this login gets a token with the new version.
+        """
+        try:
+            self.set_password(password)
+            db.session.commit()
+            password_hasher.record_rehash()
+            # The token version follows the hash, refresh this worker's cached copy
+            after_commit(lambda uid=self._uid, snapshot=snapshot_user(self): principal_cache.set(uid, snapshot))
+        except Exception:
+            db.session.rollback()
+
     # output content using str(object) in human readable form, uses getter
     # output content using json dumps, this is ready for API response
     def __str__(self):
@@ -295,6 +324,16 @@ class User(db.Model, UserMixin):
     def role(self, role):
         self._role = role
 
+    @staticmethod
+    def compute_token_version(password, role):
+        """Digest of the stored password hash and role, changes whenever either one changes."""
+        return hashlib.sha256(f"{password}:{role}".encode()).hexdigest()[:16]
+
+    @property
+    def token_version(self):
+        """Version claim carried by JWTs; tokens with an older version are revoked."""
+        return User.compute_token_version(self._password, self._role)
+
     def is_admin(self):
         return self._role == "Admin"
 
@@ -358,6 +397,7 @@ class User(db.Model, UserMixin):
         flag_modified(self, '_game_profile')
         try:
             db.session.commit()
+            principal_cache.invalidate(self._uid)
             return self._game_profile
         except Exception:
             db.session.rollback()
@@ -397,6 +437,7 @@ class User(db.Model, UserMixin):
         flag_modified(self, '_game_profile')
         try:
             db.session.commit()
+            principal_cache.invalidate(self._uid)
             return self._game_profile
         except Exception:
             db.session.rollback()
@@ -430,6 +471,7 @@ class User(db.Model, UserMixin):
         flag_modified(self, '_game_profile')
         try:
             db.session.commit()
+            principal_cache.invalidate(self._uid)
             return self._game_profile
         except Exception:
             db.session.rollback()
@@ -440,9 +482,12 @@ class User(db.Model, UserMixin):
     def create(self, inputs=None):
         try:
             db.session.add(self)  # add prepares to persist person object to Users table
-            db.session.commit()  # SqlAlchemy "unit of work pattern" requires a manual commit
             if inputs:
-                self.update(inputs)
+                db.session.flush()  # assigns the id, update() commits the insert with the inputs
+                # The constructor hashed the password, hashing inputs['password'] again would take a
+                # second pbkdf2 slot per signup; Kasm still gets the plain text
+                return self.update(inputs, hash_password=False)
+            db.session.commit()  # SqlAlchemy "unit of work pattern" requires a manual commit
             return self
         except IntegrityError:
             db.session.rollback()
@@ -475,7 +520,7 @@ class User(db.Model, UserMixin):
         
     # CRUD update: updates user name, password, phone
     # returns self
-    def update(self, inputs):
+    def update(self, inputs, hash_password=True):
         if not isinstance(inputs, dict):
             return self
 
@@ -503,7 +548,7 @@ class User(db.Model, UserMixin):
             self.email = email
         if sid:
             self.sid = sid
-        if password:
+        if password and hash_password:
             self.set_password(password)
         if pfp is not None:
             self.pfp = pfp
@@ -557,6 +602,9 @@ class User(db.Model, UserMixin):
         except IntegrityError:
             db.session.rollback()
             return None
+        # Replace the cached principal so this worker rejects tokens revoked by a password or role change
+        principal_cache.invalidate(old_uid)
+        after_commit(lambda uid=self.uid, snapshot=snapshot_user(self): principal_cache.set(uid, snapshot))
         return self
     
     # CRUD delete: remove self
@@ -566,6 +614,7 @@ class User(db.Model, UserMixin):
             KasmUser().delete(self.uid)
             db.session.delete(self)
             db.session.commit()
+            principal_cache.invalidate(self._uid)
         except IntegrityError:
             db.session.rollback()
         return None   
@@ -587,6 +636,7 @@ class User(db.Model, UserMixin):
         """Deletes profile picture from user record."""
         self.pfp = None
         db.session.commit()
+        principal_cache.invalidate(self._uid)
         
     def add_section(self, section):
         # Query for the section using the provided abbreviation
@@ -629,25 +679,32 @@ class User(db.Model, UserMixin):
         
     def read_sections(self):
         """Reads the sections associated with the user."""
+        from sqlalchemy.orm import lazyload
         sections = []
-        # The user_sections_rel backref provides access to the many-to-many relationship data 
-        if self.user_sections_rel:
-            for user_section in self.user_sections_rel:
-                # This user_section backref "row" can be used to access section methods 
-                section_data = user_section.section.read()
-                # Extract the year from the relationship data  
-                section_data['year'] = user_section.year  
-                sections.append(section_data)
+        # A single join of user_sections to sections; the year lives on the many-to-many relationship data.
+        # lazyload keeps Section.users (lazy='subquery') from loading every member of each section.
+        rows = (db.session.query(UserSection.year, Section)
+                .join(Section, UserSection.section_id == Section.id)
+                .filter(UserSection.user_id == self.id)
+                .options(lazyload(Section.users))
+                .all())
+        for year, section in rows:
+            section_data = section.read()
+            section_data['year'] = year
+            sections.append(section_data)
         return {"sections": sections} 
     
     def read_personas(self):
         """Reads the personas associated with the user."""
-        personas = []
-        # Use the user_personas_rel backref to avoid N+1 queries
-        # This data is already loaded via lazy='subquery' on the relationship
-        if hasattr(self, 'user_personas_rel') and self.user_personas_rel:
-            for user_persona in self.user_personas_rel:
-                personas.append(user_persona.read())
+        from sqlalchemy.orm import joinedload, lazyload
+        from model.persona import Persona, UserPersona
+        # One query for the selections and their personas, so this costs the same whether or not
+        # the user was loaded with its relationships (e.g. restored from the principal cache)
+        user_personas = (UserPersona.query
+                         .filter_by(user_id=self.id)
+                         .options(joinedload(UserPersona.persona).lazyload(Persona.users))
+                         .all())
+        personas = [user_persona.read() for user_persona in user_personas]
         return {"personas": personas}
     
     def update_section(self, section_data):
@@ -717,8 +774,10 @@ class User(db.Model, UserMixin):
         # Update the UID if a new one is provided
         if new_uid and new_uid != self._uid:
             self._uid = new_uid
-            # Commit the UID change to the database
-            db.session.commit()
+            # Flush the UID change so a duplicate fails before the directory is renamed, update() commits it
+            db.session.flush()
+            # Tokens issued for the old UID must no longer resolve from the cache
+            principal_cache.invalidate(old_uid, new_uid)
 
         # If the UID has changed, update the directory name
         if old_uid != self._uid:
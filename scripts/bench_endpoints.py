@@ -0,0 +1,214 @@
+#!/usr/bin/env python3
+
+"""
+bench_endpoints.py
+HTTP load driver for the GET endpoints students and teachers hit most, also `flask custom bench`.
+
+- Drives the registered blueprints through the Flask test client against the configured database,
+  populate it first with `flask custom synthetic --users 10000`.
+- Every endpoint is warmed up, then hit --requests times from --concurrency threads.
+- Reports throughput, latency percentiles, SQL statements and errors per endpoint, --output writes
+  the JSON report to compare between commits.
+
+Usage: Run from the root of the project:
+> scripts/bench_endpoints.py --requests 200 --concurrency 4
+> scripts/bench_endpoints.py --endpoint "microblog feed" --output before.json
+"""
+import argparse
+import importlib
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+# Add the root directory to sys.path so app imports work
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from __init__ import app, db
+from model.user import User
+from model.microblog import Topic
+from model.post import Post
+from model.synthetic import SYNTHETIC_PASSWORD, SYNTHETIC_UID_PREFIX
+
+# Statements counted per thread, so concurrent requests do not mix their counts
+_counter = threading.local()
+
+
+def _count_statement(conn, cursor, statement, parameters, context, executemany):
+    if getattr(_counter, 'active', False):
+        _counter.queries += 1
+
+
+def bench_targets():
+    """
+    The GET endpoints students and teachers hit most, with ids picked from the current data.
+
+    Each target is (name, path, login) where login is None, 'user' or 'admin'.
+    """
+    with app.app_context():
+        topic = Topic.query.order_by(Topic.id.desc()).first()
+        post = Post.query.filter(Post._parent_id.is_(None)).order_by(Post.id.desc()).first()
+    targets = [
+        ('id', '/api/id', 'user'),
+        ('microblog feed', '/api/microblog?limit=50', 'user'),
+        ('microblog topics', '/api/microblog/topics', None),
+        ('post all', '/api/post/all', 'user'),
+        ('dynamic leaderboard', '/api/dynamic/leaderboard?limit=200', None),
+        ('elementary leaderboard', '/api/events/ELEMENTARY_LEADERBOARD?limit=200', None),
+        ('sections', '/api/section', None),
+        ('skill passport', '/api/user/skill-passport', 'user'),
+        ('user list', '/api/user', 'admin'),
+    ]
+    if topic is not None:
+        targets.append(('microblog page', f'/api/microblog/page/{topic._page_key}', 'user'))
+    if post is not None:
+        targets.append(('post detail', f'/api/post/{post.id}', 'user'))
+        targets.append(('post page', f'/api/post/page?url={post._page_url}', 'user'))
+        targets.append(('post user', f'/api/post/user/{post._user_id}', 'user'))
+    return targets
+
+
+def login(client, uid, password):
+    response = client.post('/api/authenticate', json={'uid': uid, 'password': password})
+    if response.status_code != 200:
+        raise RuntimeError(f"Benchmark login as {uid} failed: {response.status_code}")
+
+
+def percentile(ordered, pct):
+    if not ordered:
+        return None
+    return round(ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))], 2)
+
+
+def run_bench(requests=200, concurrency=1, warmup=5, only=None):
+    """
+    Drive the registered blueprints through the Flask test client and measure them.
+
+    Every endpoint is warmed up, then hit `requests` times from `concurrency` threads, each thread
+    with its own logged in client.  Latency percentiles are per request, throughput is requests over
+    wall time, and queries are the SQL statements issued per request.
+
+    Args:
+        requests (int): Measured requests per endpoint.
+        concurrency (int): Threads issuing requests at the same time.
+        warmup (int): Unmeasured requests per endpoint before timing starts.
+        only (list): Endpoint names to run, all when empty.
+
+    Returns:
+        dict: Run metadata and one result per endpoint, ready for json.dump.
+    """
+    with app.app_context():
+        student = User.query.filter(User._uid.like(f'{SYNTHETIC_UID_PREFIX}%'), User._role == 'User').first()
+    credentials = {
+        'user': (student._uid, SYNTHETIC_PASSWORD) if student else (app.config['USER_UID'], app.config['USER_PASSWORD']),
+        'admin': (app.config['ADMIN_UID'], app.config['ADMIN_PASSWORD']),
+    }
+
+    def client_for(role):
+        client = app.test_client()
+        if role:
+            login(client, *credentials[role])
+        return client
+
+    event.listen(Engine, 'before_cursor_execute', _count_statement)
+    results = []
+    try:
+        for name, path, role in bench_targets():
+            if only and name not in only:
+                continue
+            clients = [client_for(role) for _ in range(concurrency)]
+            for _ in range(warmup):
+                clients[0].get(path)
+
+            def worker(index):
+                client = clients[index]
+                samples = []
+                for _ in range(index, requests, concurrency):
+                    _counter.active, _counter.queries = True, 0
+                    started = time.perf_counter()
+                    response = client.get(path)
+                    elapsed = (time.perf_counter() - started) * 1000
+                    _counter.active = False
+                    samples.append((elapsed, response.status_code, _counter.queries, len(response.get_data())))
+                return samples
+
+            started = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=concurrency) as pool:
+                samples = [sample for chunk in pool.map(worker, range(concurrency)) for sample in chunk]
+            wall = time.perf_counter() - started
+
+            latencies = sorted(sample[0] for sample in samples)
+            results.append({
+                'endpoint': name,
+                'path': path,
+                'requests': len(samples),
+                'errors': sum(1 for sample in samples if sample[1] >= 400),
+                'status': sorted({sample[1] for sample in samples}),
+                'rps': round(len(samples) / wall, 1) if wall else None,
+                'p50_ms': percentile(latencies, 50),
+                'p95_ms': percentile(latencies, 95),
+                'p99_ms': percentile(latencies, 99),
+                'max_ms': round(latencies[-1], 2) if latencies else None,
+                'avg_queries': round(sum(sample[2] for sample in samples) / len(samples), 2) if samples else None,
+                'avg_bytes': round(sum(sample[3] for sample in samples) / len(samples)) if samples else None,
+            })
+    finally:
+        event.remove(Engine, 'before_cursor_execute', _count_statement)
+
+    with app.app_context():
+        dialect = db.engine.dialect.name
+        users = db.session.query(db.func.count(User.id)).scalar()
+    return {
+        'commit': git_commit(),
+        'time': datetime.utcnow().isoformat(),
+        'database': dialect,
+        'users': users,
+        'requests': requests,
+        'concurrency': concurrency,
+        'results': results,
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, timeout=5).stdout.strip() or None
+    except Exception:
+        return None
+
+
+def format_report(report):
+    lines = [f"commit {report['commit']}  {report['database']}  {report['users']} users  "
+             f"{report['requests']} requests x {report['concurrency']} threads",
+             f"{'endpoint':<24}{'rps':>8}{'p50':>9}{'p95':>9}{'p99':>9}{'queries':>9}{'errors':>8}"]
+    for row in report['results']:
+        lines.append(f"{row['endpoint']:<24}{row['rps']:>8}{row['p50_ms']:>9}{row['p95_ms']:>9}"
+                     f"{row['p99_ms']:>9}{row['avg_queries']:>9}{row['errors']:>8}")
+    return '\n'.join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--requests', type=int, default=200, help='measured requests per endpoint')
+    parser.add_argument('--concurrency', type=int, default=1, help='threads issuing requests at once')
+    parser.add_argument('--endpoint', dest='only', action='append', default=[], help='only run the named endpoint, repeatable')
+    parser.add_argument('--output', help='write the JSON report to this file')
+    args = parser.parse_args()
+
+    # Importing main registers the blueprints on the app
+    importlib.import_module('main')
+    report = run_bench(requests=args.requests, concurrency=args.concurrency, only=args.only)
+    print(format_report(report))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"Report written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+
+"""
+bench_feed.py
+Cost of serializing a microblog feed page, ORM objects vs column tuples (MicroBlog._feed).
+
+- Seeds a scratch SQLite database with the synthetic generator, 2 microblogs per user.
+- orm: loads the page as MicroBlog objects and calls read() on each, author, topic, reactions and replies are
+  lazy loaded per row (the previous feed serialization)
+- feed: MicroBlog.get_all, one query for the page with author and topic joined in, one each for
+  reactions, counters and the first replies of every thread
+- For each --limit, reports SQL statements, the median time of --runs and the peak memory allocated
+  while serializing (tracemalloc, in a separate run), each run in a fresh session.
+
+Usage: Run from the root of the project, uses a scratch SQLite database:
+> scripts/bench_feed.py --users 1000 --limit 200 --limit 2000
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+
+# Point the app at a scratch database before it is imported, cheap hashing keeps seeding fast
+scratch = tempfile.NamedTemporaryFile(suffix='.db', delete=False)
+os.environ['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///' + scratch.name
+os.environ.setdefault('PASSWORD_HASH_ITERATIONS', '1000')
+
+# Add the root directory to sys.path so app imports work
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from sqlalchemy import event
+from main import app, db
+from model.microblog import MicroBlog
+from model.pagination import keyset_page
+from model.synthetic import generate_synthetic
+
+MODES = {
+    'orm': lambda limit: [microblog.read() for microblog in
+                          keyset_page(MicroBlog.query, (MicroBlog._timestamp, MicroBlog.id), limit)],
+    'feed': lambda limit: MicroBlog.get_all(limit),
+}
+
+
+def measure(serialize, limit, runs):
+    """(statements, median ms, peak KiB) of serializing one page, memory traced in one extra run"""
+    statements = []
+    listener = lambda conn, cursor, statement, *args: statements.append(statement)
+    timings = []
+    with app.app_context():
+        for _ in range(runs):
+            db.session.remove()
+            started = time.perf_counter()
+            page = serialize(limit)
+            timings.append((time.perf_counter() - started) * 1000)
+            assert len(page) == limit, f"only {len(page)} microblogs, seed more --users"
+        db.session.remove()
+        event.listen(db.engine, 'before_cursor_execute', listener)
+        tracemalloc.start()
+        try:
+            serialize(limit)
+            peak = tracemalloc.get_traced_memory()[1] / 1024
+        finally:
+            tracemalloc.stop()
+            event.remove(db.engine, 'before_cursor_execute', listener)
+    return len(statements), statistics.median(timings), peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=1000, help='synthetic users, 2 microblogs each')
+    parser.add_argument('--limit', type=int, action='append', help='page size, repeatable (default 200 and 2000)')
+    parser.add_argument('--runs', type=int, default=5, help='runs per mode and page size, the median is reported')
+    args = parser.parse_args()
+
+    generate_synthetic(users=args.users, verbose=False)
+    print(f"{'posts':>6} {'mode':<5} {'queries':>8} {'ms':>9} {'peak KiB':>9}")
+    for limit in args.limit or [200, 2000]:
+        for name, serialize in MODES.items():
+            statements, ms, peak = measure(serialize, limit, args.runs)
+            print(f"{limit:>6} {name:<5} {statements:>8} {ms:>9.1f} {peak:>9.0f}")
+    return 0
+
+
+if __name__ == "__main__":
+    try:
+        sys.exit(main())
+    finally:
+        os.unlink(scratch.name)
@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+
+"""
+bench_json.py
+Serialization cost of the largest API responses, stdlib json (Flask's default provider) vs the
+orjson provider from api/json_provider.py.
+
+- Seeds a scratch SQLite database with the synthetic generator (model/synthetic.py).
+- Fetches /api/export/all, /api/user and /api/post/all once as an admin and keeps the decoded payloads.
+- Encodes each payload --rounds times with both providers, reports the best time and the bytes.
+
+Usage: Run from the root of the project, uses a scratch SQLite database:
+> scripts/bench_json.py --users 500 --rounds 20
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+# Point the app at a scratch database before it is imported, cheap hashing keeps seeding fast
+scratch = tempfile.NamedTemporaryFile(suffix='.db', delete=False)
+os.environ['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///' + scratch.name
+os.environ.setdefault('PASSWORD_HASH_ITERATIONS', '1000')
+
+# Add the root directory to sys.path so app imports work
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from flask.json.provider import DefaultJSONProvider
+from main import app, db, initUsers
+from model.synthetic import generate_synthetic
+from api.json_provider import OrjsonProvider, orjson
+
+ENDPOINTS = ('/api/export/all', '/api/user', '/api/post/all')
+
+
+def payloads(users):
+    with app.app_context():
+        db.create_all()
+    initUsers()
+    generate_synthetic(users=users, seed=users, verbose=False)
+    client = app.test_client()
+    response = client.post('/api/authenticate', json={'uid': app.config['ADMIN_UID'], 'password': app.config['ADMIN_PASSWORD']})
+    assert response.status_code == 200, response.get_data(as_text=True)
+    result = {}
+    for path in ENDPOINTS:
+        response = client.get(path)
+        assert response.status_code == 200, f"{path}: {response.status_code}"
+        result[path] = response.get_json()
+    return result
+
+
+def best_ms(encode, payload, rounds):
+    best = float('inf')
+    for _ in range(rounds):
+        started = time.perf_counter()
+        encode(payload)
+        best = min(best, time.perf_counter() - started)
+    return best * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=500, help='synthetic users to seed')
+    parser.add_argument('--rounds', type=int, default=20, help='encodings per payload, the best is reported')
+    args = parser.parse_args()
+
+    if orjson is None:
+        print("orjson is not installed, nothing to compare")
+        return 1
+    providers = {'stdlib': DefaultJSONProvider(app), 'orjson': OrjsonProvider(app)}
+    # Same settings as the provider app.json uses, so the stdlib numbers are not slowed by sorting
+    providers['stdlib'].sort_keys = False
+    providers['stdlib'].ensure_ascii = False
+
+    data = payloads(args.users)
+    print(f"{'endpoint':<18} {'stdlib ms':>10} {'orjson ms':>10} {'speedup':>8} {'stdlib bytes':>13} {'orjson bytes':>13}")
+    with app.app_context():
+        for path, payload in data.items():
+            std = best_ms(providers['stdlib'].dumps, payload, args.rounds)
+            fast = best_ms(providers['orjson'].encode, payload, args.rounds)
+            std_bytes = len(providers['stdlib'].dumps(payload).encode('utf-8'))
+            fast_bytes = len(providers['orjson'].encode(payload))
+            print(f"{path:<18} {std:>10.2f} {fast:>10.2f} {std / fast:>7.1f}x {std_bytes:>13} {fast_bytes:>13}")
+    return 0
+
+
+if __name__ == "__main__":
+    try:
+        sys.exit(main())
+    finally:
+        os.unlink(scratch.name)
@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+
+"""
+bench_login_storm.py
+Simulates the start of class: many students POST /api/authenticate at the same moment.
+
+- Seeds a scratch SQLite database with --users students sharing one password.
+- Fires every login from --concurrency threads, each with its own test client.
+- Reports p50/p99 latency, 200/401/503 counts and the pbkdf2 pool stats (queue depth, rehashes).
+
+The hash cost comes from PASSWORD_HASH_ITERATIONS as usual.  Seeding with --seed-iterations set to a
+different cost exercises rehash-on-login: the first login of every student upgrades the stored hash.
+
+Usage: Run from the root of the project, uses a scratch SQLite database:
+> scripts/bench_login_storm.py --users 100 --concurrency 20
+> PASSWORD_HASH_WORKERS=4 PASSWORD_HASH_QUEUE=8 scripts/bench_login_storm.py
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# Point the app at a scratch database before it is imported
+scratch = tempfile.NamedTemporaryFile(suffix='.db', delete=False)
+os.environ['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///' + scratch.name
+
+# Add the root directory to sys.path so app imports work
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from werkzeug.security import generate_password_hash
+from main import app, db
+from model.user import User
+from model.password import password_hasher
+
+PASSWORD = 'Storm#2025'
+
+
+def seed(count, iterations):
+    # One precomputed hash for everyone, hashing each student separately would dominate the setup
+    pwhash = generate_password_hash(PASSWORD, f"pbkdf2:sha256:{iterations}", salt_length=10)
+    with app.app_context():
+        db.create_all()
+        db.session.add_all([User(name=f"Student {i}", uid=f"storm{i}", password=pwhash) for i in range(count)])
+        db.session.commit()
+
+
+def login(uid):
+    client = app.test_client()
+    started = time.perf_counter()
+    response = client.post('/api/authenticate', json={'uid': uid, 'password': PASSWORD})
+    return response.status_code, time.perf_counter() - started
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=50, help='students logging in')
+    parser.add_argument('--concurrency', type=int, default=10, help='simultaneous requests, e.g. gunicorn workers x threads')
+    parser.add_argument('--seed-iterations', type=int, default=password_hasher.iterations,
+                        help='pbkdf2 cost of the seeded hashes (default: the configured cost)')
+    args = parser.parse_args()
+
+    seed(args.users, args.seed_iterations)
+    uids = [f"storm{i}" for i in range(args.users)]
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        results = list(pool.map(login, uids))
+    elapsed = time.perf_counter() - started
+
+    latencies = [seconds * 1000 for status, seconds in results if status == 200]
+    statuses = {}
+    for status, _ in results:
+        statuses[status] = statuses.get(status, 0) + 1
+
+    print(f"logins      {len(results)} in {elapsed:.2f}s ({len(results) / elapsed:.1f}/s), concurrency {args.concurrency}")
+    print(f"status      {dict(sorted(statuses.items()))}")
+    if latencies:
+        print(f"latency ms  p50 {percentile(latencies, 50):.0f}  p99 {percentile(latencies, 99):.0f}  "
+              f"mean {statistics.mean(latencies):.0f}  max {max(latencies):.0f}")
+    print(f"pbkdf2      {password_hasher.stats()}")
+    return 0 if statuses.get(200) else 1
+
+
+if __name__ == "__main__":
+    try:
+        sys.exit(main())
+    finally:
+        os.unlink(scratch.name)
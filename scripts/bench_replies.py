@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+
+"""
+bench_replies.py
+Reply throughput with several processes replying to the same microblog at once, like a busy thread
+served by 5 gunicorn workers.
+
+- json: the previous storage, every reply rewrites the post's _data['replies'] list with the id
+  len(replies) + 1 (reproduced here, the model no longer does it)
+- table: MicroBlog.add_reply, one microblog_replies row and a _reply_count increment
+- Each process sends --replies replies on the tuned SQLite profile, the run then counts the replies
+  stored, the lost ones (another worker's rewrite won) and duplicate ids.
+- Reports replies sent and kept per second, p50/p99 latency, lost replies and duplicate ids per mode.
+
+Usage: Run from the root of the project, uses scratch SQLite databases:
+> scripts/bench_replies.py --processes 5 --replies 200
+"""
+import argparse
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+MODES = ('json', 'table')
+
+
+def replier(path, mode, replies, user_id, start, results):
+    """One worker process, imports the app fresh like a gunicorn worker."""
+    os.environ['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///' + path
+    sys.path.append(ROOT)
+    from datetime import datetime
+    from sqlalchemy.exc import OperationalError
+    from sqlalchemy.orm.attributes import flag_modified
+    from main import app, db
+    from model.microblog import MicroBlog
+
+    latencies, failed = [], 0
+    start.wait()
+    with app.app_context():
+        for i in range(replies):
+            began = time.perf_counter()
+            try:
+                microblog = db.session.get(MicroBlog, 1, populate_existing=True)
+                if mode == 'json':
+                    thread = list(microblog._data.get('replies', []))
+                    thread.append({'id': len(thread) + 1, 'userId': user_id, 'content': f'reply {i}',
+                                   'timestamp': datetime.utcnow().isoformat()})
+                    microblog._data = {**microblog._data, 'replies': thread}
+                    flag_modified(microblog, '_data')
+                    db.session.commit()
+                else:
+                    microblog.add_reply(user_id, f'reply {i}')
+                latencies.append((time.perf_counter() - began) * 1000)
+            except OperationalError:
+                db.session.rollback()
+                failed += 1
+    results.put((latencies, failed))
+
+
+def prepare(path):
+    os.environ['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///' + path
+    sys.path.append(ROOT)
+    from main import app, db, initUsers
+    from model.microblog import MicroBlog
+    initUsers()
+    with app.app_context():
+        db.session.add(MicroBlog(user_id=1, content='bench thread', data={'replies': []}))
+        db.session.commit()
+
+
+def stored(path, mode):
+    """(replies stored, duplicate ids) after a run"""
+    os.environ['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///' + path
+    sys.path.append(ROOT)
+    from main import app, db
+    from model.microblog import MicroBlog, MicroBlogReply
+    with app.app_context():
+        if mode == 'json':
+            ids = [reply['id'] for reply in db.session.get(MicroBlog, 1)._data['replies']]
+        else:
+            ids = [reply_id for (reply_id,) in db.session.query(MicroBlogReply.id).filter_by(_microblog_id=1).all()]
+    return len(ids), len(ids) - len(set(ids))
+
+
+def run_mode(mode, processes, replies):
+    path = tempfile.NamedTemporaryFile(suffix='.db', delete=False).name
+    context = multiprocessing.get_context('spawn')
+    try:
+        setup = context.Process(target=prepare, args=(path,))
+        setup.start()
+        setup.join()
+        start, results = context.Event(), context.Queue()
+        workers = [context.Process(target=replier, args=(path, mode, replies, 1 + i % 2, start, results))
+                   for i in range(processes)]
+        for worker in workers:
+            worker.start()
+        time.sleep(5)  # let every process finish importing the app
+        began = time.perf_counter()
+        start.set()
+        outcomes = [results.get(timeout=900) for _ in workers]
+        elapsed = time.perf_counter() - began
+        for worker in workers:
+            worker.join()
+        with context.Pool(1) as pool:
+            count, duplicates = pool.apply(stored, (path, mode))
+    finally:
+        for suffix in ('', '-wal', '-shm', '-journal'):
+            if os.path.exists(path + suffix):
+                os.unlink(path + suffix)
+
+    latencies = sorted(ms for samples, _ in outcomes for ms in samples)
+    failed = sum(count for _, count in outcomes)
+    pick = lambda pct: latencies[min(len(latencies) - 1, int(pct / 100 * (len(latencies) - 1)))] if latencies else float('nan')
+    print(f"{mode:<6} replies {len(latencies):>6}  {len(latencies) / elapsed:>7.1f}/s  kept {count / elapsed:>7.1f}/s  "
+          f"p50 {pick(50):>6.1f} ms  p99 {pick(99):>6.1f} ms  failed {failed:>4}  lost {len(latencies) - count:>5}  "
+          f"duplicate ids {duplicates:>5}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--processes', type=int, default=5, help='writer processes, gunicorn --workers')
+    parser.add_argument('--replies', type=int, default=200, help='replies per process')
+    parser.add_argument('--mode', choices=MODES, action='append', help='run only this mode, repeatable')
+    args = parser.parse_args()
+
+    os.environ['PASSWORD_HASH_ITERATIONS'] = '1000'  # seeding only, the benchmark does not log in
+    for mode in args.mode or MODES:
+        run_mode(mode, args.processes, args.replies)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+
+"""
+bench_search.py
+Microblog search cost, the LIKE '%term%' scan vs the full-text index (model/search.py).
+
+- Seeds a scratch SQLite database with --posts microblogs of 12 random words from the synthetic
+  vocabulary; one post in 1000 also mentions "walrus", none mentions "narwhal".
+- like: the previous MicroBlog.search_content, _content.contains(term) newest first
+- index: MicroBlog.search_content, the same page filtered by the FTS5 index
+- ranked: model.search.search, best matches first (bm25) as served by GET /api/search
+- For each query, reports the median time of --runs for a 50 row page and the rows found.  A common
+  word lets the LIKE scan stop early on the timestamp index, rare and missing words read every row.
+
+Usage: Run from the root of the project, uses a scratch SQLite database:
+> scripts/bench_search.py --posts 100000
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+# Point the app at a scratch database before it is imported, cheap hashing keeps seeding fast
+scratch = tempfile.NamedTemporaryFile(suffix='.db', delete=False)
+os.environ['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///' + scratch.name
+os.environ.setdefault('PASSWORD_HASH_ITERATIONS', '1000')
+
+# Add the root directory to sys.path so app imports work
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from main import app, db, initUsers
+from model.microblog import MicroBlog
+from model.search import search
+from model.synthetic import insert_rows, sentence
+
+# (label, query, ranked query): LIKE takes the query as one substring, search_content makes every
+# word a prefix, GET /api/search only the words marked with *
+QUERIES = [
+    ('common word', 'flask', 'flask'),
+    ('two words', 'flask session', 'flask session'),
+    ('prefix', 'sess', 'sess*'),
+    ('rare word', 'walrus', 'walrus'),
+    ('no match', 'narwhal', 'narwhal'),
+]
+MODES = {
+    'like': lambda q, ranked, limit: MicroBlog._feed(MicroBlog.query.filter(MicroBlog._content.contains(q)), limit),
+    'index': lambda q, ranked, limit: MicroBlog.search_content(q, limit),
+    'ranked': lambda q, ranked, limit: search(ranked, ['microblog'], limit)[0],
+}
+
+
+def seed(posts):
+    """--posts microblogs by the admin, returns (seconds, rows/s) of the indexed inserts"""
+    initUsers()
+    rng = random.Random(posts)
+    start = datetime(2025, 1, 1)
+    rows = []
+    for i in range(posts):
+        content = sentence(rng)
+        if i % 1000 == 0:
+            content = f'{content[:260]} walrus'
+        rows.append({'_user_id': 1, '_content': content, '_data': {}, '_reply_count': 0,
+                     '_timestamp': start + timedelta(seconds=i), '_updated_at': start + timedelta(seconds=i)})
+    with app.app_context():
+        started = time.perf_counter()
+        insert_rows(MicroBlog, rows)
+        elapsed = time.perf_counter() - started
+    return elapsed, posts / elapsed
+
+
+def measure(serialize, query, ranked, limit, runs):
+    """(median ms, rows) of one page"""
+    timings = []
+    with app.app_context():
+        for _ in range(runs):
+            db.session.remove()
+            started = time.perf_counter()
+            page = serialize(query, ranked, limit)
+            timings.append((time.perf_counter() - started) * 1000)
+    return statistics.median(timings), len(page)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--posts', type=int, default=100000, help='microblogs to seed')
+    parser.add_argument('--limit', type=int, default=50, help='page size')
+    parser.add_argument('--runs', type=int, default=5, help='runs per mode and query, the median is reported')
+    args = parser.parse_args()
+
+    seconds, rate = seed(args.posts)
+    with app.app_context():
+        size = db.session.execute(db.text("SELECT sum(length(block)) FROM microblogs_fts_data")).scalar()
+    print(f"seeded {args.posts} posts in {seconds:.1f} s ({rate:.0f}/s indexed), index {size / 2 ** 20:.1f} MiB")
+    print(f"{'query':<12} {'mode':<7} {'ms':>9} {'rows':>5}")
+    for label, query, ranked in QUERIES:
+        for name, serialize in MODES.items():
+            ms, rows = measure(serialize, query, ranked, args.limit, args.runs)
+            print(f"{label:<12} {name:<7} {ms:>9.1f} {rows:>5}")
+    return 0
+
+
+if __name__ == "__main__":
+    try:
+        sys.exit(main())
+    finally:
+        os.unlink(scratch.name)
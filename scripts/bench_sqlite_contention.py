@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+
+"""
+bench_sqlite_contention.py
+Several processes writing to one SQLite file at once, like 5 gunicorn workers posting reactions,
+leaderboard scores and study records.
+
+- Runs once with SQLITE_TUNING=false (SQLite defaults, rollback journal) and once with the tuned
+  profile from model/engine.py (WAL, busy_timeout, synchronous=NORMAL, ...).
+- Each process commits --writes small transactions (insert a leaderboard event, update a study
+  record, read the latest events) and counts "database is locked" failures.
+- Reports commits per second, lock errors and p50/p99 transaction latency per profile.
+
+Usage: Run from the root of the project, uses scratch SQLite databases:
+> scripts/bench_sqlite_contention.py --processes 5 --writes 300
+"""
+import argparse
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+PROFILES = {
+    'default': {'SQLITE_TUNING': 'false'},
+    'tuned': {'SQLITE_TUNING': 'true'},
+}
+
+
+def writer(path, writes, start, results):
+    """One worker process, imports the app fresh so the profile's environment applies."""
+    os.environ['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///' + path
+    sys.path.append(ROOT)
+    from sqlalchemy.exc import OperationalError
+    from main import app, db
+    from model.leaderboard import ScoreCounterEvent
+    from model.study import Study
+
+    latencies, locked = [], 0
+    start.wait()
+    with app.app_context():
+        for i in range(writes):
+            began = time.perf_counter()
+            try:
+                db.session.add(ScoreCounterEvent(payload={'gameName': 'bench', 'score': i}))
+                record = Study.query.filter_by(user_id=None, topic='bench').first()
+                record.studied = not record.studied
+                db.session.commit()
+                ScoreCounterEvent.query.order_by(ScoreCounterEvent._timestamp.desc()).limit(20).all()
+                latencies.append((time.perf_counter() - began) * 1000)
+            except OperationalError:
+                db.session.rollback()
+                locked += 1
+    results.put((latencies, locked))
+
+
+def prepare(path):
+    os.environ['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///' + path
+    sys.path.append(ROOT)
+    from main import app, db
+    from model.study import Study
+    with app.app_context():
+        db.create_all()
+        db.session.add(Study(user_id=None, topic='bench', subtopic='contention', studied=False, timestamp='0'))
+        db.session.commit()
+
+
+def run_profile(name, processes, writes):
+    path = tempfile.NamedTemporaryFile(suffix='.db', delete=False).name
+    os.environ.update(PROFILES[name])
+    context = multiprocessing.get_context('spawn')
+    try:
+        setup = context.Process(target=prepare, args=(path,))
+        setup.start()
+        setup.join()
+        start, results = context.Event(), context.Queue()
+        workers = [context.Process(target=writer, args=(path, writes, start, results)) for _ in range(processes)]
+        for worker in workers:
+            worker.start()
+        time.sleep(5)  # let every process finish importing the app
+        began = time.perf_counter()
+        start.set()
+        outcomes = [results.get(timeout=900) for _ in workers]
+        elapsed = time.perf_counter() - began
+        for worker in workers:
+            worker.join()
+    finally:
+        for suffix in ('', '-wal', '-shm', '-journal'):
+            if os.path.exists(path + suffix):
+                os.unlink(path + suffix)
+
+    latencies = sorted(ms for samples, _ in outcomes for ms in samples)
+    locked = sum(count for _, count in outcomes)
+    pick = lambda pct: latencies[min(len(latencies) - 1, int(pct / 100 * (len(latencies) - 1)))] if latencies else float('nan')
+    print(f"{name:<8} commits {len(latencies):>6}  locked {locked:>5}  {len(latencies) / elapsed:>8.1f}/s  "
+          f"p50 {pick(50):>7.1f} ms  p99 {pick(99):>7.1f} ms")
+    return locked
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--processes', type=int, default=5, help='writer processes, gunicorn --workers')
+    parser.add_argument('--writes', type=int, default=300, help='transactions per process')
+    parser.add_argument('--profile', choices=sorted(PROFILES), action='append', help='run only this profile, repeatable')
+    args = parser.parse_args()
+
+    for name in args.profile or ['default', 'tuned']:
+        run_profile(name, args.processes, args.writes)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
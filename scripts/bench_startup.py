@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+
+"""
+bench_startup.py
+Cold import time of main:app, what a gunicorn worker or a `flask` command pays before serving.
+
+- Imports main in --runs fresh interpreters with python -X importtime and a scratch SQLite database.
+- Reports the median wall time of the import, then the packages and project modules that cost the
+  most: self time summed per top-level package, and cumulative time per api/model/hacks module.
+- --cli imports the way the flask command does (FLASK_RUN_FROM_CLI), which adds Flask-Migrate.
+- --budget-ms exits 1 when the median is above it, to track startup time in CI.
+
+Usage: Run from the root of the project:
+> scripts/bench_startup.py --runs 5 --top 15
+> scripts/bench_startup.py --budget-ms 1500
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+from collections import defaultdict
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+PROJECT_PACKAGES = ('api', 'model', 'hacks')
+
+# Wall time measured in the child, printed on stdout; -X importtime writes to stderr
+PROBE = "import time; started = time.perf_counter(); import main; print((time.perf_counter() - started) * 1000)"
+
+
+def cold_import(cli, database):
+    """One fresh interpreter importing main, (wall ms, [(self us, cumulative us, module), ...])."""
+    env = dict(os.environ, SQLALCHEMY_DATABASE_URI='sqlite:///' + database, PYTHONPATH=ROOT)
+    env.pop('FLASK_RUN_FROM_CLI', None)
+    if cli:
+        env['FLASK_RUN_FROM_CLI'] = 'true'
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', PROBE],
+                            cwd=ROOT, env=env, capture_output=True, text=True)
+    if result.returncode != 0:
+        raise SystemExit(result.stderr[-2000:])
+    modules = []
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        own, cumulative, name = line[len('import time:'):].split('|')
+        modules.append((int(own), int(cumulative), name.strip()))
+    return float(result.stdout.strip().splitlines()[-1]), modules
+
+
+def median_by(samples, key):
+    """Median per key over runs, a module missing from a run counts as 0 there."""
+    values = defaultdict(lambda: [0] * len(samples))
+    for run, sample in enumerate(samples):
+        for name, value in key(sample).items():
+            values[name][run] += value
+    return {name: statistics.median(runs) for name, runs in values.items()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=5, help='fresh interpreters, medians are reported')
+    parser.add_argument('--top', type=int, default=15, help='rows per table')
+    parser.add_argument('--cli', action='store_true', help='import as the flask command does')
+    parser.add_argument('--budget-ms', type=float, default=None, help='fail when the median wall time is above it')
+    args = parser.parse_args()
+
+    scratch = tempfile.NamedTemporaryFile(suffix='.db', delete=False)
+    try:
+        cold_import(args.cli, scratch.name)  # warm the OS file cache and .pyc files, not measured
+        runs = [cold_import(args.cli, scratch.name) for _ in range(args.runs)]
+    finally:
+        os.unlink(scratch.name)
+
+    wall = statistics.median(ms for ms, _ in runs)
+    samples = [modules for _, modules in runs]
+
+    def packages(modules):
+        totals = defaultdict(int)
+        for own, _, name in modules:
+            totals[name.split('.')[0]] += own
+        return totals
+
+    def project(modules):
+        return {name: cumulative for _, cumulative, name in modules if name.split('.')[0] in PROJECT_PACKAGES}
+
+    print(f"import main: {wall:.0f} ms median of {args.runs} cold runs{' (flask CLI)' if args.cli else ''}")
+    print(f"\n{'package':<28} {'self ms':>8} {'share':>6}")
+    by_package = median_by(samples, packages)
+    for name, us in sorted(by_package.items(), key=lambda item: -item[1])[:args.top]:
+        print(f"{name:<28} {us / 1000:>8.1f} {us / 1000 / wall:>6.0%}")
+    print(f"\n{'project module':<28} {'cumul. ms':>9}")
+    by_module = median_by(samples, project)
+    for name, us in sorted(by_module.items(), key=lambda item: -item[1])[:args.top]:
+        print(f"{name:<28} {us / 1000:>9.1f}")
+
+    if args.budget_ms is not None and wall > args.budget_ms:
+        print(f"\nFAIL: {wall:.0f} ms is above the {args.budget_ms:.0f} ms budget")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
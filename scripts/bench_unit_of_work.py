@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+
+"""
+bench_unit_of_work.py
+Database commits per request on the main write endpoints, model commits as they are vs one
+commit per request (UNIT_OF_WORK, see install_unit_of_work in model/engine.py).
+
+- Seeds a scratch SQLite database with initUsers and signs up a guest account.
+- Sends each write --rounds times with UNIT_OF_WORK off, then on, counting the COMMITs the engine
+  issues per request and timing the request.
+- Also checks that a write request answering an error leaves nothing behind in unit-of-work mode.
+
+Usage: Run from the root of the project, uses a scratch SQLite database:
+> scripts/bench_unit_of_work.py --rounds 20
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+# Point the app at a scratch database before it is imported, cheap hashing keeps seeding fast
+scratch = tempfile.NamedTemporaryFile(suffix='.db', delete=False)
+os.environ['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///' + scratch.name
+os.environ.setdefault('PASSWORD_HASH_ITERATIONS', '1000')
+
+# Add the root directory to sys.path so app imports work
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from main import app, db, initUsers
+from model.microblog import MicroBlog
+from model.post import Post
+
+commits = [0]
+
+
+@event.listens_for(Engine, 'commit')
+def count_commit(conn):
+    commits[0] += 1
+
+
+def writes(client, round_no, state):
+    """(name, response) for each measured write of one round, in dependency order."""
+    tag = f"{round_no}-{int(time.time() * 1000) % 100000}"
+    yield 'POST /api/user/guest', lambda: client.post('/api/user/guest', json={'uid': f'guest{tag}', 'password': 'guestpass'})
+    yield 'PUT /api/user', lambda: client.put('/api/user', json={'name': f'Bench {tag}', 'school': f'School {tag}'})
+    yield 'POST /api/user/section', lambda: client.post('/api/user/section', json={'sections': ['CSP', 'CSA', 'Robotics']})
+    yield 'POST /api/microblog', lambda: client.post('/api/microblog', json={'content': f'bench {tag}', 'topicPath': '/bench'})
+    yield 'POST /api/microblog/reply', lambda: client.post('/api/microblog/reply', json={'postId': state['microblog'], 'content': f'reply {tag}'})
+    yield 'POST /api/microblog/reaction', lambda: client.post('/api/microblog/reaction', json={'microblogId': state['microblog'], 'reactionType': 'like'})
+    yield 'POST /api/post', lambda: client.post('/api/post', json={'content': f'bench {tag}', 'pageUrl': '/bench', 'pageTitle': 'Bench'})
+    yield 'POST /api/post/reply', lambda: client.post('/api/post/reply', json={'parentId': state['post'], 'content': f'reply {tag}'})
+
+
+def measure(client, rounds, enabled, state):
+    app.config['UNIT_OF_WORK'] = enabled
+    totals = {}
+    for round_no in range(rounds):
+        # Sections are only added when missing, remove them so every round adds them again
+        client.delete('/api/user/section', json={'sections': ['CSP', 'CSA', 'Robotics']})
+        for name, send in writes(client, round_no + (rounds if enabled else 0), state):
+            commits[0] = 0
+            started = time.perf_counter()
+            response = send()
+            elapsed = (time.perf_counter() - started) * 1000
+            assert response.status_code < 400, f"{name}: {response.status_code} {response.get_data(as_text=True)[:200]}"
+            count, ms = totals.get(name, (0, 0.0))
+            totals[name] = (count + commits[0], ms + elapsed)
+    return {name: (count / rounds, ms / rounds) for name, (count, ms) in totals.items()}
+
+
+def check_rollback(client):
+    """A write followed by a 4xx answer must not be committed in unit-of-work mode."""
+    app.config['UNIT_OF_WORK'] = True
+    with app.app_context():
+        before = db.session.query(MicroBlog).count()
+    # Unknown section: the first section is added, then the request answers 404
+    response = client.post('/api/user/section', json={'sections': ['CSSE', 'NOPE']})
+    assert response.status_code == 404, response.status_code
+    response = client.get('/api/user/section')
+    abbreviations = [section['abbreviation'] for section in response.get_json()['sections']]
+    assert 'CSSE' not in abbreviations, "the 404 request's section was committed"
+    with app.app_context():
+        assert db.session.query(MicroBlog).count() == before
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rounds', type=int, default=20, help='requests per endpoint and mode')
+    args = parser.parse_args()
+
+    with app.app_context():
+        db.create_all()
+    initUsers()
+    client = app.test_client()
+    assert client.post('/api/user/guest', json={'uid': 'benchuser', 'password': 'benchpass'}).status_code < 400
+    assert client.post('/api/authenticate', json={'uid': 'benchuser', 'password': 'benchpass'}).status_code == 200
+    state = {}
+    assert client.post('/api/microblog', json={'content': 'seed', 'topicPath': '/bench'}).status_code < 400
+    assert client.post('/api/post', json={'content': 'seed', 'pageUrl': '/bench', 'pageTitle': 'Bench'}).status_code < 400
+    with app.app_context():
+        state['microblog'] = db.session.query(MicroBlog.id).order_by(MicroBlog.id).first()[0]
+        state['post'] = db.session.query(Post.id).order_by(Post.id).first()[0]
+
+    before = measure(client, args.rounds, False, state)
+    after = measure(client, args.rounds, True, state)
+
+    print(f"{'endpoint':<30} {'commits':>8} {'uow':>5} {'ms':>8} {'uow ms':>8}")
+    for name in before:
+        print(f"{name:<30} {before[name][0]:>8.1f} {after[name][0]:>5.1f} {before[name][1]:>8.2f} {after[name][1]:>8.2f}")
+
+    check_rollback(client)
+    print("\nOK: error responses roll back in unit-of-work mode")
+    return 0
+
+
+if __name__ == "__main__":
+    try:
+        sys.exit(main())
+    finally:
+        os.unlink(scratch.name)
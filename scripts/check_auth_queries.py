@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+
+"""
+check_auth_queries.py
+Counts the SQL statements auth_required issues to authenticate a JWT request.
+
+- Full mode loads the User plus its lazy='subquery' sections and personas.
+- Slim mode (auth_required(slim=True)) must cost no query with a claims token, and for a
+  legacy token (uid only) at most one query on a cold cache and none once it is warm.
+
+Usage: Run from the root of the project, uses a scratch SQLite database:
+> scripts/check_auth_queries.py
+
+Exits with status 1 if the slim budget is exceeded.
+"""
+import jwt
+import os
+import sys
+import tempfile
+
+# Point the app at a scratch database before it is imported
+scratch = tempfile.NamedTemporaryFile(suffix='.db', delete=False)
+os.environ['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///' + scratch.name
+
+# Add the root directory to sys.path so app imports work
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from sqlalchemy import event
+from main import app, db, initUsers
+from api.authorize import auth_required
+from model.principal import principal_cache
+
+# Probe endpoints with no queries of their own, so every statement counted belongs to auth
+@app.route('/_check/auth/full')
+@auth_required()
+def _check_full():
+    return {'ok': True}
+
+@app.route('/_check/auth/slim')
+@auth_required(slim=True)
+def _check_slim():
+    return {'ok': True}
+
+
+def count_queries(client, path):
+    statements = []
+    listener = lambda conn, cursor, statement, *args: statements.append(statement)
+    with app.app_context():
+        event.listen(db.engine, 'before_cursor_execute', listener)
+        try:
+            response = client.get(path)
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', listener)
+    assert response.status_code == 200, response.get_data(as_text=True)
+    return len(statements)
+
+
+def main():
+    initUsers()
+    client = app.test_client()
+    response = client.post('/api/authenticate', json={'uid': app.config['USER_UID'], 'password': app.config['USER_PASSWORD']})
+    assert response.status_code == 200, response.get_data(as_text=True)
+
+    results = {}
+    for mode in ('full', 'slim'):
+        principal_cache.clear()
+        results[f'{mode} (cold cache)'] = count_queries(client, f'/_check/auth/{mode}')
+        results[f'{mode} (warm cache)'] = count_queries(client, f'/_check/auth/{mode}')
+
+    # Tokens issued before claims were added only carry the uid
+    legacy = app.test_client()
+    legacy.set_cookie(app.config['JWT_TOKEN_NAME'], jwt.encode({'_uid': app.config['USER_UID']}, app.config['SECRET_KEY'], algorithm='HS256'))
+    principal_cache.clear()
+    results['legacy slim (cold)'] = count_queries(legacy, '/_check/auth/slim')
+    legacy.set_cookie(app.config['JWT_TOKEN_NAME'], jwt.encode({'_uid': app.config['USER_UID']}, app.config['SECRET_KEY'], algorithm='HS256'))
+    results['legacy slim (warm)'] = count_queries(legacy, '/_check/auth/slim')
+
+    for label, count in results.items():
+        print(f"{label:<20} {count} queries")
+
+    failed = (results['slim (cold cache)'] > 0 or results['slim (warm cache)'] > 0
+              or results['legacy slim (cold)'] > 1 or results['legacy slim (warm)'] > 0)
+    print("FAIL: slim authentication exceeded its query budget" if failed else "OK")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    try:
+        sys.exit(main())
+    finally:
+        os.unlink(scratch.name)
@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+
+"""
+check_batch.py
+Checks request batching (POST /api/batch in api/batch.py).
+
+- every sub-request answers as it would on its own, in request order, parallel or sequential
+- a sub-request that raises answers 500 on its own, the items next to it still return
+- a login first in a sequential batch authenticates the calls after it
+- a malformed batch answers 400
+
+Usage: Run from the root of the project, uses a scratch SQLite database:
+> scripts/check_batch.py
+
+Exits with status 1 if any check fails.
+"""
+import os
+import sys
+import tempfile
+
+# Point the app at a scratch database before it is imported, cheap hashing keeps seeding fast
+scratch = tempfile.NamedTemporaryFile(suffix='.db', delete=False)
+os.environ['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///' + scratch.name
+os.environ.setdefault('PASSWORD_HASH_ITERATIONS', '1000')
+
+# Add the root directory to sys.path so app imports work
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from werkzeug.exceptions import InternalServerError
+from main import app, initUsers
+
+
+def failing_route():
+    raise RuntimeError("check_batch: this sub-request fails on purpose")
+
+
+# A route that raises, added before the first request is handled
+app.add_url_rule('/api/check-batch/fail', 'check_batch_fail', failing_route)
+
+
+def statuses(response):
+    return [result['status'] for result in response.get_json()['responses']]
+
+
+def main():
+    initUsers()
+    client = app.test_client()
+    checks = []
+
+    mixed = [{'id': 'ok', 'path': '/api/section'}, {'id': 'fail', 'path': '/api/check-batch/fail'},
+             {'id': 'anonymous', 'path': '/api/id'}]
+    response = client.post('/api/batch', json={'requests': mixed})
+    checks.append(('a failing item answers 500 on its own', (response.status_code, statuses(response)), (200, [200, 500, 401])))
+    checks.append(('results keep request order', [result['id'] for result in response.get_json()['responses']],
+                   ['ok', 'fail', 'anonymous']))
+    checks.append(('the failing item has a message', response.get_json()['responses'][1]['body'],
+                   {'message': InternalServerError.description}))
+    response = client.post('/api/batch', json={'requests': mixed, 'sequential': True})
+    checks.append(('and so it does in a sequential batch', (response.status_code, statuses(response)), (200, [200, 500, 401])))
+
+    login = {'method': 'POST', 'path': '/api/authenticate',
+             'body': {'uid': app.config['ADMIN_UID'], 'password': app.config['ADMIN_PASSWORD']}}
+    response = client.post('/api/batch', json={'requests': [login, {'path': '/api/check-batch/fail'}, {'path': '/api/id'}],
+                                               'sequential': True})
+    checks.append(('a login first authenticates the calls after it', statuses(response), [200, 500, 200]))
+
+    checks.append(('an empty batch answers 400', client.post('/api/batch', json={'requests': []}).status_code, 400))
+    checks.append(('a nested batch answers 400', client.post('/api/batch', json={'requests': [{'path': '/api/batch'}]}).status_code, 400))
+
+    failed = False
+    for label, got, expected in checks:
+        ok = got == expected
+        failed |= not ok
+        print(f"{'ok  ' if ok else 'FAIL'} {label:<48} {str(got)[:60]}")
+    print("FAIL" if failed else "OK")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    try:
+        sys.exit(main())
+    finally:
+        os.unlink(scratch.name)
@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+
+"""
+check_http_client.py
+Checks the shared outbound client (model/http_client.py) against a local stub HTTP server.
+
+The stub answers on 127.0.0.1 with scripted failures and reports the client port of every request:
+
+- repeated calls reuse one kept-alive connection
+- GET is retried on 503 and 500 until it succeeds, and 429 honors Retry-After
+- POST is retried on 429 but never on 500, the upstream may have processed it
+- a refused connection is retried, also for POST, and raised once the retries are used up
+- a slow upstream raises requests.Timeout after the read timeout
+- cookies set by the upstream are not sent back on later calls
+- per-upstream metrics count requests, retries, statuses and errors, with a latency histogram
+- consecutive failures open the upstream's circuit breaker, calls then raise CircuitOpen without
+  being sent; after the reset timeout one probe goes through, its success closes the breaker and
+  its failure opens it again
+
+Usage: Run from the root of the project, uses a scratch SQLite database:
+> scripts/check_http_client.py
+
+Exits with status 1 if any check fails.
+"""
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import os
+import socket
+import sys
+import tempfile
+import threading
+import time
+
+# Point the app at a scratch database before it is imported
+scratch = tempfile.NamedTemporaryFile(suffix='.db', delete=False)
+os.environ['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///' + scratch.name
+
+# Add the root directory to sys.path so app imports work
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import requests
+from model.http_client import CircuitOpen, HttpClient
+
+
+class Stub(BaseHTTPRequestHandler):
+    """Scripted upstream: /fail/<status>/<times>/<key> fails <times> times per key, then answers 200."""
+    protocol_version = 'HTTP/1.1'  # keep-alive
+    failures = {}
+    ports = []
+    cookies = []
+
+    def log_message(self, *args):
+        pass
+
+    def answer(self, status, body=b'{}', headers=()):
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in headers:
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def handle_request(self):
+        Stub.ports.append(self.client_address[1])
+        Stub.cookies.append(self.headers.get('Cookie'))
+        length = int(self.headers.get('Content-Length') or 0)
+        if length:
+            self.rfile.read(length)
+        parts = self.path.strip('/').split('/')
+        if parts[0] == 'slow':
+            time.sleep(float(parts[1]))
+            return self.answer(200)
+        if parts[0] == 'cookie':
+            return self.answer(200, headers=[('Set-Cookie', 'session=upstream-user-1; Path=/')])
+        if parts[0] == 'fail':
+            status, times, key = int(parts[1]), int(parts[2]), parts[3]
+            seen = Stub.failures.get(key, 0)
+            Stub.failures[key] = seen + 1
+            if seen < times:
+                return self.answer(status, headers=[('Retry-After', '0')] if status == 429 else [])
+        return self.answer(200)
+
+    do_GET = do_POST = handle_request
+
+
+def unused_port():
+    with socket.socket() as probe:
+        probe.bind(('127.0.0.1', 0))
+        return probe.getsockname()[1]
+
+
+def main():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Stub)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base = f"http://127.0.0.1:{server.server_address[1]}"
+    client = HttpClient(connect_timeout=1, read_timeout=0.5, retries=2, backoff=0.01, backoff_max=0.05)
+    checks = []
+
+    def attempts(key):
+        return Stub.failures.get(key, 0)
+
+    Stub.ports.clear()
+    statuses = [client.get(f"{base}/ok").status_code for _ in range(5)]
+    checks.append(('5 calls answer 200', statuses, [200] * 5))
+    checks.append(('over one kept-alive connection', len(set(Stub.ports)), 1))
+
+    checks.append(('GET retried on 503', (client.get(f"{base}/fail/503/2/a").status_code, attempts('a')), (200, 3)))
+    checks.append(('GET retried on 500', (client.get(f"{base}/fail/500/1/b").status_code, attempts('b')), (200, 2)))
+    checks.append(('GET gives up after the retries', (client.get(f"{base}/fail/502/9/c").status_code, attempts('c')), (502, 3)))
+    checks.append(('POST retried on 429', (client.post(f"{base}/fail/429/1/d", json={}).status_code, attempts('d')), (200, 2)))
+    checks.append(('POST not retried on 500', (client.post(f"{base}/fail/500/1/e", json={}).status_code, attempts('e')), (500, 1)))
+    checks.append(('retries=0 sends once', (client.get(f"{base}/fail/503/1/f", retries=0).status_code, attempts('f')), (503, 1)))
+
+    refused = f"http://127.0.0.1:{unused_port()}"
+    try:
+        client.post(f"{refused}/x", json={})
+        raised = None
+    except requests.ConnectionError as e:
+        raised = type(e).__name__
+    checks.append(('refused POST raises ConnectionError', raised, 'ConnectionError'))
+
+    try:
+        client.get(f"{base}/slow/2", retries=0)
+        raised = None
+    except requests.Timeout as e:
+        raised = type(e).__name__
+    checks.append(('slow upstream raises a Timeout', raised, 'ReadTimeout'))
+
+    Stub.cookies.clear()
+    client.get(f"{base}/cookie")
+    client.get(f"{base}/ok")
+    checks.append(('upstream cookies are not kept', list(Stub.cookies), [None, None]))
+
+    stats = client.stats()
+    local, down = stats[base.split('//')[1]], stats[refused.split('//')[1]]
+    checks.append(('metrics count the retries', local['retries'], 6))
+    checks.append(('metrics count the 5xx answers', local['statuses'].get('5xx'), 8))
+    checks.append(('refused calls are errors', (down['requests'], down['errors'], down['statuses']), (3, 3, {'failed': 3})))
+
+    checks.append(('histogram counts every call', sum(local['histogram'].values()), local['requests']))
+
+    # Breaker: 3 consecutive failures open it for 0.3 s
+    guarded = HttpClient(connect_timeout=1, read_timeout=0.5, retries=0, breaker_failures=3, breaker_reset=0.3)
+    for _ in range(3):
+        guarded.get(f"{base}/fail/503/99/g")
+    sent = attempts('g')
+    try:
+        guarded.get(f"{base}/fail/503/99/g")
+        raised = None
+    except requests.ConnectionError as e:
+        raised = type(e).__name__
+    checks.append(('breaker opens after 3 failures', (raised, attempts('g') - sent), ('CircuitOpen', 0)))
+    checks.append(('open breaker is not available', guarded.available(base), False))
+    time.sleep(0.35)
+    checks.append(('half-open after the reset timeout', guarded.available(base), True))
+    checks.append(('failed probe opens it again', (guarded.get(f"{base}/fail/503/99/g").status_code, attempts('g') - sent), (503, 1)))
+    try:
+        guarded.get(f"{base}/ok")
+        raised = None
+    except CircuitOpen as e:
+        raised = type(e).__name__
+    checks.append(('reopened breaker fails fast', raised, 'CircuitOpen'))
+    time.sleep(0.35)
+    checks.append(('successful probe closes it', guarded.get(f"{base}/ok").status_code, 200))
+    breaker = guarded.stats()[base.split('//')[1]]['breaker']
+    checks.append(('breaker state in the metrics', (breaker['state'], breaker['opens'], breaker['rejected']), ('closed', 2, 2)))
+
+    server.shutdown()
+    failed = False
+    for label, got, expected in checks:
+        ok = got == expected
+        failed |= not ok
+        print(f"{'ok  ' if ok else 'FAIL'} {label:<36} {got}")
+    print(f"     {base}: {local}")
+    print("FAIL" if failed else "OK")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    try:
+        sys.exit(main())
+    finally:
+        os.unlink(scratch.name)
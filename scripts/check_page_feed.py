@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+
+"""
+check_page_feed.py
+Checks the page-embed discussion cache (GET /api/microblog/page/<page_key>, Topic.page_feed).
+
+- a cached view runs no SQL statement, anonymous or signed in, and neither does a 304 revalidation
+- a microblog create, update, delete, reply or reaction in the topic shows on the next view
+- a write in another topic leaves this topic's feed cached
+- userPostCount and canPost follow the caller's own posts, up to the topic's maxPostsPerUser
+- a disabled topic answers 403, a members-only topic 401 to anonymous viewers
+
+Usage: Run from the root of the project, uses a scratch SQLite database:
+> scripts/check_page_feed.py
+
+Exits with status 1 if any check fails.
+"""
+import os
+import sys
+import tempfile
+
+# Point the app at a scratch database before it is imported, cheap hashing keeps seeding fast
+scratch = tempfile.NamedTemporaryFile(suffix='.db', delete=False)
+os.environ['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///' + scratch.name
+os.environ.setdefault('PASSWORD_HASH_ITERATIONS', '1000')
+os.environ['RESPONSE_CACHE_ENABLED'] = 'true'
+os.environ['RESPONSE_CACHE_SQLITE'] = ''
+
+# Add the root directory to sys.path so app imports work
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from sqlalchemy import event
+from main import app, db, initUsers
+from model.microblog import Topic
+from model.user import User
+from model.synthetic import generate_synthetic, SYNTHETIC_PASSWORD, SYNTHETIC_UID_PREFIX
+
+
+def counted(client, path, **kwargs):
+    """(statements, response) of one GET"""
+    statements = []
+    listener = lambda conn, cursor, statement, *args: statements.append(statement)
+    with app.app_context():
+        event.listen(db.engine, 'before_cursor_execute', listener)
+    try:
+        response = client.get(path, **kwargs)
+    finally:
+        with app.app_context():
+            event.remove(db.engine, 'before_cursor_execute', listener)
+    return len(statements), response
+
+
+def login(uid):
+    client = app.test_client()
+    response = client.post('/api/authenticate', json={'uid': uid, 'password': SYNTHETIC_PASSWORD})
+    assert response.status_code == 200, response.get_data(as_text=True)
+    return client
+
+
+def main():
+    initUsers()
+    generate_synthetic(users=20, verbose=False)
+    with app.app_context():
+        students = [user._uid for user in User.query.filter(User._uid.like(f'{SYNTHETIC_UID_PREFIX}%'))
+                    .order_by(User.id).limit(2)]
+        topic = Topic(page_path='/check/page-feed', page_title='Page feed', allow_anonymous=True, max_posts_per_user=2).create()
+        other = Topic(page_path='/check/other', page_title='Other page').create()
+        members = Topic(page_path='/check/members', page_title='Members only').create()
+        topic_id, other_id = topic.id, other.id
+        path, members_path = f'/api/microblog/page/{topic._page_key}', f'/api/microblog/page/{members._page_key}'
+    anonymous, alice, bob = app.test_client(), login(students[0]), login(students[1])
+    checks = []
+
+    def post(client, topic, content):
+        response = client.post('/api/microblog', json={'content': content, 'topicId': topic})
+        assert response.status_code in (200, 201), response.get_data(as_text=True)
+        return response.get_json()['id']
+
+    first = post(bob, topic_id, 'first post')
+    anonymous.get(path)
+    queries, response = counted(anonymous, path)
+    checks.append(('cached anonymous view runs no query', (queries, response.status_code), (0, 200)))
+    queries, response = counted(anonymous, path, headers={'If-None-Match': response.headers['ETag']})
+    checks.append(('an unchanged feed revalidates with 304', (queries, response.status_code), (0, 304)))
+    alice.get(path)
+    queries, response = counted(alice, path)
+    body = response.get_json()
+    checks.append(('cached signed-in view runs no query', (queries, body['userPostCount'], body['canPost']), (0, 0, True)))
+
+    def view(client):
+        body = client.get(path).get_json()
+        return [microblog['content'] for microblog in body['microblogs']], body
+
+    post(alice, other_id, 'elsewhere')
+    queries, _ = counted(anonymous, path)
+    checks.append(('a post in another topic keeps the feed', queries, 0))
+
+    second = post(alice, topic_id, 'second post')
+    contents, body = view(alice)
+    checks.append(('a new post shows at once', (contents, body['userPostCount'], body['canPost']),
+                   (['second post', 'first post'], 1, True)))
+    checks.append(('and counts in postCount', body['topic']['postCount'], 2))
+    post(alice, topic_id, 'third post')
+    _, body = view(alice)
+    checks.append(('canPost stops at maxPostsPerUser', (body['userPostCount'], body['canPost']), (2, False)))
+    _, body = view(bob)
+    checks.append(("another user's count is their own", (body['userPostCount'], body['canPost']), (1, True)))
+
+    alice.put('/api/microblog', json={'id': second, 'content': 'second post, edited'})
+    checks.append(('an update shows at once', view(anonymous)[0][1], 'second post, edited'))
+    alice.post('/api/microblog/reaction', json={'microblogId': first, 'reactionType': 'like'})
+    microblogs = view(anonymous)[1]['microblogs']
+    checks.append(('a reaction shows at once', microblogs[-1]['reactionCounts'], {'like': 1}))
+    alice.post('/api/microblog/reply', json={'postId': first, 'content': 'a reply'})
+    checks.append(('a reply shows at once', view(anonymous)[1]['microblogs'][-1]['replyCount'], 1))
+    alice.delete('/api/microblog', json={'id': second})
+    contents, body = view(alice)
+    checks.append(('a delete shows at once', (len(contents), body['userPostCount'], body['canPost']), (2, 1, True)))
+
+    with app.app_context():
+        db.session.get(Topic, topic_id).update(is_active=False)
+    checks.append(('a disabled topic answers 403', anonymous.get(path).status_code, 403))
+    checks.append(('members only answers 401 to anonymous', anonymous.get(members_path).status_code, 401))
+    checks.append(('and 200 to members', alice.get(members_path).status_code, 200))
+    checks.append(('an unknown page answers 404', anonymous.get('/api/microblog/page/no_such_page').status_code, 404))
+
+    failed = False
+    for label, got, expected in checks:
+        ok = got == expected
+        failed |= not ok
+        print(f"{'ok  ' if ok else 'FAIL'} {label:<42} {got}")
+    print("FAIL" if failed else "OK")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    try:
+        sys.exit(main())
+    finally:
+        os.unlink(scratch.name)
@@ -0,0 +1,280 @@
+#!/usr/bin/env python3
+
+"""
+check_query_budgets.py
+Query-count regression guard: every GET API route has a declared budget of SQL statements.
+
+- Seeds a scratch SQLite database with initUsers and the synthetic generator (model/synthetic.py).
+- Requests every budgeted route, then grows the data about five times and requests it again.
+- A route fails when it issues more statements than its budget, or when its count grows with the
+  data (the N+1 signature), whatever the budget says.
+- GET API routes without a budget are reported, so new endpoints get one when they are added.
+
+Routes with a "known" note are N+1 patterns that are still waiting for their fix.  Their current
+counts are pinned in KNOWN_COUNTS: they fail once either count goes above its pin, so the debt can
+not grow, and are only reported while they stay within it.  Once one fits its budget the check asks
+to drop the note, once one drops below its pins it asks to lower them.
+
+Usage: Run from the root of the project, uses a scratch SQLite database:
+> scripts/check_query_budgets.py
+> scripts/check_query_budgets.py --report     # print every count, useful to set a new budget
+
+Exits with status 1 if any route is over budget or grows with data, past its pins for known routes.
+"""
+import argparse
+import os
+import sys
+import tempfile
+
+# Point the app at a scratch database before it is imported, cheap hashing keeps seeding fast
+scratch = tempfile.NamedTemporaryFile(suffix='.db', delete=False)
+os.environ['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///' + scratch.name
+os.environ.setdefault('PASSWORD_HASH_ITERATIONS', '1000')
+# Budgets are about the queries behind a response, a cache hit would hide them
+os.environ['RESPONSE_CACHE_ENABLED'] = 'false'
+
+# Add the root directory to sys.path so app imports work
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from sqlalchemy import event
+from main import app, db, initUsers, initPersonas
+from model.user import User
+from model.microblog import Topic
+from model.post import Post
+from model.classroom import Classroom
+from model.principal import principal_cache
+from model.synthetic import generate_synthetic, SYNTHETIC_PASSWORD, SYNTHETIC_UID_PREFIX
+
+SMALL_USERS = 40
+LARGE_USERS = 200
+
+# "METHOD /rule": (login, statements allowed, known N+1 note or None)
+# login is 'user' (a synthetic student), 'admin' or None.  Budgets count authentication too.
+BUDGETS = {
+    'GET /api/id': ('user', 3, None),
+    'GET /api/id/pfp': ('user', 3, None),
+    'GET /api/user': ('admin', 3, "User.read() loads sections and personas per user"),
+    'GET /api/user/section': ('user', 3, None),
+    'GET /api/user/class': ('user', 3, None),
+    'GET /api/user/personas': ('user', 4, None),
+    'GET /api/user/skill-passport': ('user', 3, None),
+    'GET /api/admin/skill-passport/<int:user_id>': ('admin', 4, None),
+    'GET /api/grade_data': ('user', 3, None),
+    'GET /api/apexam': ('user', 3, None),
+    'GET /api/school': ('user', 3, None),
+    'GET /api/profile/game': ('user', 3, None),
+    'GET /api/section': (None, 3, None),
+    'GET /api/persona': (None, 2, None),
+    'GET /api/persona/<int:id>': (None, 2, None),
+    'GET /api/students': (None, 3, None),
+    'GET /api/student/jeff': (None, 0, None),
+    'GET /api/student/john': (None, 0, None),
+    'GET /api/microblog': ('user', 4, None),
+    'GET /api/microblog/topics': (None, 3, "Topic.read() counts microblogs per topic"),
+    'GET /api/microblog/page/<string:page_key>': ('user', 7, None),
+    'GET /api/microblog/reply': ('user', 3, None),
+    'GET /api/post/all': ('user', 3, "Post.read() loads user and replies recursively per row"),
+    'GET /api/post/page': ('user', 3, "Post.read() loads user and replies recursively per row"),
+    'GET /api/post/<int:post_id>': ('user', 4, "Post.read() loads replies recursively"),
+    'GET /api/post/user/<int:user_id>': ('user', 4, "Post.read() loads the replies of each of the user's posts"),
+    'GET /api/dynamic/leaderboard': (None, 2, "ScoreCounterEvent.read() loads the user per event"),
+    'GET /api/events/ELEMENTARY_LEADERBOARD': (None, 2, "ElementaryLeaderboardEvent.read() loads the user per event"),
+    'GET /api/study': ('user', 3, None),
+    'GET /api/study/stats': ('user', 11, None),
+    'GET /api/feedback/all': ('admin', 3, None),
+    'GET /api/feedback/user/<string:uid>': ('user', 3, None),
+    'GET /api/classrooms/': ('admin', 4, "Classroom.to_dict() counts students per classroom"),
+    'GET /api/classrooms/<int:id>': ('admin', 4, None),
+    'GET /api/classrooms/<int:id>/students': ('admin', 4, None),
+    'GET /api/classrooms/<int:id>/students/<int:student_id>': ('admin', 7, None),
+    'GET /api/export/users': ('admin', 4, "export serializes users through User.read()"),
+    'GET /api/export/sections': ('admin', 4, None),
+    'GET /api/export/personas': ('admin', 4, None),
+    'GET /api/export/user_personas': ('admin', 4, None),
+    'GET /api/export/classrooms': ('admin', 4, "export looks up students per classroom"),
+    'GET /api/export/feedback': ('admin', 4, None),
+    'GET /api/export/topics': ('admin', 4, "export counts microblogs per topic"),
+    'GET /api/export/microblogs': ('admin', 4, "export loads user, topic, reactions and first replies per microblog"),
+    'GET /api/export/posts': ('admin', 4, "export loads the user per post"),
+    'GET /api/export/study': ('admin', 4, "_export_study loads the user per record"),
+    'GET /api/export/all': ('admin', 12, "combines the exports above"),
+    'GET /api/admin/perf': ('admin', 3, None),
+    'GET /api/admin/slow-queries': ('admin', 3, None),
+    'GET /api/admin/upstreams': ('admin', 3, None),
+    'GET /api/health/db': (None, 7, None),
+    'GET /api/search': ('user', 8, None),
+}
+
+# (statements with SMALL_USERS, with LARGE_USERS) measured for the routes with a known note
+KNOWN_COUNTS = {
+    'GET /api/user': (91, 411),
+    'GET /api/microblog/topics': (2, 3),
+    'GET /api/post/all': (180, 1027),
+    'GET /api/post/page': (180, 612),
+    'GET /api/post/<int:post_id>': (14, 14),
+    'GET /api/post/user/<int:user_id>': (7, 19),
+    'GET /api/dynamic/leaderboard': (92, 392),
+    'GET /api/events/ELEMENTARY_LEADERBOARD': (77, 383),
+    'GET /api/classrooms/': (4, 19),
+    'GET /api/export/users': (91, 103),
+    'GET /api/export/classrooms': (10, 43),
+    'GET /api/export/topics': (3, 4),
+    'GET /api/export/microblogs': (229, 229),
+    'GET /api/export/posts': (184, 319),
+    'GET /api/export/study': (121, 601),
+    'GET /api/export/all': (760, 3789),
+}
+
+# Routes that call outside services (GitHub, Groq, Gemini, snapshots) or read files, not budgeted here
+EXCLUDED_PREFIXES = ('/api/analytics', '/api/groq', '/api/gemini', '/api/ainpc', '/api/jokes', '/api/snapshot')
+
+
+def seed(users):
+    generate_synthetic(users=users, seed=users, verbose=False)
+    principal_cache.clear()
+
+
+def seed_student_posts(student, posts):
+    """Posts with replies by the measured student, the synthetic authors are random and may skip them"""
+    with app.app_context():
+        for n in range(posts):
+            post = Post(student.id, f'budget post {n}', page_url='/check/budgets', page_title='Budgets')
+            db.session.add(post)
+            db.session.flush()
+            db.session.add_all([Post(student.id, f'budget reply {n}.{i}', parent_id=post.id) for i in range(2)])
+        db.session.commit()
+
+
+def concrete_path(rule, student):
+    """Fill the rule's parameters with rows from the seeded data."""
+    with app.app_context():
+        post = Post.query.filter(Post._parent_id.is_(None)).order_by(Post.id).first()
+        topic = Topic.query.order_by(Topic.id).first()
+        classroom = Classroom.query.order_by(Classroom.id).first()
+        classmate = classroom.students.first() if classroom else None
+    values = {
+        '<int:user_id>': str(student.id),
+        '<int:post_id>': str(post.id),
+        '<string:page_key>': topic._page_key,
+        '<int:id>': str(classroom.id if rule.startswith('/api/classrooms') else 1),
+        '<int:student_id>': str(classmate.id if classmate else student.id),
+        '<string:uid>': student._uid,
+    }
+    for placeholder, value in values.items():
+        rule = rule.replace(placeholder, value)
+    if rule == '/api/post/page':
+        rule += f'?url={post._page_url}'
+    if rule == '/api/microblog/reply':
+        rule += '?postId=1'
+    if rule == '/api/search':
+        rule += '?q=flask+sess*'
+    return rule
+
+
+def measure(clients, student):
+    counts = {}
+    statements = []
+    listener = lambda conn, cursor, statement, *args: statements.append(statement)
+    with app.app_context():
+        event.listen(db.engine, 'before_cursor_execute', listener)
+    try:
+        for key, (login, _, _) in BUDGETS.items():
+            method, rule = key.split(' ', 1)
+            path = concrete_path(rule, student)
+            # Warm request first, so one-off loads (principal cache, topics) are not counted
+            clients[login].get(path)
+            statements.clear()
+            response = clients[login].get(path)
+            counts[key] = (len(statements), response.status_code)
+    finally:
+        with app.app_context():
+            event.remove(db.engine, 'before_cursor_execute', listener)
+    return counts
+
+
+def login_clients(student):
+    clients = {None: app.test_client(), 'user': app.test_client(), 'admin': app.test_client()}
+    for role, uid, password in (('user', student._uid, SYNTHETIC_PASSWORD),
+                                ('admin', app.config['ADMIN_UID'], app.config['ADMIN_PASSWORD'])):
+        response = clients[role].post('/api/authenticate', json={'uid': uid, 'password': password})
+        assert response.status_code == 200, response.get_data(as_text=True)
+    return clients
+
+
+def unbudgeted_routes():
+    missing = []
+    for rule in app.url_map.iter_rules():
+        if not rule.rule.startswith('/api/') or rule.rule.startswith(EXCLUDED_PREFIXES):
+            continue
+        if 'GET' in rule.methods and f'GET {rule.rule}' not in BUDGETS:
+            missing.append(f'GET {rule.rule}')
+    return sorted(missing)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--report', action='store_true', help='print every route, not only failures')
+    args = parser.parse_args()
+
+    with app.app_context():
+        db.create_all()
+    initUsers()
+    initPersonas()
+    seed(SMALL_USERS)
+    with app.app_context():
+        student = User.query.filter(User._uid.like(f'{SYNTHETIC_UID_PREFIX}%'), User._role == 'User').first()
+        db.session.expunge(student)
+    seed_student_posts(student, 3)
+    clients = login_clients(student)
+    small = measure(clients, student)
+    seed(LARGE_USERS - SMALL_USERS)
+    seed_student_posts(student, 12)
+    large = measure(clients, student)
+
+    failures, known, fixed, passed = [], [], [], []
+    for key, (login, budget, note) in BUDGETS.items():
+        (few, status), (many, _) = small[key], large[key]
+        problems = []
+        if status >= 500 or (login and status in (401, 403)):
+            problems.append(f'status {status}')
+        if many > budget:
+            problems.append(f'{many} > budget {budget}')
+        if many > few:
+            problems.append(f'grows with data {few} -> {many}')
+        line = f"{key:<58} {few:>5} {many:>6} {budget:>7}  {status}"
+        pinned = KNOWN_COUNTS.get(key)
+        if note and pinned is None:
+            failures.append(f"{line}  known note without KNOWN_COUNTS")
+        elif note and problems and (few > pinned[0] or many > pinned[1]):
+            failures.append(f"{line}  above pinned {pinned[0]} -> {pinned[1]}, known: {note}")
+        elif problems and note:
+            known.append(f"{line}  known: {note}")
+            if (few, many) != pinned:
+                fixed.append(f"{line}  below pinned {pinned[0]} -> {pinned[1]}, lower KNOWN_COUNTS")
+        elif problems:
+            failures.append(f"{line}  {', '.join(problems)}")
+        elif note:
+            fixed.append(f"{line}  within budget, drop the known note")
+        elif args.report:
+            passed.append(line)
+
+    print(f"{'route':<58} {SMALL_USERS:>5} {LARGE_USERS:>6} {'budget':>7}  status")
+    if passed:
+        print('\n'.join(passed))
+    for title, lines in (('Known N+1, not failing', known), ('Fixed, update BUDGETS', fixed), ('FAILED', failures)):
+        if lines:
+            print(f"\n{title}:")
+            print('\n'.join(lines))
+    missing = unbudgeted_routes()
+    if missing:
+        print("\nGET routes without a budget:")
+        print('\n'.join(missing))
+
+    print("\nFAIL" if failures else "\nOK")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    try:
+        sys.exit(main())
+    finally:
+        os.unlink(scratch.name)
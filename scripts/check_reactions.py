@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+
+"""
+check_reactions.py
+Checks the microblog reaction tables (MicroBlogReaction, MicroBlogReactionCount in model/microblog.py).
+
+- Several processes react to the same microblog at once, like gunicorn workers: no reaction is lost
+  and the counters match the rows
+- reacting twice is a no-op, a reaction by an unknown user fails, removing a missing reaction returns False, toggle flips
+- reactions still in the old _data['reactions'] JSON layout are migrated once, unknown users are
+  skipped and the key is dropped
+- deleting a microblog deletes its reactions and counters
+
+Usage: Run from the root of the project, uses a scratch SQLite database:
+> scripts/check_reactions.py --processes 4 --users 40
+
+Exits with status 1 if any check fails.
+"""
+import argparse
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+
+def reactor(path, microblog_id, user_ids, start, results):
+    """One worker process: every user likes the microblog, then adds and removes a heart."""
+    os.environ['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///' + path
+    sys.path.append(ROOT)
+    from main import app, db
+    from model.microblog import MicroBlog
+
+    errors = 0
+    start.wait()
+    with app.app_context():
+        for user_id in user_ids:
+            try:
+                microblog = db.session.get(MicroBlog, microblog_id)
+                microblog.add_reaction(user_id, 'like')
+                microblog.toggle_reaction(user_id, 'heart')
+                if user_id % 2:
+                    microblog.toggle_reaction(user_id, 'heart')
+            except Exception:
+                db.session.rollback()
+                errors += 1
+    results.put(errors)
+
+
+def prepare(path, users):
+    os.environ['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///' + path
+    sys.path.append(ROOT)
+    from main import app, db
+    from model.synthetic import generate_synthetic
+    from model.microblog import MicroBlog
+    generate_synthetic(users=users, verbose=False)
+    with app.app_context():
+        user_ids = [user_id for (user_id,) in db.session.query(MicroBlog._user_id).distinct().all()]
+        target = MicroBlog(user_id=user_ids[0], content='concurrent reactions').create()
+        return target.id
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--processes', type=int, default=4, help='reacting processes')
+    parser.add_argument('--users', type=int, default=40, help='synthetic users, each reacts once per type')
+    args = parser.parse_args()
+
+    path = tempfile.NamedTemporaryFile(suffix='.db', delete=False).name
+    os.environ['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///' + path
+    os.environ['PASSWORD_HASH_ITERATIONS'] = '1000'
+    try:
+        sys.path.append(ROOT)
+        from main import app, db
+        from model.user import User
+        from sqlalchemy import exc
+        from model.microblog import MicroBlog, MicroBlogReaction, MicroBlogReactionCount, migrate_reactions
+
+        microblog_id = prepare(path, args.users)
+        with app.app_context():
+            user_ids = [user_id for (user_id,) in db.session.query(User.id).order_by(User.id).all()]
+
+        context = multiprocessing.get_context('spawn')
+        start, results = context.Event(), context.Queue()
+        workers = [context.Process(target=reactor, args=(path, microblog_id, user_ids[i::args.processes], start, results))
+                   for i in range(args.processes)]
+        for worker in workers:
+            worker.start()
+        time.sleep(5)  # let every process finish importing the app
+        start.set()
+        errors = sum(results.get(timeout=600) for _ in workers)
+        for worker in workers:
+            worker.join()
+
+        checks = [('concurrent reactions raise no errors', errors, 0)]
+        with app.app_context():
+            microblog = db.session.get(MicroBlog, microblog_id)
+            hearts = len([user_id for user_id in user_ids if not user_id % 2])
+            checks.append(('no concurrent reaction is lost', microblog.get_reaction_counts(), {'like': len(user_ids), 'heart': hearts}))
+            rows = {kind: len(ids) for kind, ids in microblog.get_reactions().items()}
+            checks.append(('counters match the rows', rows, microblog.get_reaction_counts()))
+
+            user_id = user_ids[0]
+            checks.append(('reacting twice is a no-op', (microblog.add_reaction(user_id, 'like'), microblog.get_reaction_counts()['like']),
+                           (True, len(user_ids))))
+            checks.append(('removing a missing reaction', microblog.remove_reaction(user_id, 'wow'), False))
+            checks.append(('toggle adds then removes', (microblog.toggle_reaction(user_id, 'wow'), microblog.user_has_reacted(user_id, 'wow'),
+                                                        microblog.toggle_reaction(user_id, 'wow'), microblog.user_has_reacted(user_id, 'wow')),
+                           (True, True, True, False)))
+            try:
+                microblog.add_reaction(10 ** 9, 'like')
+                unknown = 'added'
+            except exc.IntegrityError:
+                unknown = 'IntegrityError'
+            checks.append(('an unknown user is not taken as reacted', unknown, 'IntegrityError'))
+
+            # Reactions written by an older version of the app, inside the JSON column
+            legacy = MicroBlog(user_id=user_id, content='legacy reactions')
+            db.session.add(legacy)
+            db.session.commit()
+            legacy._data = {'mood': 'happy', 'reactions': {'like': user_ids[:3] + [user_ids[0], 10 ** 9], 'heart': [user_ids[1]]}}
+            db.session.commit()
+            legacy_id = legacy.id
+        first, second = migrate_reactions(), migrate_reactions()
+        with app.app_context():
+            legacy = db.session.get(MicroBlog, legacy_id)
+            checks.append(('legacy JSON reactions are migrated', legacy.get_reaction_counts(), {'like': 3, 'heart': 1}))
+            checks.append(('and the JSON key is dropped', legacy._data, {'mood': 'happy'}))
+            checks.append(('a second run migrates nothing', (first['microblogs'] >= 1, second['microblogs']), (True, 0)))
+
+            microblog = db.session.get(MicroBlog, microblog_id)
+            microblog.delete()
+            left = (MicroBlogReaction.query.filter_by(_microblog_id=microblog_id).count(),
+                    MicroBlogReactionCount.query.filter_by(_microblog_id=microblog_id).count())
+            checks.append(('delete removes reactions and counters', left, (0, 0)))
+    finally:
+        for suffix in ('', '-wal', '-shm', '-journal'):
+            if os.path.exists(path + suffix):
+                os.unlink(path + suffix)
+
+    failed = False
+    for label, got, expected in checks:
+        ok = got == expected
+        failed |= not ok
+        print(f"{'ok  ' if ok else 'FAIL'} {label:<40} {got}")
+    print("FAIL" if failed else "OK")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+
+"""
+check_replica_routing.py
+Checks which database RoutingSession (model/engine.py) reads from, using two local SQLite files.
+
+The primary and the replica get the same schema but a different section name, so every response
+says which file it was read from.  There is no replication between them, which is the point:
+
+- GET reads come from the replica
+- POST reads come from the primary
+- a GET that writes reads its own write back from the primary
+- use_primary() moves the rest of a GET to the primary
+- without a request (CLI, scripts) everything goes to the primary
+
+Usage: Run from the root of the project, uses two scratch SQLite databases:
+> scripts/check_replica_routing.py
+
+Exits with status 1 if any read comes from the wrong database.
+"""
+import os
+import sys
+import tempfile
+
+# Point the app at scratch primary and replica databases before it is imported
+primary = tempfile.NamedTemporaryFile(suffix='.db', delete=False)
+replica = tempfile.NamedTemporaryFile(suffix='.db', delete=False)
+os.environ['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///' + primary.name
+os.environ['SQLALCHEMY_REPLICA_URI'] = 'sqlite:///' + replica.name
+
+# Add the root directory to sys.path so app imports work
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from main import app, db
+from model.user import Section
+from model.engine import replica_engine, use_primary
+
+
+def section_name():
+    section = Section.query.filter_by(_abbreviation='WHERE').first()
+    return section._name if section else None
+
+
+# Probe endpoints, each answers with the database its reads came from
+@app.route('/_check/replica/read', methods=['GET', 'POST'])
+def _check_read():
+    return {'read': section_name()}
+
+@app.route('/_check/replica/write-then-read')
+def _check_write_then_read():
+    db.session.add(Section(name='written', abbreviation='W' + os.urandom(4).hex()))
+    db.session.commit()
+    return {'read': section_name()}
+
+@app.route('/_check/replica/override')
+def _check_override():
+    before = section_name()
+    use_primary()
+    return {'before': before, 'read': section_name()}
+
+
+def main():
+    with app.app_context():
+        db.create_all()
+        db.session.add(Section(name='primary', abbreviation='WHERE'))
+        db.session.commit()
+        db.metadata.create_all(replica_engine())
+        with replica_engine().begin() as connection:
+            connection.execute(Section.__table__.insert(), {'_name': 'replica', '_abbreviation': 'WHERE'})
+        outside_request = section_name()
+
+    client = app.test_client()
+    checks = [
+        ('GET reads from the replica', client.get('/_check/replica/read').get_json()['read'], 'replica'),
+        ('POST reads from the primary', client.post('/_check/replica/read').get_json()['read'], 'primary'),
+        ('GET after a write reads the primary', client.get('/_check/replica/write-then-read').get_json()['read'], 'primary'),
+        ('use_primary() switches a GET', client.get('/_check/replica/override').get_json()['read'], 'primary'),
+        ('reads before use_primary() used the replica', client.get('/_check/replica/override').get_json()['before'], 'replica'),
+        ('no request reads the primary', outside_request, 'primary'),
+        ('next GET is back on the replica', client.get('/_check/replica/read').get_json()['read'], 'replica'),
+    ]
+    failed = False
+    for label, got, expected in checks:
+        ok = got == expected
+        failed |= not ok
+        print(f"{'ok  ' if ok else 'FAIL'} {label:<46} {got}")
+    print("FAIL" if failed else "OK")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    try:
+        sys.exit(main())
+    finally:
+        os.unlink(primary.name)
+        os.unlink(replica.name)
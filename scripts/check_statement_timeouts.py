@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+
+"""
+check_statement_timeouts.py
+Checks the SQLite statement timeout (model/engine.py) and the slow-query log (api/perf.py).
+
+Probe endpoints run recursive CTEs that count up to a given number, so their cost is known:
+
+- a runaway statement in a request is interrupted at DB_STATEMENT_TIMEOUT_MS and answers 503
+- the connection is usable again afterwards, the next request reads and writes normally
+- a statement above SLOW_QUERY_MS but within the timeout completes and is logged
+- the log lists the endpoint, the statement and the parameter types rather than their values
+- the same statement outside a request (CLI, scripts) is not bounded
+
+Usage: Run from the root of the project, uses a scratch SQLite database:
+> scripts/check_statement_timeouts.py
+
+Exits with status 1 if any check fails.
+"""
+import os
+import sys
+import tempfile
+import time
+
+# Point the app at a scratch database and use short limits before it is imported
+scratch = tempfile.NamedTemporaryFile(suffix='.db', delete=False)
+os.environ['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///' + scratch.name
+os.environ['PASSWORD_HASH_ITERATIONS'] = '1000'
+os.environ['DB_STATEMENT_TIMEOUT_MS'] = '300'
+os.environ['SLOW_QUERY_MS'] = '20'
+
+# Add the root directory to sys.path so app imports work
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from sqlalchemy import text
+from main import app, db, initUsers
+from model.user import Section
+from api.perf import slow_query_log
+
+COUNT_TO = text("WITH RECURSIVE c(x) AS (SELECT 1 UNION ALL SELECT x + 1 FROM c WHERE x < :n) SELECT count(*) FROM c")
+
+
+def count_to(n):
+    started = time.perf_counter()
+    value = db.session.execute(COUNT_TO, {'n': n}).scalar()
+    return value, (time.perf_counter() - started) * 1000
+
+
+# Probe endpoints
+@app.route('/_check/timeout/count/<int:n>')
+def _check_count(n):
+    value, ms = count_to(n)
+    return {'value': value, 'ms': ms}
+
+@app.route('/_check/timeout/write')
+def _check_write():
+    db.session.add(Section(name='written', abbreviation='T' + os.urandom(4).hex()))
+    db.session.commit()
+    return {'sections': Section.query.count()}
+
+
+def main():
+    with app.app_context():
+        db.create_all()
+    initUsers()
+    # Calibrate: a statement that takes well over the timeout and one well within it
+    with app.app_context():
+        _, ms = count_to(200000)
+    runaway = int(200000 * 2000 / max(ms, 1))  # about 2 s
+    slow = int(200000 * 60 / max(ms, 1))  # about 60 ms
+
+    client = app.test_client()
+    client.post('/api/authenticate', json={'uid': app.config['ADMIN_UID'], 'password': app.config['ADMIN_PASSWORD']})
+    slow_query_log.clear()
+
+    started = time.perf_counter()
+    stopped = client.get(f'/_check/timeout/count/{runaway}')
+    stopped_ms = (time.perf_counter() - started) * 1000
+    completed = client.get(f'/_check/timeout/count/{slow}')
+    written = client.get('/_check/timeout/write')
+    report = client.get('/api/admin/slow-queries').get_json()
+    with app.app_context():
+        unbounded, unbounded_ms = count_to(runaway)
+
+    entries = report['recent']
+    logged = next((entry for entry in entries if not entry['timed_out'] and 'RECURSIVE' in entry['sql']), {})
+    checks = [
+        ('runaway statement answers 503', stopped.status_code, 503),
+        ('it is stopped near the timeout', stopped_ms < 300 * 3, True),
+        ('with a message saying so', 'took too long' in stopped.get_data(as_text=True), True),
+        ('the next request completes', completed.status_code, 200),
+        ('the next write commits', written.status_code, 200),
+        ('the timeout is in the log', report['timeouts'], 1),
+        ('the slow statement is in the log', bool(logged), True),
+        ('with its endpoint', logged.get('endpoint'), 'GET /_check/timeout/count/<int:n>'),
+        ('and its parameter types', logged.get('params'), '(int)'),
+        ('outside a request it is not bounded', unbounded, runaway),
+    ]
+    failed = False
+    for label, got, expected in checks:
+        ok = got == expected
+        failed |= not ok
+        print(f"{'ok  ' if ok else 'FAIL'} {label:<40} {got}")
+    print(f"     stopped after {stopped_ms:.0f} ms, the same statement outside a request took {unbounded_ms:.0f} ms")
+    print("FAIL" if failed else "OK")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    try:
+        sys.exit(main())
+    finally:
+        os.unlink(scratch.name)
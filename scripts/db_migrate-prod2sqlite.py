@@ -106,14 +106,22 @@ def create_database_if_missing(engine, db_name):
 # ── Production data extractor ──────────────────────────────────────────────────
 
 def _fetch_paginated(url, data_type, headers, cookies):
-    """Fetch all pages for *data_type* and return (records, error_entry_or_None)."""
+    """Fetch all pages for *data_type* and return (records, error_entry_or_None).
+
+    Follows next_cursor (keyset pagination, the same cost for every page), servers that do not
+    return one are walked with ?page= instead.
+    """
     all_records = []
     page = 1
+    cursor = ''
     per_page = 50
     max_retries = 3
 
     while True:
-        paginated_url = f"{url}?page={page}&per_page={per_page}"
+        if cursor is not None:
+            paginated_url = f"{url}?cursor={cursor}&per_page={per_page}"
+        else:
+            paginated_url = f"{url}?page={page}&per_page={per_page}"
         retry_count = 0
         success = False
 
@@ -150,7 +158,9 @@ def _fetch_paginated(url, data_type, headers, cookies):
                 print(".", end="", flush=True)
 
                 if not result.get('has_next', False):
-                    break
+                    return all_records, None
+                # An older server ignores cursor and answers page 1, continue with page numbers
+                cursor = result.get('next_cursor')
 
             except requests.Timeout:
                 retry_count += 1